@@ -0,0 +1,181 @@
+"""
+Archive writers and readers for "backup all".
+
+The database dump is streamed into the archive while pg_dump is running
+and the filestore is added file by file, so nothing is copied to a
+temporary location first.
+
+ZipArchiveWriter: odoo.sh compatible zip (dump.sql + filestore/...). The
+deflating is done by zipfile in one thread; a thread pool only compresses
+a sample of every file ahead of the writer, so files whose sample does not
+get smaller (images, pdfs, ...) are stored instead of deflated. Use
+tar.zst for multi threaded compression.
+
+TarZstdArchiveWriter: tar piped through multi threaded zstd. Tar needs the
+size of a member in advance, so streams are split into parts of
+STREAM_PART_SIZE bytes (dump.sql.part00000, dump.sql.part00001, ...).
+
+"""
+import os
+import io
+import sys
+import time
+import zlib
+import tarfile
+import zipfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+CHUNK_SIZE = 1024 * 1024
+STREAM_PART_SIZE = 64 * 1024 * 1024
+SAMPLE_SIZE = 256 * 1024
+# stored if the compressed sample has more than this ratio of its size
+MIN_COMPRESSION_RATIO = 0.95
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def _iter_tree(root):
+    """
+    Yields absolute path and path relative to root of all files, sorted.
+    """
+    root = str(root)
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            if os.path.isfile(path):
+                yield path, os.path.relpath(path, root)
+
+
+def _get_compress_type(path):
+    with open(path, "rb") as file:
+        sample = file.read(SAMPLE_SIZE)
+    if not sample:
+        return zipfile.ZIP_STORED
+    compressed = zlib.compress(sample, 1)
+    if len(compressed) > len(sample) * MIN_COMPRESSION_RATIO:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def is_tar_zst(filepath):
+    """
+    True for archives of TarZstdArchiveWriter (the dump is the first member).
+    """
+    if not os.path.isfile(filepath):
+        return False
+    with open(filepath, "rb") as file:
+        if file.read(4) != ZSTD_MAGIC:
+            return False
+    proc = subprocess.Popen(
+        ["zstd", "-q", "-d", "-c", str(filepath)],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        with tarfile.open(fileobj=proc.stdout, mode="r|") as tar:
+            member = tar.next()
+            return bool(member and member.name.startswith("dump.sql.part"))
+    except tarfile.TarError:
+        return False
+    finally:
+        proc.stdout.close()
+        proc.kill()
+        proc.wait()
+
+
+class ZipArchiveWriter(object):
+    def __init__(self, path, compresslevel=6, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        options = {}
+        if sys.version_info >= (3, 7):
+            options["compresslevel"] = compresslevel
+        self.zip = zipfile.ZipFile(
+            str(path),
+            "w",
+            compression=zipfile.ZIP_DEFLATED,
+            allowZip64=True,
+            **options,
+        )
+
+    def add_stream(self, arcname, stream):
+        zinfo = zipfile.ZipInfo(arcname, time.localtime()[:6])
+        zinfo.compress_type = zipfile.ZIP_DEFLATED
+        zinfo.external_attr = 0o644 << 16
+        with self.zip.open(zinfo, "w", force_zip64=True) as dest:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                dest.write(chunk)
+
+    def add_tree(self, root, prefix):
+        files = list(_iter_tree(root))
+        window = self.workers * 4
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = []
+
+            def flush(count):
+                while len(pending) > count:
+                    path, arcname, job = pending.pop(0)
+                    self.zip.write(path, arcname, compress_type=job.result())
+
+            for path, rel_path in files:
+                job = executor.submit(_get_compress_type, path)
+                pending.append((path, f"{prefix}/{rel_path}", job))
+                flush(window)
+            flush(0)
+
+    def close(self):
+        self.zip.close()
+
+
+class TarZstdArchiveWriter(object):
+    def __init__(self, path, compresslevel=3, workers=None):
+        self.proc = subprocess.Popen(
+            [
+                "zstd",
+                "-q",
+                "-f",
+                f"-{compresslevel}",
+                f"-T{workers or 0}",
+                "-o",
+                str(path),
+            ],
+            stdin=subprocess.PIPE,
+        )
+        self.tar = tarfile.open(
+            fileobj=self.proc.stdin, mode="w|", format=tarfile.PAX_FORMAT
+        )
+
+    def add_stream(self, arcname, stream):
+        part = 0
+        while True:
+            buffer = io.BytesIO()
+            while buffer.tell() < STREAM_PART_SIZE:
+                chunk = stream.read(min(CHUNK_SIZE, STREAM_PART_SIZE - buffer.tell()))
+                if not chunk:
+                    break
+                buffer.write(chunk)
+            if not buffer.tell() and part:
+                break
+            tarinfo = tarfile.TarInfo(f"{arcname}.part{part:05d}")
+            tarinfo.size = buffer.tell()
+            tarinfo.mtime = time.time()
+            tarinfo.mode = 0o644
+            buffer.seek(0)
+            self.tar.addfile(tarinfo, buffer)
+            if tarinfo.size < STREAM_PART_SIZE:
+                break
+            part += 1
+
+    def add_tree(self, root, prefix):
+        for path, rel_path in _iter_tree(root):
+            self.tar.add(path, f"{prefix}/{rel_path}", recursive=False)
+
+    def close(self):
+        self.tar.close()
+        self.proc.stdin.close()
+        if self.proc.wait():
+            raise Exception(f"zstd failed with exit code {self.proc.returncode}")
+
@@ -5,17 +5,18 @@ import subprocess
 from pathlib import Path
 
 try:
-    from .lib_clickhelpers import AliasedGroup
+    from .lib_clickhelpers import LazyGroup
 except ImportError:
     click = None
 from .click_config import Config
 from .click_global_commands import GlobalCommands
+from .command_registry import COMMANDS, SUBCOMMANDS
 
 Commands = GlobalCommands()
 pass_config = click.make_pass_decorator(Config, ensure=True)
 
 
-@click.group(cls=AliasedGroup)
+@click.group(cls=LazyGroup, lazy_commands=COMMANDS, lazy_subcommands=SUBCOMMANDS)
 @click.option("-f", "--force", is_flag=True)
 @click.option("-v", "--verbose", is_flag=True)
 @click.option("--version", is_flag=True)
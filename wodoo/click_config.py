@@ -4,6 +4,8 @@ import sys
 from pathlib import Path
 import importlib
 
+_dynamic_modules = set()
+
 
 class Config(object):
     class Forced:
@@ -31,6 +33,7 @@ class Config(object):
         except:
             # Case example odoo -p ...  called somewhere
             self._WORKING_DIR = None
+        self._settings = None
         self._host_run_dir = None
         self._project_name = None
         self.YAML_VERSION = YAML_VERSION
@@ -116,39 +119,24 @@ class Config(object):
             value = super(Config, self).__getattribute__(name)
             return value
         except AttributeError:
-            from .myconfigparser import MyConfigParser  # NOQA
-
-            if "settings" not in self.files:
+            settings = self.get_settings()
+            if settings is None:
                 return None
-            myconfig = MyConfigParser(self.files["settings"])
-
-            convert = None
-            if name.endswith("_as_int"):
-                convert = "asint"
-                name = name[: -len("_as_int")]
-            elif name.endswith("_as_bool"):
-                convert = "asbool"
-                name = name[: -len("_as_bool")]
-
-            for tries in [name, name.lower(), name.upper()]:
-                value = ""
-                if tries not in myconfig.keys():
-                    continue
-
-                value = myconfig.get(tries, "")
-                break
-
-            if convert:
-                if convert == "asint":
-                    value = int(value or "0")
-
-            if value == "1":
-                value = True
-            elif value == "0":
-                value = False
-            return value
-        except Exception:
-            raise
+            return settings.get_value(name)
+
+    def get_settings(self):
+        """
+        Cached snapshot of the settings file; None if there is no such file
+        configured.
+        """
+        if "settings" not in self.files:
+            return None
+        from .myconfigparser import CachedSettings  # NOQA
+
+        path = self.files["settings"]
+        if not self._settings or self._settings.fileName != Path(path):
+            self._settings = CachedSettings(path)
+        return self._settings
 
     def get_odoo_conn(self, inside_container=None):
         from .odoo_config import get_postgres_connection_params  # NOQA
@@ -162,16 +150,10 @@ class Config(object):
 
     @property
     def use_docker(self):
-        from .myconfigparser import MyConfigParser  # NOQA
-
-        try:
-            myconfig = MyConfigParser(self.files["settings"])
-        except Exception:
-            USE_DOCKER = True
-        else:
-            USE_DOCKER = myconfig.get("USE_DOCKER", "1") == "1"
-
-        return USE_DOCKER
+        settings = self.get_settings()
+        if settings is None:
+            return True
+        return settings.get("USE_DOCKER", "1") == "1"
 
     def _setup_files_and_folders(self):
         from . import odoo_config  # NOQA
@@ -254,6 +236,10 @@ class Config(object):
         for module in parent_dir.glob("*/__commands.py"):
             if module.is_dir():
                 continue
+            # project_name is set several times; the commands are added once
+            if module in _dynamic_modules:
+                continue
+            _dynamic_modules.add(module)
             spec = importlib.util.spec_from_file_location(
                 "dynamic_loaded_module",
                 str(module),
@@ -10,6 +10,11 @@ class GlobalCommands(object):
         self.commands[name] = cmd
 
     def invoke(self, ctx, cmd, missing_ok=False, *args, **kwargs):
+        if cmd not in self.commands:
+            # registered by a module, which is not imported yet
+            from .cli import cli
+
+            cli.load_all()
         if cmd not in self.commands:
             if not missing_ok:
                 raise Exception("CMD not found: {}".format(cmd))
@@ -0,0 +1,215 @@
+"""
+Index of the commands of the lib modules; "odoo" imports a module only
+when one of its commands is used (see LazyGroup).
+
+Regenerate after adding, renaming or documenting commands:
+
+    python -m wodoo.command_registry
+
+"""
+from pathlib import Path
+
+MODULES = [
+    "lib_composer",
+    "lib_backup",
+    "lib_control",
+    "lib_db",
+    "lib_db_snapshots",
+    "lib_lang",
+    "lib_module",
+    "lib_setup",
+    "lib_src",
+    "lib_docker_registry",
+    "lib_turnintodev",
+    "lib_talk",
+    "lib_linting",
+    "daddy_cleanup",
+]
+
+# BEGIN GENERATED
+COMMANDS = {
+    'backup': ('wodoo.lib_backup', ''),
+    'composer': ('wodoo.lib_composer', ''),
+    'daddy-cleanup': ('wodoo.daddy_cleanup', 'Deletes file matching the given glob in PATH and keeps youngest files of last weeks, months, quarters and years.'),
+    'db': ('wodoo.lib_db', 'Database related actions.'),
+    'dev-env': ('wodoo.lib_turnintodev', ''),
+    'docker': ('wodoo.lib_control', ''),
+    'docker-registry': ('wodoo.lib_docker_registry', ''),
+    'keep-last-file-of-day': ('wodoo.daddy_cleanup', ''),
+    'lang': ('wodoo.lib_lang', ''),
+    'lint': ('wodoo.lib_linting', ''),
+    'logs': ('wodoo.lib_control', ''),
+    'odoo-module': ('wodoo.lib_module', ''),
+    'restore': ('wodoo.lib_backup', ''),
+    'run': ('wodoo.lib_control', ''),
+    'runbash': ('wodoo.lib_control', ''),
+    'setup': ('wodoo.lib_setup', ''),
+    'snapshot': ('wodoo.lib_db_snapshots', ''),
+    'src': ('wodoo.lib_src', ''),
+    'talk': ('wodoo.lib_talk', ''),
+}
+SUBCOMMANDS = {
+    'UPDATE': ['wodoo.lib_module'],
+    'abort-upgrade': ['wodoo.lib_module'],
+    'all': ['wodoo.lib_backup', 'wodoo.lib_linting'],
+    'anonymize': ['wodoo.lib_db'],
+    'apply-gimera-if-required': ['wodoo.lib_src'],
+    'attach': ['wodoo.lib_control'],
+    'breakpoint': ['wodoo.lib_linting'],
+    'build': ['wodoo.lib_control'],
+    'clear': ['wodoo.lib_db_snapshots'],
+    'cleardb': ['wodoo.lib_db'],
+    'config': ['wodoo.lib_composer'],
+    'db-health-check': ['wodoo.lib_db'],
+    'db-size': ['wodoo.lib_db'],
+    'deactivate-field-in-views': ['wodoo.lib_talk'],
+    'debug': ['wodoo.lib_control'],
+    'delete-modules-not-in-manifest': ['wodoo.lib_src'],
+    'dev': ['wodoo.lib_control'],
+    'down': ['wodoo.lib_control'],
+    'download-openupgrade': ['wodoo.lib_module'],
+    'drop-db': ['wodoo.lib_db'],
+    'excel': ['wodoo.lib_db'],
+    'exec': ['wodoo.lib_control'],
+    'export': ['wodoo.lib_lang'],
+    'fetch-modules': ['wodoo.lib_src'],
+    'fields': ['wodoo.lib_talk'],
+    'files': ['wodoo.lib_backup'],
+    'files-prune': ['wodoo.lib_backup'],
+    'find-duplicate-modules': ['wodoo.lib_src'],
+    'force-kill': ['wodoo.lib_control'],
+    'generate-update-command': ['wodoo.lib_module'],
+    'goto-inherited': ['wodoo.lib_src'],
+    'groups': ['wodoo.lib_talk'],
+    'hash-password': ['wodoo.lib_turnintodev'],
+    'import': ['wodoo.lib_lang'],
+    'init': ['wodoo.lib_src'],
+    'kill': ['wodoo.lib_control'],
+    'list': ['wodoo.lib_backup', 'wodoo.lib_db_snapshots', 'wodoo.lib_lang'],
+    'list-changed-files': ['wodoo.lib_module'],
+    'list-changed-modules': ['wodoo.lib_module'],
+    'list-deps': ['wodoo.lib_module'],
+    'list-installed-modules': ['wodoo.lib_module'],
+    'list-modules': ['wodoo.lib_module'],
+    'list-outdated-modules': ['wodoo.lib_module'],
+    'list-robot-test-files': ['wodoo.lib_module'],
+    'list-unit-test-files': ['wodoo.lib_module'],
+    'login': ['wodoo.lib_docker_registry'],
+    'make-module': ['wodoo.lib_src'],
+    'make-modules': ['wodoo.lib_src'],
+    'make-odoo-sh-compatible': ['wodoo.lib_src'],
+    'menus': ['wodoo.lib_talk'],
+    'migrate': ['wodoo.lib_module'],
+    'module-index': ['wodoo.lib_module'],
+    'modules-overview': ['wodoo.lib_talk'],
+    'next-port': ['wodoo.lib_setup'],
+    'odoo-db': ['wodoo.lib_backup'],
+    'pgactivity': ['wodoo.lib_db'],
+    'pgcli': ['wodoo.lib_db'],
+    'pghba-conf-wide-open': ['wodoo.lib_db'],
+    'pretty-print-manifest': ['wodoo.lib_src'],
+    'produce-test-lines': ['wodoo.lib_setup'],
+    'progress': ['wodoo.lib_talk'],
+    'prolong': ['wodoo.lib_turnintodev'],
+    'prune': ['wodoo.lib_db_snapshots'],
+    'ps': ['wodoo.lib_control'],
+    'psql': ['wodoo.lib_db'],
+    'pull': ['wodoo.lib_control'],
+    'purge-inactive-subvolumes': ['wodoo.lib_db_snapshots'],
+    'rebuild': ['wodoo.lib_control'],
+    'recompute-parent-store': ['wodoo.lib_talk'],
+    'recreate': ['wodoo.lib_control'],
+    'regpull': ['wodoo.lib_docker_registry'],
+    'regpush': ['wodoo.lib_docker_registry'],
+    'reload': ['wodoo.lib_composer'],
+    'remove': ['wodoo.lib_db_snapshots'],
+    'remove-postgres-volume': ['wodoo.lib_db_snapshots'],
+    'remove-settings': ['wodoo.lib_turnintodev'],
+    'remove-volumes': ['wodoo.lib_control'],
+    'remove-web-assets': ['wodoo.lib_setup'],
+    'reset-odoo-db': ['wodoo.lib_db'],
+    'restart': ['wodoo.lib_control'],
+    'restore': ['wodoo.lib_db_snapshots'],
+    'restore-web-icons': ['wodoo.lib_talk'],
+    'rewrite-manifest': ['wodoo.lib_src'],
+    'rm': ['wodoo.lib_control'],
+    'robotest': ['wodoo.lib_module'],
+    'run-tests': ['wodoo.lib_module'],
+    'save': ['wodoo.lib_db_snapshots'],
+    'security': ['wodoo.lib_src'],
+    'self-sign-hub-certificate': ['wodoo.lib_docker_registry'],
+    'set-password-all-users': ['wodoo.lib_turnintodev'],
+    'set-ribbon': ['wodoo.lib_talk'],
+    'setname': ['wodoo.lib_db'],
+    'setup-venv': ['wodoo.lib_src'],
+    'shell': ['wodoo.lib_control'],
+    'show-addons-paths': ['wodoo.lib_module', 'wodoo.lib_src'],
+    'show-conflicting-modules': ['wodoo.lib_module'],
+    'show-dump-type': ['wodoo.lib_backup'],
+    'show-effective-settings': ['wodoo.lib_setup'],
+    'show-install-state': ['wodoo.lib_module'],
+    'show-table-sizes': ['wodoo.lib_db'],
+    'show-volumes': ['wodoo.lib_control'],
+    'status': ['wodoo.lib_setup'],
+    'stop': ['wodoo.lib_control'],
+    'toggle-settings': ['wodoo.lib_composer'],
+    'transfer-volume-content': ['wodoo.lib_control'],
+    'turn-into-dev': ['wodoo.lib_turnintodev'],
+    'uninstall': ['wodoo.lib_module'],
+    'unittest': ['wodoo.lib_module'],
+    'up': ['wodoo.lib_control'],
+    'update': ['wodoo.lib_module'],
+    'update-ast': ['wodoo.lib_src'],
+    'update-i18n': ['wodoo.lib_module'],
+    'update-module-file': ['wodoo.lib_module'],
+    'update-setting': ['wodoo.lib_turnintodev'],
+    'upgrade': ['wodoo.lib_setup'],
+    'users': ['wodoo.lib_talk'],
+    'wait-for-container-postgres': ['wodoo.lib_control'],
+    'wait-for-port': ['wodoo.lib_control'],
+    'xmlids': ['wodoo.lib_talk'],
+}
+# END GENERATED
+
+
+def collect():
+    """
+    Imports all modules and returns the commands and sub commands of cli.
+    """
+    import importlib
+    from .cli import cli
+
+    for module in MODULES:
+        importlib.import_module(f"{__package__}.{module}")
+
+    commands, subcommands = {}, {}
+    for name, cmd in sorted(cli.commands.items()):
+        module = cmd.callback.__module__
+        if module == cli.callback.__module__:
+            continue
+        help = None if cmd.hidden else cmd.get_short_help_str(limit=1000)
+        commands[name] = (module, help)
+        for subname, subcmd in getattr(cmd, "commands", {}).items():
+            subcommands.setdefault(subname, set()).add(subcmd.callback.__module__)
+    subcommands = {k: sorted(v) for k, v in sorted(subcommands.items())}
+    return commands, subcommands
+
+
+def generate():
+    commands, subcommands = collect()
+    lines = ["COMMANDS = {"]
+    lines += [f"    {k!r}: {v!r}," for k, v in commands.items()]
+    lines += ["}", "SUBCOMMANDS = {"]
+    lines += [f"    {k!r}: {v!r}," for k, v in subcommands.items()]
+    lines += ["}"]
+
+    path = Path(__file__)
+    content = path.read_text()
+    start = content.index("# BEGIN GENERATED\n") + len("# BEGIN GENERATED\n")
+    end = content.index("# END GENERATED\n")
+    path.write_text(content[:start] + "\n".join(lines) + "\n" + content[end:])
+    print(f"{len(commands)} commands, {len(subcommands)} sub commands")
+
+
+if __name__ == "__main__":
+    generate()
@@ -0,0 +1,255 @@
+"""
+Shell completion of module names, robot test files and OCA modules.
+
+The candidates are kept in small cache files below ~/.odoo/completion, one
+per kind and customs directory. A stale cache is still answered from and
+refreshed by a background process; only a missing or outdated cache (see
+_get_watched_paths) is built while the shell waits.
+
+complete() is called by the package before the cli is imported; it
+answers the arguments of the commands in COMMANDS directly and leaves
+everything else to click.
+
+"""
+import os
+import sys
+import time
+import shlex
+import hashlib
+from pathlib import Path
+
+CACHE_DIR = Path(os.path.expanduser("~/.odoo/completion"))
+# seconds after which a cache is refreshed in background
+MAX_AGE = {"modules": 3600, "robottests": 60, "oca_modules": 3600}
+REFRESH_TIMEOUT = 600
+# (group, command): kind; the command alone is found, too (odoo update ...)
+COMMANDS = {
+    ("odoo-module", "update"): "modules",
+    ("odoo-module", "robotest"): "robottests",
+    ("src", "fetch-modules"): "oca_modules",
+}
+# commands taking one argument; the others take many
+SINGLE_ARGUMENT = {"robottests"}
+
+
+def _customs_dir():
+    # like odoo_config.customs_dir, which imports too much for completion
+    if os.getenv("CUSTOMS_DIR"):
+        return Path(os.environ["CUSTOMS_DIR"])
+    here = Path(os.getcwd())
+    while not (here / "MANIFEST").exists():
+        if here.parent == here:
+            return None
+        here = here.parent
+    return here
+
+
+def _cache_file(kind, root):
+    key = hashlib.sha1(str(root).encode("utf-8")).hexdigest()[:16]
+    return CACHE_DIR / f"{kind}.{key}"
+
+
+def _marker_file(kind, root):
+    path = _cache_file(kind, root)
+    return path.with_name(f"{path.name}.refreshing")
+
+
+def _build(kind, root):
+    if kind == "modules":
+        from .odoo_config import MANIFEST
+
+        return MANIFEST()["install"]
+    if kind == "robottests":
+        from .robo_helpers import _get_all_robottest_files
+
+        return list(map(str, _get_all_robottest_files(root)))
+    if kind == "oca_modules":
+        from .lib_src import OdooShRepo
+        from .odoo_config import current_version
+
+        modules = OdooShRepo(current_version()).find_module("", exact_match=False)
+        return sorted(set(x.name for x in modules))
+    raise KeyError(kind)
+
+
+def refresh(kind, root):
+    """
+    Builds the candidates and writes the cache file.
+    """
+    path = _cache_file(kind, root)
+    candidates = _build(kind, root)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tempfile = path.parent / f".{path.name}.{os.getpid()}"
+    tempfile.write_text("".join(f"{x}\n" for x in candidates))
+    tempfile.rename(path)
+    return candidates
+
+
+def _refresh_in_background(kind, root):
+    import subprocess
+
+    marker = _marker_file(kind, root)
+    try:
+        if time.time() - marker.stat().st_mtime < REFRESH_TIMEOUT:
+            return
+    except FileNotFoundError:
+        pass
+    marker.touch()
+    env = dict(os.environ)
+    env.pop("_ODOO_COMPLETE", None)
+    subprocess.Popen(
+        [sys.executable, "-m", "wodoo.completion", kind, str(root)],
+        cwd=str(root),
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def _get_watched_paths(kind, root, candidates):
+    """
+    Paths whose change outdates the cache at once: the MANIFEST for the
+    modules; for the robot tests the directories of the cached files and
+    their parents, whose mtime changes when files or directories are added
+    or removed in them.
+    """
+    if kind == "modules":
+        return [root / "MANIFEST"]
+    if kind == "robottests":
+        result = {root}
+        for file in candidates:
+            path = (root / file).parent
+            while path not in result:
+                result.add(path)
+                path = path.parent
+        return result
+    return []
+
+
+def _is_outdated(kind, root, candidates, mtime):
+    for path in _get_watched_paths(kind, root, candidates):
+        try:
+            if path.stat().st_mtime > mtime:
+                return True
+        except FileNotFoundError:
+            return True
+    return False
+
+
+def get_candidates(kind, root=None, build=True):
+    """
+    The cached candidates; without build None is returned, if they have to
+    be built first.
+    """
+    root = root or _customs_dir()
+    if not root:
+        return []
+    path = _cache_file(kind, root)
+    try:
+        mtime = path.stat().st_mtime
+        result = path.read_text().splitlines()
+    except FileNotFoundError:
+        mtime = None
+    if not mtime or _is_outdated(kind, root, result, mtime):
+        return refresh(kind, root) if build else None
+    if time.time() - mtime > MAX_AGE[kind]:
+        _refresh_in_background(kind, root)
+    return result
+
+
+def candidates(kind, incomplete, build=True):
+    """
+    The completion of incomplete; see get_candidates for build.
+    """
+    root = _customs_dir()
+    result = get_candidates(kind, root, build=build)
+    if result is None:
+        return None
+    if kind == "robottests":
+        # relative to the current directory
+        cwd = Path(os.getcwd())
+        if root and root in cwd.parents:
+            prefix = f"{cwd.relative_to(root)}/"
+            result = [x[len(prefix) :] for x in result if x.startswith(prefix)]
+        if "/" in incomplete:
+            return sorted(x for x in result if x.startswith(incomplete))
+    result = sorted(x for x in result if incomplete in x)
+    if kind == "oca_modules" and incomplete:
+        result = result[:10]
+    return result
+
+
+def _split(string):
+    # like click.shell_completion.split_arg_string
+    lex = shlex.shlex(string, posix=True)
+    lex.whitespace_split = True
+    lex.commenters = ""
+    result = []
+    try:
+        for token in lex:
+            result.append(token)
+    except ValueError:
+        result.append(lex.token)
+    return result
+
+
+def _get_kind(args):
+    if len(args) >= 2 and tuple(args[:2]) in COMMANDS:
+        return COMMANDS[tuple(args[:2])], args[2:]
+    for (group, name), kind in COMMANDS.items():
+        if args and args[0] == name:
+            return kind, args[1:]
+    return None, args
+
+
+def complete():
+    """
+    Prints the completion for the shell (_ODOO_COMPLETE=bash_complete,
+    zsh_complete or fish_complete) if it is served from an existing cache;
+    returns False if click has to complete.
+    """
+    shell, _, instruction = os.getenv("_ODOO_COMPLETE", "").partition("_")
+    if instruction != "complete" or shell not in ["bash", "zsh", "fish"]:
+        return False
+    words = _split(os.getenv("COMP_WORDS", ""))
+    if shell == "fish":
+        incomplete = os.getenv("COMP_CWORD", "")
+        args = words[1:]
+        if incomplete and args and args[-1] == incomplete:
+            args.pop()
+    else:
+        cword = int(os.getenv("COMP_CWORD", "0"))
+        args = words[1:cword]
+        incomplete = words[cword] if cword < len(words) else ""
+
+    # options and their values are left to click
+    if incomplete.startswith("-") or any(x.startswith("-") for x in args):
+        return False
+    kind, positional = _get_kind(args)
+    if not kind or (kind in SINGLE_ARGUMENT and positional):
+        return False
+    # building needs the initialized package and is left to the callbacks
+    result = candidates(kind, incomplete, build=False)
+    if result is None:
+        return False
+
+    if shell == "zsh":
+        lines = [f"plain\n{x}\n_" for x in result]
+    else:
+        lines = [f"plain,{x}" for x in result]
+    sys.stdout.write("\n".join(lines) + "\n")
+    return True
+
+
+if __name__ == "__main__":
+    # background refresh: python -m wodoo.completion <kind> <root>
+    kind, root = sys.argv[1:]
+    try:
+        refresh(kind, Path(root))
+    finally:
+        try:
+            _marker_file(kind, Path(root)).unlink()
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,411 @@
+"""
+Merges docker-compose files like "docker-compose config" does, without
+starting docker-compose.
+
+Only the constructs, which the wodoo compose files use, are implemented:
+
+  * interpolation of $VAR, ${VAR}, ${VAR:-default}, ${VAR-default},
+    ${VAR:?error}, ${VAR?error} and $$
+  * merging services: scalars are overridden, mappings (environment,
+    labels, build, ...) are merged, lists (ports, env_file, ...) are
+    appended, volumes are merged by their container path
+  * env_file is read into environment, environment and labels become
+    mappings
+  * top level networks and volumes are merged by name
+
+Anything else (extends, secrets, relative or ~ paths, unknown keys, other
+shapes of known keys like extra_hosts as mapping) raises
+UnsupportedCompose; the caller then asks docker-compose. Errors in the
+files raise ComposeError with the index of the offending file.
+
+"""
+import re
+import click
+
+SCALAR_KEYS = {
+    "cgroup_parent",
+    "command",
+    "container_name",
+    "cpu_quota",
+    "cpu_shares",
+    "cpus",
+    "cpuset",
+    "domainname",
+    "entrypoint",
+    "hostname",
+    "image",
+    "init",
+    "ipc",
+    "mac_address",
+    "mem_limit",
+    "mem_reservation",
+    "memswap_limit",
+    "network_mode",
+    "oom_score_adj",
+    "pid",
+    "platform",
+    "privileged",
+    "pull_policy",
+    "read_only",
+    "restart",
+    "runtime",
+    "scale",
+    "shm_size",
+    "stdin_open",
+    "stop_grace_period",
+    "stop_signal",
+    "tty",
+    "user",
+    "userns_mode",
+    "working_dir",
+}
+MAPPING_KEYS = {
+    "build",
+    "depends_on",
+    "deploy",
+    "environment",
+    "healthcheck",
+    "labels",
+    "logging",
+    "networks",
+    "sysctls",
+    "ulimits",
+}
+LIST_KEYS = {
+    "cap_add",
+    "cap_drop",
+    "devices",
+    "dns",
+    "dns_search",
+    "env_file",
+    "expose",
+    "external_links",
+    "extra_hosts",
+    "group_add",
+    "links",
+    "ports",
+    "profiles",
+    "security_opt",
+    "tmpfs",
+    "volumes_from",
+}
+TOP_LEVEL_KEYS = {"version", "services", "networks", "volumes"}
+
+INTERPOLATION = re.compile(
+    r"\$(?:(?P<escaped>\$)"
+    r"|(?P<named>[_a-zA-Z][_a-zA-Z0-9]*)"
+    r"|\{(?P<braced>[_a-zA-Z][_a-zA-Z0-9]*)(?:(?P<sep>:?[-?])(?P<arg>[^}]*))?\}"
+    r"|(?P<invalid>))"
+)
+
+
+class ComposeError(Exception):
+    def __init__(self, msg, index=None):
+        super().__init__(msg)
+        self.index = index
+
+
+class UnsupportedCompose(Exception):
+    pass
+
+
+def interpolate(value, env, missing=None):
+    """
+    Replaces variables in the string value; names of unset variables are
+    added to missing.
+    """
+
+    def replace(match):
+        if match.group("escaped"):
+            return "$"
+        if match.group("invalid") is not None:
+            raise ValueError(f"Invalid interpolation format: {value!r}")
+        name = match.group("named") or match.group("braced")
+        sep = match.group("sep")
+        if name in env and (env[name] or not sep or not sep.startswith(":")):
+            return env[name]
+        if sep and sep.endswith("-"):
+            return match.group("arg")
+        if sep and sep.endswith("?"):
+            raise ValueError(f"Missing variable {name}: {match.group('arg')}")
+        if missing is not None:
+            missing.add(name)
+        return ""
+
+    return INTERPOLATION.sub(replace, value)
+
+
+def _interpolate_values(value, env, missing):
+    if isinstance(value, str):
+        return interpolate(value, env, missing)
+    if isinstance(value, dict):
+        return {k: _interpolate_values(v, env, missing) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_interpolate_values(x, env, missing) for x in value]
+    return value
+
+
+def _escape_dollar(value):
+    # the result is read by docker-compose again
+    if isinstance(value, str):
+        return value.replace("$", "$$")
+    if isinstance(value, dict):
+        return {k: _escape_dollar(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_escape_dollar(x) for x in value]
+    return value
+
+
+def _to_mapping(key, value, separator="="):
+    """
+    environment, labels, ... may be a list of "KEY=VALUE".
+    """
+    if value is None:
+        return {}
+    if isinstance(value, dict):
+        return dict(value)
+    if not isinstance(value, list):
+        raise UnsupportedCompose(f"{key} as {type(value).__name__}")
+    result = {}
+    for item in value:
+        if not isinstance(item, str):
+            raise UnsupportedCompose(f"{key} containing {item!r}")
+        if separator in item:
+            k, v = item.split(separator, 1)
+        else:
+            k, v = item, None
+        result[k] = v
+    return result
+
+
+def _to_list(key, value):
+    if value is None:
+        return []
+    if isinstance(value, (str, int)):
+        return [value]
+    if not isinstance(value, list):
+        raise UnsupportedCompose(f"{key} as {type(value).__name__}")
+    return value
+
+
+def _is_relative(path):
+    # relative to the project directory or the home directory
+    return str(path).startswith((".", "~"))
+
+
+def _volume_target(volume):
+    if isinstance(volume, dict):
+        if "target" not in volume or _is_relative(volume.get("source", "")):
+            raise UnsupportedCompose(f"volume {volume}")
+        return volume["target"]
+    if not isinstance(volume, str):
+        raise UnsupportedCompose(f"volume {volume!r}")
+    parts = volume.split(":")
+    if _is_relative(parts[0]):
+        raise UnsupportedCompose(f"relative volume {volume}")
+    if len(parts) == 1:
+        return parts[0]
+    return parts[1]
+
+
+def _deep_merge(base, override):
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            _deep_merge(base[key], value)
+        else:
+            base[key] = value
+    return base
+
+
+def _normalize_mapping(key, value):
+    if key == "environment":
+        return _to_mapping(key, value, "=")
+    if key in ["labels", "sysctls"]:
+        return {
+            k: "" if v is None else v for k, v in _to_mapping(key, value).items()
+        }
+    if key == "build":
+        if isinstance(value, str):
+            value = {"context": value}
+        if not isinstance(value, dict):
+            raise UnsupportedCompose(f"build as {type(value).__name__}")
+        value = dict(value)
+        if "args" in value:
+            value["args"] = _to_mapping("build.args", value["args"])
+        return value
+    if key in ["networks", "depends_on"]:
+        if isinstance(value, list):
+            return {x: None for x in value}
+        if value is None:
+            return {}
+    if not isinstance(value, dict):
+        raise UnsupportedCompose(f"{key} as {type(value).__name__}")
+    return value
+
+
+def _merge_service(service, update):
+    for key, value in update.items():
+        if key in SCALAR_KEYS:
+            service[key] = value
+        elif key in MAPPING_KEYS:
+            value = _normalize_mapping(key, value)
+            if key in ["environment", "labels", "sysctls", "depends_on"]:
+                service.setdefault(key, {}).update(value)
+            else:
+                _deep_merge(service.setdefault(key, {}), value)
+        elif key in LIST_KEYS:
+            existing = service.setdefault(key, [])
+            for item in _to_list(key, value):
+                if item not in existing:
+                    existing.append(item)
+        elif key == "volumes":
+            volumes = service.setdefault("volumes", {})
+            for volume in _to_list(key, value):
+                volumes[_volume_target(volume)] = volume
+        else:
+            raise UnsupportedCompose(f"service key {key}")
+
+
+def _read_env_file(path):
+    """
+    KEY=VALUE lines; values in quotes are unquoted.
+    """
+    if not path.startswith("/"):
+        raise UnsupportedCompose(f"relative env_file {path}")
+    try:
+        with open(path) as file:
+            lines = file.read().splitlines()
+    except FileNotFoundError:
+        raise ComposeError(f"Couldn't find env file: {path}")
+    result = {}
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        key, value = line.split("=", 1) if "=" in line else (line, None)
+        key = key.strip()
+        if key.startswith("export "):
+            key = key[len("export ") :].strip()
+        if value:
+            value = value.strip()
+        if value and len(value) > 1 and value[0] == value[-1] and value[0] in "'\"":
+            value = value[1:-1]
+        result[key] = value
+    return result
+
+
+def _stringify(key, mapping):
+    result = {}
+    for k, v in mapping.items():
+        if isinstance(v, bool):
+            raise ComposeError(
+                f"{key} contains {k}: {v}, which is an invalid type, "
+                "it should be a string, number, or a null"
+            )
+        result[k] = v if v is None else str(v)
+    return result
+
+
+def _resolve_service(name, service, env):
+    environment = {}
+    for path in service.get("env_file", []):
+        environment.update(_read_env_file(path))
+    environment.update(service.pop("environment", {}))
+    for key, value in environment.items():
+        if value is None and key in env:
+            environment[key] = env[key]
+    service["environment"] = _stringify("environment", environment)
+    service.pop("env_file", None)
+
+    if "labels" in service:
+        service["labels"] = _stringify("labels", service["labels"])
+    if "volumes" in service:
+        service["volumes"] = list(service["volumes"].values())
+    depends_on = service.get("depends_on")
+    if depends_on is not None and not any(depends_on.values()):
+        service["depends_on"] = list(depends_on)
+
+    build = service.get("build")
+    if build:
+        context = str(build.get("context", "."))
+        if not context.startswith("/") and "://" not in context:
+            raise UnsupportedCompose(f"relative build context {context}")
+        build["context"] = context
+    if not service.get("image") and not build:
+        raise ComposeError(
+            f"Service {name} has neither an image nor a build context specified."
+        )
+
+
+def _validate(content, index):
+    if not isinstance(content, dict):
+        raise ComposeError("Top level object must be a mapping", index)
+    for key in content:
+        if key not in TOP_LEVEL_KEYS and not str(key).startswith("x-"):
+            raise UnsupportedCompose(f"top level key {key}")
+    for key in ["services", "networks", "volumes"]:
+        if content.get(key) is not None and not isinstance(content[key], dict):
+            raise ComposeError(f"{key} must be a mapping", index)
+    for name, service in (content.get("services") or {}).items():
+        if service is None:
+            continue
+        if not isinstance(service, dict):
+            raise ComposeError(f"Service {name} must be a mapping", index)
+        if "extends" in service:
+            raise UnsupportedCompose("extends")
+
+
+def merge(contents, env):
+    """
+    Returns the complete configuration of the given compose file contents
+    (parsed yaml) like "docker-compose config" does.
+    """
+    result = {"services": {}, "networks": {}, "volumes": {}}
+    missing = set()
+    for index, content in enumerate(contents):
+        _validate(content, index)
+        try:
+            content = _interpolate_values(content, env, missing)
+        except ValueError as ex:
+            raise ComposeError(str(ex), index)
+        if content.get("version"):
+            result["version"] = content["version"]
+        for key in ["networks", "volumes"]:
+            for name, value in (content.get(key) or {}).items():
+                if value is not None and not isinstance(value, dict):
+                    raise UnsupportedCompose(f"{key} {name} as {type(value).__name__}")
+                _deep_merge(result[key].setdefault(name, {}), value or {})
+        for name, service in (content.get("services") or {}).items():
+            try:
+                _merge_service(result["services"].setdefault(name, {}), service or {})
+            except ComposeError as ex:
+                raise ComposeError(f"Service {name}: {ex}", index)
+
+    for name in sorted(missing):
+        click.secho(
+            f"WARNING: The {name} variable is not set. "
+            "Defaulting to a blank string.",
+            fg="yellow",
+        )
+
+    services = result["services"]
+    for name, service in services.items():
+        _resolve_service(name, service, env)
+        for dependency in service.get("depends_on", []):
+            if dependency not in services:
+                raise ComposeError(
+                    f"Service {name} depends on service {dependency} "
+                    "which is undefined."
+                )
+        for network in service.get("networks") or {}:
+            if network != "default" and network not in result["networks"]:
+                raise ComposeError(
+                    f"Service {name} uses an undefined network {network}"
+                )
+
+    for key in ["networks", "volumes"]:
+        if not result[key]:
+            result.pop(key)
+        else:
+            result[key] = {k: v or None for k, v in result[key].items()}
+    return _escape_dollar(result)
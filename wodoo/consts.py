@@ -61,4 +61,5 @@ default_commands = {
     'dc': ['${docker_compose_bin}', "-p", "${project_name}", "-f",  "${docker_compose}"],
 }
 
-FILE_DIRHASHES = '.dirhashes'
\ No newline at end of file
+FILE_DIRHASHES = '.dirhashes'
+FILE_MODULE_INDEX = 'module_index'
@@ -0,0 +1,178 @@
+"""
+Dependency graph of modules with precomputed transitive closures.
+
+Every node gets an integer id; the transitive closure of a node is stored
+as a python int used as bitset (bit n set = node with id n is a
+dependency). Closures are computed once in topological order (all
+dependencies of a node are finished before the node itself), so union and
+subset queries are plain integer operations working on machine words.
+
+"""
+
+
+class CyclicDependency(Exception):
+    pass
+
+
+class DependencyGraph(object):
+    def __init__(self, resolve):
+        """
+        resolve: callable name -> (payload, list of dependency names)
+        """
+        self._resolve = resolve
+        self.ids = {}
+        self.names = []
+        self.payloads = []
+        self.depends = []
+        self.closures = []
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.ids
+
+    def _new_node(self, name):
+        payload, depends = self._resolve(name)
+        id = len(self.names)
+        self.ids[name] = id
+        self.names.append(name)
+        self.payloads.append(payload)
+        self.depends.append(list(depends))
+        self.closures.append(None)
+        return id
+
+    def id(self, name):
+        """
+        Returns the id of the node; the node and all its dependencies are
+        added and their closures computed if not done yet.
+        """
+        id = self.ids.get(name)
+        if id is None:
+            id = self._new_node(name)
+        if self.closures[id] is None:
+            self._compute(id)
+        return id
+
+    def _compute(self, root):
+        # iterative post-order walk; avoids recursion limits on deep trees
+        visiting = {root}
+        stack = [(root, 0)]
+        while stack:
+            id, pos = stack.pop()
+            depends = self.depends[id]
+            if pos < len(depends):
+                stack.append((id, pos + 1))
+                dep = depends[pos]
+                dep_id = self.ids.get(dep)
+                if dep_id is None:
+                    dep_id = self._new_node(dep)
+                if self.closures[dep_id] is not None:
+                    continue
+                if dep_id in visiting:
+                    cycle = [self.names[x[0]] for x in stack] + [dep]
+                    raise CyclicDependency(
+                        f"Recursive loop in dependencies: {' -> '.join(cycle)}"
+                    )
+                visiting.add(dep_id)
+                stack.append((dep_id, 0))
+                continue
+
+            closure = 0
+            for dep in depends:
+                dep_id = self.ids[dep]
+                closure |= (1 << dep_id) | self.closures[dep_id]
+            self.closures[id] = closure
+            visiting.discard(id)
+
+    def closure(self, name):
+        """
+        Bitset of all direct and indirect dependencies of name.
+        """
+        return self.closures[self.id(name)]
+
+    def closure_of_depends(self, depends):
+        """
+        Bitset of all direct and indirect dependencies of a node which is
+        not part of the graph but depends on the given names.
+        """
+        result = 0
+        for dep in depends:
+            id = self.id(dep)
+            result |= (1 << id) | self.closures[id]
+        return result
+
+    def bits(self, names):
+        """
+        Bitset of the given names (without their dependencies).
+        """
+        result = 0
+        for name in names:
+            result |= 1 << self.id(name)
+        return result
+
+    def union(self, names):
+        """
+        Bitset of the given names plus all their dependencies.
+        """
+        result = 0
+        for name in names:
+            id = self.id(name)
+            result |= (1 << id) | self.closures[id]
+        return result
+
+    @staticmethod
+    def is_subset(bits, of_bits):
+        return not bits & ~of_bits
+
+    @staticmethod
+    def count(bits):
+        return bin(bits).count("1")
+
+    def resolve_triggers(self, installed, candidates):
+        """
+        Adds candidates (like auto install modules) to installed as soon
+        as all their required nodes are installed; added candidates may
+        trigger further candidates.
+
+        installed: bitset
+        candidates: list of tuples (id, required bitset)
+
+        Every candidate keeps a counter of its missing requirements; when a
+        node is added the counters of the candidates waiting for it are
+        decremented and the candidate is triggered at zero (like Kahn's
+        topological sort), so every requirement is looked at only once.
+        """
+        waiting = {}
+        missing_count = []
+        worklist = []
+        for idx, (id, required) in enumerate(candidates):
+            missing = required & ~installed
+            missing_count.append(self.count(missing))
+            if not missing:
+                worklist.append(idx)
+            for dep_id in self.iter_ids(missing):
+                waiting.setdefault(dep_id, []).append(idx)
+
+        while worklist:
+            id = candidates[worklist.pop()][0]
+            if installed >> id & 1:
+                continue
+            installed |= 1 << id
+            for idx in waiting.pop(id, []):
+                missing_count[idx] -= 1
+                if not missing_count[idx]:
+                    worklist.append(idx)
+        return installed
+
+    def iter_ids(self, bits):
+        while bits:
+            lowest = bits & -bits
+            yield lowest.bit_length() - 1
+            bits ^= lowest
+
+    def get_names(self, bits):
+        return [self.names[x] for x in self.iter_ids(bits)]
+
+    def get_payloads(self, bits):
+        return [self.payloads[x] for x in self.iter_ids(bits)]
@@ -0,0 +1,168 @@
+"""
+In-process directory hashing.
+
+The digest is compatible with "dtreetrawl -N --hash -R <path>" which was
+used before:
+
+  * all regular files below path are collected; symlinks are not followed
+    and not hashed, file names are not part of the digest
+  * directories named __pycache__ and files ending with .pyc are ignored
+  * every file is hashed with md5; the lowercase hex digests are sorted
+    and concatenated
+  * the result is the md5 hex digest of that concatenation (so an empty
+    directory gives md5 of the empty string)
+
+File digests are remembered in a persistent cache keyed by path, size,
+mtime_ns and inode, so unchanged trees are not read again.
+
+"""
+import os
+import stat
+import time
+import atexit
+import pickle
+import hashlib
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from .tools import atomic_write
+from .consts import FILE_DIRHASHES
+
+CACHE_VERSION = 1
+CHUNK_SIZE = 1024 * 1024
+# files modified so recently may change again within the same mtime tick
+RACY_SECONDS = 2
+
+_cache = {}
+
+
+def _hash_file(path):
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _walk_files(path):
+    """
+    Yields (path, stat) of all regular files below path.
+    """
+    try:
+        st = os.lstat(path)
+    except FileNotFoundError:
+        return
+    if stat.S_ISREG(st.st_mode):
+        if not path.endswith(".pyc"):
+            yield path, st
+        return
+    if not stat.S_ISDIR(st.st_mode):
+        return
+
+    todo = [path]
+    while todo:
+        with os.scandir(todo.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name != "__pycache__":
+                        todo.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    if not entry.name.endswith(".pyc"):
+                        yield entry.path, entry.stat(follow_symlinks=False)
+
+
+class DirectoryHashCache(object):
+    def __init__(self, path):
+        self.path = Path(path) if path else None
+        self.entries = self._load()
+        self.seen = set()
+        self.roots = set()
+        self.dirty = False
+
+    def _load(self):
+        if not self.path or not self.path.exists():
+            return {}
+        try:
+            data = pickle.loads(self.path.read_bytes())
+        except Exception:
+            return {}
+        if not isinstance(data, dict) or data.get("version") != CACHE_VERSION:
+            return {}
+        return data["entries"]
+
+    def save(self):
+        if not self.dirty or not self.path:
+            return
+        # forget files, which vanished from the hashed directories
+        roots = tuple(x + os.sep for x in self.roots)
+        entries = {
+            k: v
+            for k, v in self.entries.items()
+            if k in self.seen or not k.startswith(roots)
+        }
+        try:
+            self.path.parent.mkdir(exist_ok=True, parents=True)
+            with atomic_write(self.path) as tempfile:
+                tempfile.write_bytes(
+                    pickle.dumps({"version": CACHE_VERSION, "entries": entries})
+                )
+        except OSError:
+            return
+        self.dirty = False
+
+    def get_directory_hash(self, path, use_cache=True, workers=None):
+        path = os.path.abspath(str(path))
+        self.roots.add(path)
+        racy = int((time.time() - RACY_SECONDS) * 10**9)
+
+        digests = []
+        todo = []
+        for filepath, st in _walk_files(path):
+            key = (st.st_size, st.st_mtime_ns, st.st_ino)
+            self.seen.add(filepath)
+            cached = self.entries.get(filepath) if use_cache else None
+            if cached and cached[0] == key:
+                digests.append(cached[1])
+            else:
+                todo.append((filepath, key, st.st_mtime_ns < racy))
+
+        if todo:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                # hashlib releases the GIL for bigger buffers
+                results = executor.map(_hash_file, [x[0] for x in todo])
+                for (filepath, key, cacheable), digest in zip(todo, results):
+                    digests.append(digest)
+                    if cacheable:
+                        self.entries[filepath] = (key, digest)
+                        self.dirty = True
+
+        root = hashlib.md5()
+        for digest in sorted(digests):
+            root.update(digest.encode("ascii"))
+        return root.hexdigest()
+
+
+def get_cache_file():
+    run_dir = os.getenv("HOST_RUN_DIR")
+    if run_dir:
+        return Path(run_dir) / FILE_DIRHASHES
+    return Path(os.path.expanduser("~/.odoo")) / FILE_DIRHASHES
+
+
+def get_directory_hash_cache():
+    if "cache" not in _cache:
+        _cache["cache"] = DirectoryHashCache(get_cache_file())
+    return _cache["cache"]
+
+
+def get_directory_hash(path, use_cache=True):
+    return get_directory_hash_cache().get_directory_hash(path, use_cache=use_cache)
+
+
+@atexit.register
+def _save_cache():
+    cache = _cache.get("cache")
+    if cache:
+        cache.save()
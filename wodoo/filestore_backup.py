@@ -0,0 +1,268 @@
+"""
+Incremental filestore backups.
+
+The odoo filestore is content addressed already: attachments are stored as
+<sha1[:2]>/<sha1>. A backup store keeps every blob once and a manifest per
+backup run, which lists the files of the filestore at that time:
+
+    <store>/blobs/<sha1[:2]>/<sha1>
+    <store>/manifests/<name>.%Y%m%d%H%M%S[_<counter>].json.gz
+
+A backup only copies blobs, which are not in the store yet. Files, which do
+not follow the odoo naming, are hashed. A point in time filestore is
+restored from one manifest; pruning removes manifests by retention and then
+all blobs, which no manifest references anymore.
+
+"""
+import os
+import re
+import json
+import gzip
+import fcntl
+import shutil
+import hashlib
+import contextlib
+from functools import partial
+from datetime import datetime
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+MANIFEST_VERSION = 1
+CHUNK_SIZE = 1024 * 1024
+ODOO_FILENAME = re.compile(r"^([0-9a-f]{2})/(\1[0-9a-f]{38})$")
+
+
+def _sha1(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as file:
+        while True:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _iter_filestore(root):
+    """
+    Yields relative path and size of all regular files below root.
+    """
+    root = str(root)
+    todo = [root]
+    while todo:
+        with os.scandir(todo.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    todo.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    rel_path = os.path.relpath(entry.path, root)
+                    yield rel_path, entry.stat(follow_symlinks=False).st_size
+
+
+class FilestoreBackupStore(object):
+    def __init__(self, path):
+        self.path = Path(path)
+        self.blobs_dir = self.path / "blobs"
+        self.manifests_dir = self.path / "manifests"
+
+    @contextlib.contextmanager
+    def lock(self):
+        """
+        Backup and prune must not run at the same time: prune would remove
+        the blobs of a backup, whose manifest is not written yet.
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self.path / ".lock", "w") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+    def blob_path(self, sha1):
+        return self.blobs_dir / sha1[:2] / sha1
+
+    def _list_blobs(self):
+        result = {}
+        if not self.blobs_dir.exists():
+            return result
+        for rel_path, size in _iter_filestore(self.blobs_dir):
+            name = os.path.basename(rel_path)
+            if not name.startswith("."):
+                result[name] = size
+        return result
+
+    def _list_tempfiles(self):
+        """
+        Left over by interrupted backups; only safe to remove while locked.
+        """
+        result = []
+        for directory in [self.blobs_dir, self.manifests_dir]:
+            if not directory.exists():
+                continue
+            for rel_path, size in _iter_filestore(directory):
+                name = os.path.basename(rel_path)
+                if name.startswith(".") and name.endswith(".tmp"):
+                    result.append((directory / rel_path, size))
+        return result
+
+    def manifests(self):
+        if not self.manifests_dir.exists():
+            return []
+        return sorted(self.manifests_dir.glob("*.json.gz"))
+
+    def latest_manifest(self):
+        manifests = self.manifests()
+        return manifests[-1] if manifests else None
+
+    @staticmethod
+    def read_manifest(path):
+        with gzip.open(str(path), "rt") as file:
+            data = json.load(file)
+        if data.get("version") != MANIFEST_VERSION:
+            raise Exception(f"Unsupported manifest version in {path}")
+        return data
+
+    def _add_blob(self, source, sha1):
+        dest = self.blob_path(sha1)
+        dest.parent.mkdir(exist_ok=True)
+        tempfile = dest.parent / f".{sha1}.tmp"
+        shutil.copyfile(source, tempfile)
+        tempfile.rename(dest)
+
+    def _new_manifest_path(self, name):
+        # the timestamp has seconds only; a counter keeps the names unique
+        # and sorted for backups within the same second ("_" > ".")
+        stamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        for counter in range(1000):
+            suffix = f"_{counter:03d}" if counter else ""
+            path = self.manifests_dir / f"{name}.{stamp}{suffix}.json.gz"
+            if not path.exists():
+                return path
+        raise Exception(f"Too many backups at {stamp}")
+
+    def backup(self, filestore, name, workers=None):
+        """
+        Copies new blobs of filestore and writes a manifest; returns the
+        manifest path and the count and size of the copied blobs.
+        """
+        filestore = Path(filestore)
+        with self.lock():
+            existing = self._list_blobs()
+            files = {}
+            todo = {}
+            hashing = []
+            for rel_path, size in _iter_filestore(filestore):
+                match = ODOO_FILENAME.match(rel_path.replace(os.sep, "/"))
+                if match:
+                    sha1 = match.group(2)
+                    files[rel_path] = [sha1, size]
+                    if existing.get(sha1) != size:
+                        todo[sha1] = filestore / rel_path
+                else:
+                    hashing.append((rel_path, size))
+
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                # hashlib and file copies release the GIL
+                results = executor.map(_sha1, [filestore / x[0] for x in hashing])
+                for (rel_path, size), sha1 in zip(hashing, results):
+                    files[rel_path] = [sha1, size]
+                    if existing.get(sha1) != size:
+                        todo[sha1] = filestore / rel_path
+
+                self.blobs_dir.mkdir(parents=True, exist_ok=True)
+                list(executor.map(self._add_blob, todo.values(), todo.keys()))
+
+            self.manifests_dir.mkdir(parents=True, exist_ok=True)
+            manifest = self._new_manifest_path(name)
+            tempfile = manifest.parent / f".{manifest.name}.tmp"
+            with gzip.open(str(tempfile), "wt") as file:
+                json.dump(
+                    {
+                        "version": MANIFEST_VERSION,
+                        "created": datetime.now().isoformat(),
+                        "files": files,
+                    },
+                    file,
+                )
+            tempfile.rename(manifest)
+        sizes = dict(files.values())
+        return manifest, len(todo), sum(sizes[sha1] for sha1 in todo)
+
+    def restore(
+        self, manifest, dest, delete=False, workers=None, owner=None, verify=False
+    ):
+        """
+        Makes dest look like the filestore at the time of manifest. Files,
+        which exist with the right size, are kept; with verify only if their
+        content matches the sha1, too. Written files and directories get
+        owner.
+        """
+        from .filestore_restore import FilestoreWriter
+
+        dest = Path(dest)
+        files = self.read_manifest(manifest)["files"]
+        present = dict(_iter_filestore(dest)) if dest.exists() else {}
+
+        todo = []
+        unchanged = []
+        for rel_path, (sha1, size) in files.items():
+            if present.get(rel_path) != size:
+                todo.append((rel_path, sha1, size))
+            elif verify:
+                unchanged.append((rel_path, sha1, size))
+        if unchanged:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                hashes = executor.map(_sha1, [dest / x[0] for x in unchanged])
+                for item, sha1 in zip(unchanged, hashes):
+                    if item[1] != sha1:
+                        todo.append(item)
+
+        writer = FilestoreWriter(dest, owner=owner, workers=workers)
+        try:
+            for rel_path, sha1, size in todo:
+                source = partial(open, str(self.blob_path(sha1)), "rb")
+                writer.submit(rel_path, size, source, check=False)
+        finally:
+            writer.close()
+
+        removed = 0
+        if delete:
+            for rel_path in set(present) - set(files):
+                (dest / rel_path).unlink()
+                removed += 1
+        return len(todo), removed
+
+    def prune(self, remove_manifests=(), dry_run=False):
+        """
+        Removes the given manifests, all blobs not referenced by the
+        remaining ones and left over temporary files; returns count and
+        size of the removed files.
+        """
+        with self.lock():
+            remove_manifests = set(map(Path, remove_manifests))
+            referenced = set()
+            for manifest in self.manifests():
+                if manifest in remove_manifests:
+                    continue
+                for sha1, size in self.read_manifest(manifest)["files"].values():
+                    referenced.add(sha1)
+
+            if not dry_run:
+                for manifest in remove_manifests:
+                    manifest.unlink()
+
+            count, size = 0, 0
+            for sha1, blob_size in self._list_blobs().items():
+                if sha1 in referenced:
+                    continue
+                count += 1
+                size += blob_size
+                if not dry_run:
+                    self.blob_path(sha1).unlink()
+            for path, file_size in self._list_tempfiles():
+                count += 1
+                size += file_size
+                if not dry_run:
+                    path.unlink()
+        return count, size
@@ -0,0 +1,304 @@
+"""
+Parallel filestore restore.
+
+Files are written by a bounded pool of threads directly into the
+destination. Files, which exist already with the same size, are skipped;
+as filestore files are named by the sha1 of their content that is a cheap
+identity check. With verify the content of these files is hashed and
+compared to the name, so a warm target costs reading, not writing.
+
+Sources:
+
+  * tar files (gzip via pigz if installed, zstd multi threaded, plain)
+  * zip files (odoo.sh), every thread reads with an own file handle and
+    skipped entries are not even decompressed
+
+"""
+import os
+import re
+import time
+import shutil
+import hashlib
+import tarfile
+import zipfile
+import threading
+import subprocess
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+CHUNK_SIZE = 1024 * 1024
+# members up to this size are read into memory and written by the pool
+MAX_QUEUED_FILE_SIZE = 16 * 1024 * 1024
+ODOO_FILENAME = re.compile(r"^[0-9a-f]{40}$")
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+class RestoreStats(object):
+    def __init__(self):
+        self.started = time.time()
+        self.written = 0
+        self.skipped = 0
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def add(self, size, skipped):
+        with self.lock:
+            if skipped:
+                self.skipped += 1
+            else:
+                self.written += 1
+            self.size += size
+
+    def report(self):
+        elapsed = time.time() - self.started or 1e-6
+        files = self.written + self.skipped
+        return (
+            f"{files} files ({self.written} written, {self.skipped} unchanged), "
+            f"{self.size / 1024 / 1024:.1f} MB in {elapsed:.1f}s: "
+            f"{files / elapsed:.0f} files/s, "
+            f"{self.size / 1024 / 1024 / elapsed:.1f} MB/s"
+        )
+
+
+def _sha1(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as file:
+        while True:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_present(path, size, verify=False):
+    """
+    True if path is a file of size; with verify files named by a sha1 must
+    also match it.
+    """
+    try:
+        if os.stat(path).st_size != size:
+            return False
+    except (FileNotFoundError, NotADirectoryError):
+        return False
+    name = os.path.basename(path)
+    if verify and ODOO_FILENAME.match(name):
+        return _sha1(path) == name
+    return True
+
+
+class FilestoreWriter(object):
+    """
+    Writes files below dest with a bounded thread pool.
+    """
+
+    def __init__(self, dest, owner=None, workers=None, verify=False):
+        self.dest = Path(dest)
+        self.dest.mkdir(parents=True, exist_ok=True)
+        self.owner = owner
+        self.workers = workers or os.cpu_count() or 1
+        self.verify = verify
+        self.stats = RestoreStats()
+        self.created_dirs = set()
+        self.dirs_lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(self.workers * 4)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.futures = []
+
+    def target(self, name):
+        if name.startswith("/") or ".." in Path(name).parts:
+            raise Exception(f"Invalid path in archive: {name}")
+        return self.dest / name
+
+    def _makedirs(self, path):
+        with self.dirs_lock:
+            missing = []
+            while (
+                path != self.dest
+                and path not in self.created_dirs
+                and not path.exists()
+            ):
+                missing.append(path)
+                path = path.parent
+            for path in reversed(missing):
+                try:
+                    path.mkdir()
+                except FileExistsError:
+                    continue
+                if self.owner is not None:
+                    os.chown(path, self.owner, -1)
+            self.created_dirs.update(missing)
+
+    def _write(self, target, source, mode, mtime):
+        """
+        source: bytes or a callable returning a file object
+        """
+        self._makedirs(target.parent)
+        tempfile = target.parent / f".{target.name}.restoring"
+        fd = os.open(str(tempfile), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+        with os.fdopen(fd, "wb") as file:
+            if self.owner is not None:
+                os.fchown(fd, self.owner, -1)
+            if isinstance(source, bytes):
+                file.write(source)
+            else:
+                with source() as stream:
+                    shutil.copyfileobj(stream, file, CHUNK_SIZE)
+        os.utime(str(tempfile), (mtime, mtime))
+        tempfile.rename(target)
+
+    def _job(self, target, size, source, mode, mtime, check):
+        try:
+            skipped = check and is_present(target, size, self.verify)
+            if not skipped:
+                self._write(target, source, mode, mtime)
+            self.stats.add(size, skipped)
+        finally:
+            self.slots.release()
+
+    def submit(self, name, size, source, mode=0o644, mtime=None, check=True):
+        """
+        Queues the file; blocks if too many files are pending.
+        """
+        target = self.target(name)
+        self.slots.acquire()
+        future = self.executor.submit(
+            self._job, target, size, source, mode or 0o644, mtime or time.time(), check
+        )
+        self.futures.append(future)
+        if len(self.futures) > self.workers * 64:
+            self._collect(self.workers * 8)
+
+    def write(self, name, size, source, mode=0o644, mtime=None, check=True):
+        """
+        Writes the file in the calling thread.
+        """
+        self.slots.acquire()
+        self._job(
+            self.target(name), size, source, mode or 0o644, mtime or time.time(), check
+        )
+
+    def skip(self, size):
+        self.stats.add(size, True)
+
+    def _collect(self, keep=0):
+        while len(self.futures) > keep:
+            self.futures.pop(0).result()
+
+    def close(self):
+        try:
+            self._collect()
+        finally:
+            self.executor.shutdown()
+        return self.stats
+
+
+def _open_tar_stream(filepath):
+    with open(filepath, "rb") as file:
+        magic = file.read(4)
+    if magic.startswith(GZIP_MAGIC):
+        cmd = ["pigz" if shutil.which("pigz") else "gzip", "-dc"]
+    elif magic == ZSTD_MAGIC:
+        cmd = ["zstd", "-q", "-dc", "-T0"]
+    else:
+        return None
+    return subprocess.Popen(cmd + [str(filepath)], stdout=subprocess.PIPE)
+
+
+def restore_tar(
+    filepath, dest, prefix="", owner=None, workers=None, verify=False, on_other=None
+):
+    """
+    Restores the files of a (compressed) tar file below prefix into dest.
+    Other members are passed to on_other(tar, member). Returns the stats.
+    """
+    prefix = prefix.rstrip("/") + "/" if prefix else ""
+    writer = FilestoreWriter(dest, owner=owner, workers=workers, verify=verify)
+    proc = _open_tar_stream(filepath)
+    fileobj = proc.stdout if proc else open(filepath, "rb")
+    try:
+        with tarfile.open(fileobj=fileobj, mode="r|") as tar:
+            for member in tar:
+                name = member.name
+                if name.startswith("./"):
+                    name = name[2:]
+                if not name.startswith(prefix):
+                    if on_other:
+                        on_other(tar, member)
+                    continue
+                if not member.isfile():
+                    continue
+                name = name[len(prefix) :]
+                if not verify and is_present(writer.target(name), member.size):
+                    # checking in the reading thread keeps the tar stream fast
+                    writer.skip(member.size)
+                    continue
+                if member.size > MAX_QUEUED_FILE_SIZE:
+                    # the tar stream is sequential; big files are written here
+                    source = tar.extractfile(member)
+                    writer.write(
+                        name,
+                        member.size,
+                        lambda: source,
+                        mode=member.mode & 0o777,
+                        mtime=member.mtime,
+                        check=verify,
+                    )
+                    continue
+                writer.submit(
+                    name,
+                    member.size,
+                    tar.extractfile(member).read(),
+                    mode=member.mode & 0o777,
+                    mtime=member.mtime,
+                    check=verify,
+                )
+    finally:
+        fileobj.close()
+        stats = writer.close()
+    if proc and proc.wait():
+        raise Exception(f"{proc.args[0]} failed with exit code {proc.returncode}")
+    return stats
+
+
+def restore_zip(filepath, dest, prefix="", owner=None, workers=None, verify=False):
+    """
+    Restores the files of a zip file below prefix into dest. Returns the
+    stats.
+    """
+    prefix = prefix.rstrip("/") + "/" if prefix else ""
+    local = threading.local()
+    handles = []
+
+    def opener(zinfo):
+        def open_member():
+            if not hasattr(local, "zip"):
+                local.zip = zipfile.ZipFile(str(filepath))
+                handles.append(local.zip)
+            return local.zip.open(zinfo)
+
+        return open_member
+
+    writer = FilestoreWriter(dest, owner=owner, workers=workers, verify=verify)
+    try:
+        with zipfile.ZipFile(str(filepath)) as zip:
+            members = [
+                x
+                for x in zip.infolist()
+                if x.filename.startswith(prefix) and not x.is_dir()
+            ]
+        for zinfo in members:
+            mtime = time.mktime(zinfo.date_time + (0, 0, -1))
+            writer.submit(
+                zinfo.filename[len(prefix) :],
+                zinfo.file_size,
+                opener(zinfo),
+                mode=(zinfo.external_attr >> 16) & 0o777,
+                mtime=mtime,
+            )
+    finally:
+        stats = writer.close()
+        for handle in handles:
+            handle.close()
+    return stats
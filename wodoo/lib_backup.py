@@ -16,21 +16,23 @@ from threading import Thread
 import subprocess
 import shutil
 from datetime import datetime
+from contextlib import contextmanager
 import inquirer
 import os
 import click
 from pathlib import Path
-from .tools import put_appendix_into_file
 from .tools import _dropdb
 from .tools import remove_webassets
 from .tools import __dc
 from .tools import __dc_out
+from .tools import __get_cmd
+from .tools import _merge_env_dict
+from .tools import _set_default_envs
 from .tools import docker_kill_container
 from .tools import _execute_sql
 from .tools import __rename_db_drop_target
 from .tools import _remove_postgres_connections
 from .tools import _get_dump_files
-from .tools import _binary_zip
 from .tools import autocleanpaper
 from .tools import _shell_complete_file
 from .cli import cli, pass_config, Commands
@@ -39,6 +41,8 @@ from .tools import ensure_project_name
 from .tools import _get_filestore_folder
 from .tools import __try_to_set_owner
 from .tools import docker_list_containers
+from .backup_archive import is_tar_zst
+from .wodoo_bin import is_wodoo_bin
 
 import inspect
 import os
@@ -68,48 +72,72 @@ def restore(config):
 
 @backup.command(name="all")
 @click.argument("filename", required=False)
+@click.option(
+    "--format",
+    "archive_format",
+    type=click.Choice(["zip", "tar.zst"]),
+    default="zip",
+    help="zip: odoo.sh layout, single threaded; tar.zst: multi threaded zstd",
+)
+@click.option("-Z", "--compression", type=int, help="Compression level")
+@click.option(
+    "-j",
+    "--workers",
+    type=int,
+    help=(
+        "Compression threads of zstd; zip deflates in one thread, the "
+        "threads only sample the files to decide whether to store them"
+    ),
+)
 @pass_config
 @click.pass_context
-def backup_all(ctx, config, filename):
+def backup_all(ctx, config, filename, archive_format, compression, workers):
     """
     Runs backup-db and backup-files in odoo-sh format.
+
+    The dump is streamed from pg_dump and the filestore is added file by
+    file into the archive - in one pass without temporary copies.
     """
+    from .backup_archive import ZipArchiveWriter, TarZstdArchiveWriter
+
     ensure_project_name(config)
     config.force = True
     filename = Path(
-        filename or (config.dbname + arrow.get().strftime("%Y%m%d %H%M") + ".zip")
+        filename
+        or (config.dbname + arrow.get().strftime("%Y%m%d %H%M") + "." + archive_format)
     )
     if len(filename.parts) == 1:
         filename = Path(config.dumps_path) / filename
-    with autocleanpaper(Path(filename.parent) / str(uuid.uuid4())) as tmppath:
-        tmppath.mkdir(exist_ok=True, parents=True)
-        subprocess.check_output(["chown", str(config.owner_uid), tmppath])
-        filepath_db = ctx.invoke(
-            backup_db, filename=tmppath / "dump.sql", dumptype="plain"
+
+    if archive_format == "zip":
+        writer_class, default_compression = ZipArchiveWriter, 6
+    else:
+        writer_class, default_compression = TarZstdArchiveWriter, 3
+
+    folder = _get_filestore_folder(config)
+    tmpfile = filename.parent / f".{filename.name}.{uuid.uuid4()}"
+    with autocleanpaper(tmpfile, strict=True):
+        writer = writer_class(
+            tmpfile,
+            compresslevel=default_compression if compression is None else compression,
+            workers=workers,
         )
-        with autocleanpaper(tmppath / (filename.name + ".zip"), strict=True) as tmpfile:
-            folder = _get_filestore_folder(config)
-            with autocleanpaper() as fake_filestore:
-                symlink_file = fake_filestore / "filestore"
-                symlink_file.parent.mkdir(exist_ok=True, parents=True)
-                os.symlink(folder, symlink_file)
-
-                with autocleanpaper(folder / "zipped.zip", strict=True) as folderzip:
-                    subprocess.check_call(
-                        ["zip", "-r", folderzip, "filestore"],
-                        cwd=fake_filestore,
-                    )
-                    shutil.move(folderzip, tmpfile)
-            subprocess.check_call(
-                [
-                    "zip",
-                    "-u",
-                    tmpfile,
-                    filepath_db.relative_to(tmppath),
-                ],
-                cwd=tmppath,
-            )
-            shutil.move(tmpfile, filename)
+        try:
+            click.secho("Streaming database dump into archive", fg="yellow")
+            proc = _open_pgdump_stream(config, config.dbname)
+            try:
+                writer.add_stream("dump.sql", proc.stdout)
+            finally:
+                proc.stdout.close()
+                proc.wait()
+            if proc.returncode:
+                raise Exception("Backup failed!")
+            if folder.exists():
+                click.secho(f"Adding filestore {folder}", fg="yellow")
+                writer.add_tree(folder, "filestore")
+        finally:
+            writer.close()
+        shutil.move(tmpfile, filename)
     __try_to_set_owner(
         int(config.owner_uid),
         filename,
@@ -118,6 +146,39 @@ def backup_all(ctx, config, filename):
     click.secho(f"Created dump-file {filename}", fg="green")
 
 
+def _open_pgdump_stream(config, dbname):
+    """
+    Runs pg_dump (plain format) and returns the process; the dump is read
+    from proc.stdout.
+    """
+    params = [
+        "-h",
+        str(config.DB_HOST),
+        "-p",
+        str(config.DB_PORT),
+        "-U",
+        config.DB_USER,
+        "--no-owner",
+        dbname,
+    ]
+    if config.use_docker:
+        cmd = __get_cmd(config) + [
+            "run",
+            "--rm",
+            "-T",
+            "-e",
+            f"PGPASSWORD={config.DB_PWD}",
+            "--entrypoint",
+            "pg_dump",
+            "cronjobshell",
+        ]
+        env = _merge_env_dict(_set_default_envs({}))
+    else:
+        cmd = ["pg_dump"]
+        env = _merge_env_dict({"PGPASSWORD": config.DB_PWD})
+    return subprocess.Popen(cmd + params, stdout=subprocess.PIPE, env=env)
+
+
 @backup.command(name="odoo-db")
 @pass_config
 @click.pass_context
@@ -131,8 +192,9 @@ def backup_all(ctx, config, filename):
 )
 @click.option(
     "--dumptype",
-    type=click.Choice(["custom", "plain", "directory", "wodoobin"]),
+    type=click.Choice(["custom", "plain", "directory", "wodoobin", "stream"]),
     default="custom",
+    help="stream: parallel directory dump packed into one archive",
 )
 @click.option(
     "--pigz",
@@ -143,6 +205,12 @@ def backup_all(ctx, config, filename):
     "--compression",
     default=5,
 )
+@click.option(
+    "--compress-method",
+    type=click.Choice(["gzip", "zstd", "lz4"]),
+    default="gzip",
+    help="stream: zstd and lz4 require pg_dump >= 16",
+)
 @click.option("-j", "--worker", default=1)
 def backup_db(
     ctx,
@@ -154,6 +222,7 @@ def backup_db(
     exclude,
     pigz,
     compression,
+    compress_method,
     worker,
 ):
     filename = Path(
@@ -163,7 +232,20 @@ def backup_db(
         filename = Path(config.dumps_path) / filename
 
     if dumptype == "wodoobin":
-        _backup_wodoobin(ctx, config, filename)
+        # like pigz before all cores are used by default
+        _backup_wodoobin(
+            ctx, config, filename, compression, worker if worker > 1 else None
+        )
+    elif dumptype == "stream":
+        _backup_pgstream(
+            config,
+            filename,
+            dbname or config.DBNAME,
+            compression,
+            compress_method,
+            worker,
+            exclude,
+        )
     else:
         _backup_pgdump(
             config,
@@ -185,8 +267,16 @@ def backup_db(
 
 @backup.command(name="files")
 @click.argument("filename", required=False, default="")
+@click.option(
+    "--incremental",
+    is_flag=True,
+    help="Copies only new files into a deduplicating store (FILENAME is a directory)",
+)
+@click.option("-j", "--workers", type=int, help="Copy threads (incremental)")
 @pass_config
-def backup_files(config, filename):
+def backup_files(config, filename, incremental, workers):
+    if incremental:
+        return _backup_files_incremental(config, filename, workers)
     filepath = Path(filename or f"{config.project_name}.files.tar.gz")
     if len(filepath.parts) == 1:
         filepath = Path(config.dumps_path) / filepath
@@ -204,6 +294,78 @@ def backup_files(config, filename):
     return filepath
 
 
+def _get_filestore_backup_store(config, path):
+    from .filestore_backup import FilestoreBackupStore
+
+    path = Path(path or f"{config.project_name}.filestore")
+    if len(path.parts) == 1:
+        path = Path(config.dumps_path) / path
+    return FilestoreBackupStore(path)
+
+
+def _backup_files_incremental(config, path, workers):
+    import humanize
+
+    store = _get_filestore_backup_store(config, path)
+    files_dir = _get_filestore_folder(config)
+    if not files_dir.exists():
+        return
+    manifest, count, size = store.backup(
+        files_dir, config.project_name, workers=workers
+    )
+    __apply_dump_permissions(manifest)
+    click.secho(
+        f"Backup files done to {manifest}: {count} new files "
+        f"({humanize.naturalsize(size)})",
+        fg="green",
+    )
+    return manifest
+
+
+@backup.command(
+    name="files-prune",
+    help=(
+        "Removes manifests of an incremental filestore backup like "
+        "daddy-cleanup does and afterwards all files, which are not "
+        "referenced anymore."
+    ),
+)
+@click.argument("path", required=False, default="")
+@click.option("-n", "--dry-run", is_flag=True)
+@click.option(
+    "-N",
+    "--dont-touch",
+    default=1,
+    help="Do not touch the last X days from today. Defaults to 1=yesterday",
+)
+@click.option(
+    "--no-retention",
+    is_flag=True,
+    help="Keep all manifests; only remove unreferenced files",
+)
+@pass_config
+def backup_files_prune(config, path, dry_run, dont_touch, no_retention):
+    import humanize
+    from .daddy_cleanup import get_to_delete_files
+
+    store = _get_filestore_backup_store(config, path)
+    manifests = []
+    if not no_retention and store.manifests_dir.exists():
+        manifests = get_to_delete_files([store.manifests_dir], dont_touch)
+        # never remove the latest backup
+        manifests = [x for x in manifests if x != store.latest_manifest()]
+    for manifest in sorted(manifests):
+        click.secho(
+            f"{'Would delete' if dry_run else 'Deleting'}: {manifest}", fg="yellow"
+        )
+    count, size = store.prune(manifests, dry_run=dry_run)
+    click.secho(
+        f"{'Would remove' if dry_run else 'Removed'} {count} unreferenced files "
+        f"({humanize.naturalsize(size)})",
+        fg="green",
+    )
+
+
 def __get_default_backup_filename(config):
     return datetime.now().strftime(f"{config.project_name}.odoo.%Y%m%d%H%M%S.dump.gz")
 
@@ -225,9 +387,57 @@ def list_dumps(config):
 
 @restore.command(name="files")
 @click.argument("filename", required=True)
+@click.option(
+    "--delete",
+    is_flag=True,
+    help="Incremental backups: removes files, which are not in the backup",
+)
+@click.option("-j", "--workers", type=int, help="Writing threads")
+@click.option(
+    "--verify",
+    is_flag=True,
+    help="Compares content of existing files to their sha1 name before skipping",
+)
 @pass_config
-def restore_files(config, filename):
-    __do_restore_files(config, filename)
+def restore_files(config, filename, delete, workers, verify):
+    """
+    FILENAME is a tar file, an incremental backup store (latest backup) or
+    a manifest of it.
+    """
+    filepath = Path(filename)
+    if len(filepath.parts) == 1:
+        filepath = Path(config.dumps_path) / filepath
+    if filepath.is_dir() or filepath.name.endswith(".json.gz"):
+        _restore_files_incremental(config, filepath, delete, workers, verify)
+    else:
+        __do_restore_files(config, filename, workers=workers, verify=verify)
+
+
+def _restore_files_incremental(config, filepath, delete, workers, verify=False):
+    from .filestore_backup import FilestoreBackupStore
+
+    if filepath.is_dir():
+        store = FilestoreBackupStore(filepath)
+        manifest = store.latest_manifest()
+        if not manifest:
+            abort(f"No backups found in {filepath}")
+    else:
+        manifest = filepath
+        store = FilestoreBackupStore(filepath.parent.parent)
+    files_dir = _get_filestore_destination(config)
+    count, removed = store.restore(
+        manifest,
+        files_dir,
+        delete=delete,
+        workers=workers,
+        owner=config.owner_uid_as_int,
+        verify=verify,
+    )
+    click.secho(
+        f"Files restored from {manifest} to {files_dir}: {count} copied, "
+        f"{removed} removed",
+        fg="green",
+    )
 
 
 def _get_postgres_version(conn):
@@ -238,26 +448,16 @@ def _get_postgres_version(conn):
     return version
 
 
-def _restore_wodoo_bin(ctx, config, filepath, verify):
+def _restore_wodoo_bin(ctx, config, filepath, verify, workers=None):
+    from . import wodoo_bin
+
     if not config.run_postgres:
         abort("WODOO-BIN files may only be restored if RUN_POSTGRES=1")
-    click.secho(f"Unzipping {filepath}...", fg="yellow")
-    with open(filepath, "rb") as file:
-        content = file.read(1024)
-        count_lineendings = 0
-        cutoff = 0
-        for i in range(len(content)):
-            cutoff += 1
-            if content[i] == ord(b"\n"):
-                count_lineendings += 1
-            if count_lineendings == 2:
-                break
+    index = wodoo_bin.read_header(filepath)
     if verify:
         click.secho(f"Verifying version postgres", fg="yellow")
         Commands.invoke(ctx, "up", daemon=True, machines=["postgres"])
-        postgres_version = (
-            content.decode("utf-8", errors="ignore").split("\n")[1].strip()
-        )
+        postgres_version = index["postgres_version"]
         conn = config.get_odoo_conn()
         version = _get_postgres_version(conn)
         if version != postgres_version:
@@ -279,65 +479,93 @@ def _restore_wodoo_bin(ctx, config, filepath, verify):
     )
     mountpoint = volume[0]["Mountpoint"]
     click.secho(f"Identified mountpoint {mountpoint}", fg="yellow")
-    with autocleanpaper() as scriptfile:
-        scriptfile.write_text(
-            (
-                "#!/bin/bash\n"
-                "set -e\n"
-                f"rm -Rf '{mountpoint}'\n"
-                f"mkdir '{mountpoint}'\n"
-                f"cd '{mountpoint}'\n"
-                f"tail '{filepath}' -c +{cutoff + 1} | "
-                f"pigz -dc | tar x\n"
-            )
-        )
-        for mode in ["", "sudo"]:
-            try:
-                subprocess.check_call(
-                    list(filter(bool, [mode, "/bin/bash", scriptfile]))
-                )
-            except Exception:
-                if mode:
-                    raise
-                click.secho(
-                    "Retrying to restore the files in sudo mode - ignore previous errors please",
-                    fg="yellow",
-                )
-            else:
-                break
+    click.secho(f"Unzipping {filepath}...", fg="yellow")
+    # the volumes of docker usually belong to root
+    sudo = not os.access(Path(mountpoint).parent, os.W_OK)
+    wodoo_bin.extract(filepath, mountpoint, workers=workers, verify=verify, sudo=sudo)
     Commands.invoke(ctx, "up", machines=["postgres"], daemon=True)
 
 
 def _odoo_sh(ctx, config, filename, params):
-    with autocleanpaper() as tempfolder:
-        filename = Path(filename).absolute()
-        tempfolder.mkdir(exist_ok=True, parents=True)
-        was_dir = os.getcwd()
-        try:
-            os.chdir(tempfolder)
-            if not filename.exists():
-                abort(f"File does not exist: {tempfolder}")
-            subprocess.check_call(["unzip", filename])
-            sqlfile = tempfolder / "dump.sql"
-            filestore = tempfolder / "filestore"
-
-            if filestore.exists():
-                filestore_dest = _get_filestore_destination(config)
-                click.secho(f"Transferring files to {filestore_dest}")
-                subprocess.check_call(
-                    ["rsync", str(filestore) + "/", str(filestore_dest) + "/", "-ar"]
-                )
-                # change owner to OWNER_UID
-                subprocess.check_call(
-                    ["chown", str(config.owner_uid), filestore_dest, "-R"]
-                )
-            if sqlfile.exists():
+    """
+    Restores an odoo.sh zip: the filestore is extracted in parallel
+    directly into the destination and dump.sql is streamed to psql.
+    """
+    import zipfile
+    from .filestore_restore import restore_zip
+
+    filename = Path(filename).absolute()
+    if not filename.exists():
+        abort(f"File does not exist: {filename}")
+    with zipfile.ZipFile(str(filename)) as zip:
+        names = zip.namelist()
+        if any(x.startswith("filestore/") for x in names):
+            filestore_dest = _get_filestore_destination(config)
+            click.secho(f"Transferring files to {filestore_dest}")
+            stats = restore_zip(
+                filename,
+                filestore_dest,
+                prefix="filestore",
+                owner=config.owner_uid_as_int,
+                workers=params["workers"],
+            )
+            click.secho(stats.report())
+        if "dump.sql" not in names:
+            return
+        params["no_remove_webassets"] = True
+        if params["exclude_tables"]:
+            # tables can only be excluded by postgres.py from a file
+            with autocleanpaper(filename.parent / str(uuid.uuid4())) as tempfolder:
+                zip.extract("dump.sql", str(tempfolder))
+                sqlfile = tempfolder / "dump.sql"
                 click.secho(f"Restoring db {sqlfile}")
-                os.chdir(was_dir)
-                params["no_remove_webassets"] = True
                 Commands.invoke(ctx, "restore_db", filename=sqlfile, **params)
-        finally:
-            os.chdir(was_dir)
+            return
+        click.secho(f"Restoring db from {filename}")
+        params.pop("verify")
+        _restore_dump(
+            ctx,
+            config,
+            filename.name,
+            filename.parent,
+            verify=False,
+            stream=lambda: zip.open("dump.sql"),
+            **params,
+        )
+    _after_restore_db(ctx, config)
+
+
+def _restore_tar_zst(ctx, config, filename, params):
+    """
+    Restores archives of backup all --format tar.zst; the filestore is
+    written directly to its destination.
+    """
+    from .filestore_restore import restore_tar
+
+    with autocleanpaper(Path(filename).parent / str(uuid.uuid4())) as tempfolder:
+        tempfolder.mkdir(parents=True)
+        sqlfile = tempfolder / "dump.sql"
+        filestore_dest = _get_filestore_destination(config)
+        click.secho(f"Extracting {filename}, files to {filestore_dest}")
+        with open(sqlfile, "wb") as dump:
+
+            def on_other(tar, member):
+                if member.name.startswith("dump.sql.part"):
+                    shutil.copyfileobj(tar.extractfile(member), dump, 1024 * 1024)
+
+            stats = restore_tar(
+                filename,
+                filestore_dest,
+                prefix="filestore",
+                owner=config.owner_uid_as_int,
+                workers=params["workers"],
+                on_other=on_other,
+            )
+        click.secho(stats.report())
+        if sqlfile.stat().st_size:
+            click.secho(f"Restoring db {sqlfile}")
+            params["no_remove_webassets"] = True
+            Commands.invoke(ctx, "restore_db", filename=sqlfile, **params)
 
 
 def _after_restore(ctx, conn, config, no_dev_scripts, no_remove_webassets):
@@ -363,7 +591,28 @@ def _after_restore(ctx, conn, config, no_dev_scripts, no_remove_webassets):
     "-X",
     "--exclude-tables",
     multiple=True,
-    help="Exclude tables from restore like --exclude=mail_message",
+    help=(
+        "Exclude table data from restore like --exclude=mail_message; patterns "
+        "(mail_*) need a custom format dump or dump directory and imply "
+        "--schedule"
+    ),
+)
+@click.option(
+    "-I",
+    "--include-tables",
+    multiple=True,
+    help=(
+        "Restore only data of these tables (patterns); needs a custom format "
+        "dump or dump directory and implies --schedule"
+    ),
+)
+@click.option(
+    "--schedule",
+    is_flag=True,
+    help=(
+        "Custom format dumps and dump directories: load tables largest first "
+        "by own workers and create indexes afterwards"
+    ),
 )
 @click.option("-v", "--verbose", is_flag=True)
 @click.option(
@@ -372,6 +621,11 @@ def _after_restore(ctx, conn, config, no_dev_scripts, no_remove_webassets):
     help="Example if some extensions are missing (replication)",
 )
 @click.option("--dbname")
+@click.option(
+    "--recreate-postgres",
+    is_flag=True,
+    help="Removes the postgres volume and restarts postgres for the restore",
+)
 @pass_config
 @click.pass_context
 def restore_db(
@@ -386,6 +640,9 @@ def restore_db(
     verbose,
     ignore_errors,
     dbname,
+    recreate_postgres,
+    include_tables,
+    schedule,
 ):
     if not filename:
         filename = _inquirer_dump_file(
@@ -413,14 +670,27 @@ def restore_db(
         "verbose": verbose,
         "ignore_errors": ignore_errors,
         "dbname": (dbname or config.dbname),
+        "recreate_postgres": recreate_postgres,
+        "include_tables": include_tables,
+        "schedule": schedule,
     }
 
-    dump_type = _add_cronjob_scripts(config)["postgres"].__get_dump_type(
-        filename_absolute
-    )
+    if _add_pgstream_script()["pgstream"].is_archive(filename_absolute):
+        dump_type = "pgstream"
+    elif is_tar_zst(filename_absolute):
+        dump_type = "tar_zst"
+    elif is_wodoo_bin(filename_absolute):
+        dump_type = "wodoo_bin"
+    else:
+        dump_type = _add_cronjob_scripts(config)["postgres"].__get_dump_type(
+            filename_absolute
+        )
     if dump_type == "odoosh":
         _odoo_sh(ctx, config, filename=filename_absolute, params=params)
         return
+    if dump_type == "tar_zst":
+        _restore_tar_zst(ctx, config, filename_absolute, params)
+        return
 
     if len(Path(filename_absolute).parts) > 1:
         dumps_path = Path(filename_absolute).parent
@@ -444,7 +714,7 @@ def restore_db(
         if not config.run_postgres:
             abort("Requires RUN_POSTGRES=1")
 
-        _restore_wodoo_bin(ctx, config, filename_absolute, verify)
+        _restore_wodoo_bin(ctx, config, filename_absolute, verify, workers=workers)
         conn = config.get_odoo_conn()
         _after_restore(ctx, conn, config, no_dev_scripts, no_remove_webassets)
 
@@ -457,6 +727,10 @@ def restore_db(
             **params,
         )
 
+    _after_restore_db(ctx, config)
+
+
+def _after_restore_db(ctx, config):
     if config.run_postgres:
         __dc(config, ["up", "-d", "postgres"])
         Commands.invoke(ctx, "wait_for_container_postgres")
@@ -464,6 +738,61 @@ def restore_db(
             Commands.invoke(ctx, "pghba_conf_wide_open")
 
 
+def _open_psql_stream(config, dbname, host, ignore_errors):
+    """
+    Runs psql and returns the process; the plain sql dump is written to
+    proc.stdin.
+    """
+    params = [
+        "-q",
+        "-h",
+        str(host),
+        "-p",
+        str(config.DB_PORT),
+        "-U",
+        config.DB_USER,
+        "-d",
+        dbname,
+    ]
+    if not ignore_errors:
+        params += ["-v", "ON_ERROR_STOP=1"]
+    if config.use_docker:
+        cmd = __get_cmd(config) + [
+            "run",
+            "--rm",
+            "-T",
+            "-e",
+            f"PGPASSWORD={config.DB_PWD}",
+            "--entrypoint",
+            "psql",
+            "cronjobshell",
+        ]
+        env = _merge_env_dict(_set_default_envs({}))
+    else:
+        cmd = ["psql"]
+        env = _merge_env_dict({"PGPASSWORD": config.DB_PWD})
+    return subprocess.Popen(
+        cmd + params, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, env=env
+    )
+
+
+def _restore_stream(config, dbname, host, stream, ignore_errors):
+    proc = _open_psql_stream(config, dbname, host, ignore_errors)
+    try:
+        with stream() as source:
+            shutil.copyfileobj(source, proc.stdin, 1024 * 1024)
+    except BrokenPipeError:
+        # psql stopped on an error; reported by the exit code
+        pass
+    finally:
+        try:
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+    if proc.wait():
+        abort(f"psql failed with exit code {proc.returncode}")
+
+
 def _restore_dump(
     ctx,
     config,
@@ -477,18 +806,57 @@ def _restore_dump(
     verify,
     ignore_errors,
     dbname,
+    recreate_postgres=False,
+    include_tables=(),
+    schedule=False,
+    stream=None,
 ):
+    """
+    recreate_postgres: removes the postgres volume and restores with a
+    temporary postgres container, which mounts the dumps (RUN_POSTGRES=1);
+    otherwise the running postgres is used.
+
+    schedule: custom format dumps are restored by the scheduler of
+    pgstream.py (always used for pgstream archives and with include or
+    exclude tables, which are matched as patterns against the TOC).
+
+    stream: optional callable returning a plain sql dump as file object;
+    it is piped to psql instead of restoring filename.
+    """
     DBNAME_RESTORING = (dbname or config.dbname) + "_restoring"
-    if config.run_postgres and config.use_docker:
-        for container_id in docker_list_containers(
-            config.project_name, "postgres", "running"
-        ):
-            docker_kill_container(container_id, remove=True)
-            del container_id
-
-        Commands.invoke(ctx, "remove-volumes")
-        Commands.invoke(ctx, "up", machines=["postgres"], daemon=True)
-    Commands.invoke(ctx, "wait_for_container_postgres", missing_ok=True)
+    pgstream_script = _add_pgstream_script()["pgstream"]
+    filepath = Path(dumps_path) / filename
+    pgstream = not stream and (
+        pgstream_script.is_archive(filepath)
+        or (
+            (schedule or include_tables or exclude_tables)
+            and pgstream_script.is_restorable(filepath)
+        )
+    )
+    if not pgstream and include_tables:
+        # also streamed plain sql dumps (zip, tar.zst) cannot be filtered
+        abort("--include-tables needs a custom format dump or dump directory.")
+    if not pgstream and any(set("*?[") & set(x) for x in exclude_tables):
+        abort(
+            "Patterns in --exclude-tables need a custom format dump or dump "
+            "directory; name the tables of other dumps."
+        )
+    # without recreate the dump is restored into the running postgres
+    recreate = recreate_postgres and config.run_postgres and config.use_docker
+    postgres_name = None
+    timings = []
+
+    with _phase(timings, "prepare postgres"):
+        if recreate:
+            for container_id in docker_list_containers(
+                config.project_name, "postgres", "running"
+            ):
+                docker_kill_container(container_id, remove=True)
+                del container_id
+
+            Commands.invoke(ctx, "remove-volumes")
+            Commands.invoke(ctx, "up", machines=["postgres"], daemon=True)
+        Commands.invoke(ctx, "wait_for_container_postgres", missing_ok=True)
     conn = config.get_odoo_conn()
     dest_db = conn.dbname
 
@@ -514,90 +882,123 @@ def _restore_dump(
             notransaction=True,
         )
 
-    try_ignore_exceptions(
-        create_db, (psycopg2.errors.AdminShutdown, psycopg2.InterfaceError), timeout=30
-    )
+    with _phase(timings, "create database"):
+        if not recreate:
+            # left over by an aborted restore
+            _remove_postgres_connections(
+                conn, f"drop database if exists {DBNAME_RESTORING};"
+            )
+        try_ignore_exceptions(
+            create_db,
+            (psycopg2.errors.AdminShutdown, psycopg2.InterfaceError),
+            timeout=30,
+        )
 
     effective_host_name = config.DB_HOST
 
     if config.devmode and not no_dev_scripts:
         click.echo("Option devmode is set, so cleanup-scripts are run afterwards")
     try:
-        if config.use_docker:
+        if recreate:
             # if postgres docker is used, then make a temporary config to restart docker container
             # with external directory mapped; after that remove config
-            if config.run_postgres:
-                __dc(config, ["kill", "postgres"])
-                postgres_name = f"postgres_{uuid.uuid4()}"
-                __dc(
-                    config,
-                    [
-                        "run",
-                        "-d",
-                        "--name",
-                        f"{postgres_name}",
-                        "--rm",
-                        "--service-ports",
-                        "-v",
-                        f"{dumps_path}:/host/dumps2",
-                        "postgres",
-                    ],
+            __dc(config, ["kill", "postgres"])
+            postgres_name = f"postgres_{uuid.uuid4()}"
+            __dc(
+                config,
+                [
+                    "run",
+                    "-d",
+                    "--name",
+                    f"{postgres_name}",
+                    "--rm",
+                    "--service-ports",
+                    "-v",
+                    f"{dumps_path}:/host/dumps2",
+                    "postgres",
+                ],
+            )
+            Commands.invoke(ctx, "wait_for_container_postgres", missing_ok=True)
+            effective_host_name = postgres_name
+
+        with _phase(timings, "restore"):
+            if stream:
+                _restore_stream(
+                    config, DBNAME_RESTORING, effective_host_name, stream, ignore_errors
                 )
-                Commands.invoke(ctx, "wait_for_container_postgres", missing_ok=True)
-                effective_host_name = postgres_name
-
-            cmd = [
-                "run",
-                "--rm",
-                "--entrypoint",
-                "python3 /usr/local/bin/postgres.py",
-            ]
+            elif config.use_docker:
+                cmd = [
+                    "run",
+                    "--rm",
+                    "--entrypoint",
+                    "python3 /usr/local/bin/postgres.py",
+                ]
+                if pgstream:
+                    cmd = _get_pgstream_run_cmd()
 
-            parent_path_in_container = "/host/dumps2"
-            cmd += [
-                "-v",
-                f"{dumps_path}:{parent_path_in_container}",
-            ]
-            cmd += [
-                "cronjobshell",
-                "restore",
-                DBNAME_RESTORING,
-                effective_host_name,
-                config.DB_PORT,
-                config.DB_USER,
-                config.DB_PWD,
-                f"{parent_path_in_container}/{filename}",
-                "-j",
-                str(workers),
-            ]
-            if ignore_errors:
-                cmd += ["--ignore-errors"]
-            if exclude_tables:
+                parent_path_in_container = "/host/dumps2"
                 cmd += [
-                    "--exclude-tables",
-                    ",".join(exclude_tables),
+                    "-v",
+                    f"{dumps_path}:{parent_path_in_container}",
                 ]
-            if verbose:
-                cmd += ["--verbose"]
-            __dc(config, cmd)
-        else:
-            _add_cronjob_scripts(config)["postgres"]._restore(
-                DBNAME_RESTORING,
-                effective_host_name,
-                config.DB_PORT,
-                config.DB_USER,
-                config.DB_PWD,
-                Path(config.dumps_path) / filename,
-            )
+                cmd += [
+                    "cronjobshell",
+                    "restore",
+                    DBNAME_RESTORING,
+                    effective_host_name,
+                    config.DB_PORT,
+                    config.DB_USER,
+                    config.DB_PWD,
+                    f"{parent_path_in_container}/{filename}",
+                    "-j",
+                    str(workers),
+                ]
+                if ignore_errors:
+                    cmd += ["--ignore-errors"]
+                if exclude_tables:
+                    cmd += [
+                        "--exclude-tables",
+                        ",".join(exclude_tables),
+                    ]
+                if pgstream and include_tables:
+                    cmd += ["--include-tables", ",".join(include_tables)]
+                if verbose:
+                    cmd += ["--verbose"]
+                __dc(config, cmd)
+            elif pgstream:
+                _add_pgstream_script()["pgstream"].restore(
+                    DBNAME_RESTORING,
+                    effective_host_name,
+                    config.DB_PORT,
+                    config.DB_USER,
+                    config.DB_PWD,
+                    filepath,
+                    workers=workers,
+                    include_tables=include_tables,
+                    exclude_tables=exclude_tables,
+                    ignore_errors=ignore_errors,
+                    verbose=verbose,
+                )
+            else:
+                _add_cronjob_scripts(config)["postgres"]._restore(
+                    DBNAME_RESTORING,
+                    effective_host_name,
+                    config.DB_PORT,
+                    config.DB_USER,
+                    config.DB_PWD,
+                    Path(config.dumps_path) / filename,
+                )
 
-        _after_restore(ctx, conn, config, no_dev_scripts, no_remove_webassets)
-        __rename_db_drop_target(
-            conn.clone(dbname="postgres"), DBNAME_RESTORING, dbname or config.dbname
-        )
-        _remove_postgres_connections(conn.clone(dbname=dest_db))
+        with _phase(timings, "after restore"):
+            _after_restore(ctx, conn, config, no_dev_scripts, no_remove_webassets)
+        with _phase(timings, "swap database"):
+            __rename_db_drop_target(
+                conn.clone(dbname="postgres"), DBNAME_RESTORING, dbname or config.dbname
+            )
+            _remove_postgres_connections(conn.clone(dbname=dest_db))
 
     finally:
-        if config.run_postgres and config.use_docker:
+        if postgres_name:
             # stop the run started postgres container; softly
             subprocess.check_output(["docker", "stop", postgres_name])
             try:
@@ -606,6 +1007,17 @@ def _restore_dump(
                 # ignore - stopped before
                 pass
             subprocess.check_output(["docker", "rm", "-f", postgres_name])
+        for name, seconds in timings:
+            click.secho(f"{name:<20} {seconds:8.1f}s", fg="cyan")
+
+
+@contextmanager
+def _phase(timings, name):
+    started = time.time()
+    try:
+        yield
+    finally:
+        timings.append((name, time.time() - started))
 
 
 def _add_cronjob_scripts(config):
@@ -622,6 +1034,32 @@ def _add_cronjob_scripts(config):
     }
 
 
+def _add_pgstream_script():
+    """
+    pgstream.py is a standalone script; it is also mounted into the
+    cronjobshell container.
+    """
+    spec = importlib.util.spec_from_file_location(
+        "pgstream", current_dir / "pgstream.py"
+    )
+    pgstream = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(pgstream)
+    return {
+        "pgstream": pgstream,
+    }
+
+
+def _get_pgstream_run_cmd():
+    return [
+        "run",
+        "--rm",
+        "-v",
+        f"{current_dir / 'pgstream.py'}:/opt/wodoo/pgstream.py:ro",
+        "--entrypoint",
+        "python3 /opt/wodoo/pgstream.py",
+    ]
+
+
 def _inquirer_dump_file(config, message, filter):
     BACKUPDIR = Path(config.dumps_path)
     __files = _get_dump_files(BACKUPDIR)
@@ -637,21 +1075,16 @@ def _get_filestore_destination(config):
     return files_dir
 
 
-def __do_restore_files(config, filepath):
-    # https://askubuntu.com/questions/128492/is-there-a-way-to-tar-extract-without-clobbering
-    # remove the postgres volume and reinit
+def __do_restore_files(config, filepath, workers=None, verify=False):
+    from .filestore_restore import restore_tar
+
     filepath = Path(filepath)
     if len(filepath.parts) == 1:
         filepath = Path(config.dumps_path) / filepath
     files_dir = _get_filestore_destination(config)
-    subprocess.check_call(
-        [
-            "tar",
-            "xzf",
-            filepath,
-        ],
-        cwd=files_dir,
-    )
+    # existing files with the same size (sha1 names) are not written again
+    stats = restore_tar(filepath, files_dir, workers=workers, verify=verify)
+    click.secho(stats.report())
     click.secho(f"Files restored from {filepath} to {files_dir}", fg="green")
 
 
@@ -669,7 +1102,9 @@ def __apply_dump_permissions(filepath):
             change(x[1], id)
 
 
-def _backup_wodoobin(ctx, config, filename):
+def _backup_wodoobin(ctx, config, filename, compression, worker):
+    from . import wodoo_bin
+
     if not config.run_postgres:
         abort(
             (
@@ -692,11 +1127,7 @@ def _backup_wodoobin(ctx, config, filename):
         )
     )[0]["Mountpoint"]
 
-    with autocleanpaper() as tempfile_zip:
-        _binary_zip(path, tempfile_zip)
-
-        put_appendix_into_file(f"WODOO_BIN\n{version}\n", tempfile_zip, filename)
-
+    wodoo_bin.write(path, filename, version, compresslevel=compression, workers=worker)
     Commands.invoke(ctx, "up", daemon=True, machines=["postgres"])
 
 
@@ -750,5 +1181,52 @@ def _backup_pgdump(
         raise Exception("Backup failed!")
 
 
+def _backup_pgstream(
+    config, filename, dbname, compression, compress_method, worker, exclude
+):
+    click.secho(f"Backup file will be stored there: {filename.parent}")
+    params = [
+        "--compression",
+        str(compression),
+        "--compress-method",
+        compress_method,
+        "-j",
+        str(worker),
+    ]
+    for table in exclude:
+        params += ["--exclude", table]
+
+    if not config.use_docker:
+        _add_pgstream_script()["pgstream"].backup(
+            dbname,
+            config.DB_HOST,
+            config.DB_PORT,
+            config.DB_USER,
+            config.DB_PWD,
+            filename,
+            workers=worker,
+            compression=compression,
+            compress_method=compress_method,
+            excludes=exclude,
+        )
+        return
+
+    cmd = _get_pgstream_run_cmd() + [
+        "-v",
+        f"{filename.parent}:/host/dumps2",
+        "cronjobshell",
+        "backup",
+        dbname,
+        config.DB_HOST,
+        config.DB_PORT,
+        config.DB_USER,
+        config.DB_PWD,
+        "/host/dumps2/" + filename.name,
+    ]
+    res = __dc(config, cmd + params)
+    if res:
+        raise Exception("Backup failed!")
+
+
 Commands.register(backup_db)
 Commands.register(restore_db)
@@ -1,3 +1,4 @@
+import importlib
 from . import click
 
 if click:
@@ -23,7 +24,7 @@ if click:
             # search recursivley
             for _cmd_name in self.list_commands(ctx):
                 cmd = click.Group.get_command(self, ctx, _cmd_name)
-                if type(cmd) == type(self):
+                if isinstance(cmd, AliasedGroup):
                     filtered = filter(
                         lambda cmd: cmd.startswith(cmd_name), cmd.list_commands(ctx)
                     )
@@ -56,3 +57,76 @@ if click:
                     )
                 )
             return None
+
+    class LazyGroup(AliasedGroup):
+        """
+        Imports the module of a command when the command is used.
+
+        lazy_commands: name -> (module, short help)
+        lazy_subcommands: name of a command in a sub group -> modules; used
+        to find commands like AliasedGroup does without importing all.
+        """
+
+        def __init__(self, *args, lazy_commands=None, lazy_subcommands=None, **kw):
+            super().__init__(*args, **kw)
+            self.lazy_commands = lazy_commands or {}
+            self.lazy_subcommands = lazy_subcommands or {}
+            self.loaded_modules = set()
+
+        def _load(self, modules):
+            for module in modules:
+                if module not in self.loaded_modules:
+                    importlib.import_module(module)
+                    self.loaded_modules.add(module)
+
+        def load_all(self):
+            self._load(sorted(set(x[0] for x in self.lazy_commands.values())))
+
+        def list_commands(self, ctx):
+            return sorted(set(self.commands) | set(self.lazy_commands))
+
+        def get_command(self, ctx, cmd_name):
+            if cmd_name in self.commands:
+                pass
+            elif cmd_name in self.lazy_commands:
+                self._load([self.lazy_commands[cmd_name][0]])
+            elif cmd_name in self.lazy_subcommands:
+                # the commands, which start with cmd_name, are matched, too
+                self._load(
+                    [
+                        module
+                        for name, (module, help) in self.lazy_commands.items()
+                        if name.startswith(cmd_name)
+                    ]
+                    + self.lazy_subcommands[cmd_name]
+                )
+            else:
+                self.load_all()
+            return super().get_command(ctx, cmd_name)
+
+        def format_commands(self, ctx, formatter):
+            """
+            Like click.Group.format_commands, but takes the help of not yet
+            imported commands from lazy_commands.
+            """
+            commands = []
+            for name in self.list_commands(ctx):
+                cmd = self.commands.get(name)
+                if cmd is None:
+                    help = self.lazy_commands[name][1]
+                    if help is not None:  # hidden
+                        commands.append((name, None, help))
+                elif not cmd.hidden:
+                    commands.append((name, cmd, None))
+            if not commands:
+                return
+            limit = formatter.width - 6 - max(len(x[0]) for x in commands)
+            rows = []
+            for name, cmd, help in commands:
+                if cmd is not None:
+                    help = cmd.get_short_help_str(limit)
+                else:
+                    help = click.utils.make_default_short_help(help, limit)
+                rows.append((name, help))
+            with formatter.section("Commands"):
+                formatter.write_dl(rows)
@@ -1,4 +1,5 @@
 import traceback
+import json
 from .tools import bashfind
 import arrow
 import threading
@@ -106,6 +107,11 @@ def _get_arch():
 @click.option(
     "--docker-compose", help="additional docker-compose files, separated by colon :"
 )
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    help="Assemble the docker-compose file even if no input changed",
+)
 @pass_config
 @click.pass_context
 def do_reload(
@@ -123,6 +129,7 @@ def do_reload(
     no_update_images,
     no_auto_repo,
     docker_compose,
+    no_cache,
 ):
     from .myconfigparser import MyConfigParser
     from .module_tools import NotInAddonsPath
@@ -134,6 +141,7 @@ def do_reload(
     if not no_update_images:
         _download_images(config, images_url)
     config.TARGETARCH = _get_arch()
+    config.NO_COMPOSE_CACHE = no_cache
 
     click.secho(f"Current Project Name: {config.project_name}", bold=True, fg="green")
     SETTINGS_FILE = config.files.get("settings")
@@ -666,8 +674,37 @@ def post_process_complete_yaml_config(config, yml):
     return yml
 
 
+def _get_compose_env(env):
+    d = deepcopy(os.environ)
+    d.update(env)
+
+    # set current user id and docker group for probable dinds
+    try:
+        d["DOCKER_GROUP_ID"] = str(grp.getgrnam("docker").gr_gid)
+    except KeyError:
+        d["DOCKER_GROUP_ID"] = "0"
+    return d
+
+
 def __run_docker_compose_config(config, contents, env):
+    """
+    Merges the contents in process; only constructs, which the merge
+    engine does not know, are passed to docker-compose config.
+    """
     import yaml
+    from .compose_merge import merge, ComposeError, UnsupportedCompose
+
+    if not config.USE_DOCKER_COMPOSE_CONFIG:
+        try:
+            return merge(contents, _get_compose_env(env))
+        except UnsupportedCompose as ex:
+            click.secho(f"Calling docker-compose config for: {ex}", fg="yellow")
+        except ComposeError as ex:
+            if ex.index is not None:
+                click.secho(
+                    yaml.dump(contents[ex.index], default_flow_style=False)
+                )
+            abort(f"Invalid docker-compose configuration: {ex}")
 
     temp_path = Path(tempfile.mkdtemp())
 
@@ -693,32 +730,38 @@ def __run_docker_compose_config(config, contents, env):
             return cmdline
 
         cmdline = buildcmd(files)
-        d = deepcopy(os.environ)
-        d.update(env)
-
-        # set current user id and docker group for probable dinds
-        try:
-            d["DOCKER_GROUP_ID"] = str(grp.getgrnam("docker").gr_gid)
-        except KeyError:
-            d["DOCKER_GROUP_ID"] = "0"
+        d = _get_compose_env(env)
+
+        def fails(files):
+            return subprocess.call(
+                buildcmd(files),
+                cwd=temp_path,
+                env=d,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
 
         (temp_path / 'cmd').write_text(" ".join(map(str, cmdline)))
         try:
             conf = subprocess.check_output(cmdline, cwd=temp_path, env=d)
-        except:
-            # find culprit
-            for i in range(len(files)):
-                file = files[i]
-                cmdline2 = buildcmd(files[:i])
-                try:
-                    click.secho(f"Testing {file}...", fg='green')
-                    conf = subprocess.check_output(cmdline2, cwd=temp_path, env=d)
-                except:
-                    click.secho(f"{file}:\n", fg='yellow')
-                    click.secho(file.read_text())
-                    break
-
-            conf = subprocess.check_output(cmdline, cwd=temp_path, env=d)
+        except subprocess.CalledProcessError:
+            # find culprit: bisect for the shortest failing list of files
+            lo, hi = 1, len(files)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                click.secho(f"Testing up to {files[mid - 1]}...", fg='green')
+                if fails(files[:mid]):
+                    hi = mid
+                else:
+                    lo = mid + 1
+            click.secho(f"{files[lo - 1]}:\n", fg='yellow')
+            click.secho(files[lo - 1].read_text())
+            subprocess.call(
+                buildcmd(files[:lo]),
+                cwd=temp_path,
+                env=d,
+                stdout=subprocess.DEVNULL,
+            )
             sys.exit(-1)
         conf = yaml.safe_load(conf)
         return conf
@@ -796,18 +839,119 @@ def _prepare_docker_compose_files(config, dest_file, paths):
         click.secho(str(path), fg="green")
         del path
 
-    # make one big compose file
-    contents = __get_sorted_contents(paths)
-    contents = list(_apply_variables(config, contents, env))
-    _explode_referenced_machines(contents)
-    _fix_contents(contents)
+    # the merged file is cached; the after compose scripts are run always,
+    # as they may depend on anything (and change the settings)
+    cache_dir = config.dirs["run"] / "compose-cache"
+    fingerprint = _get_compose_fingerprint(config, paths, env)
+    cached = cache_dir / f"{fingerprint}.json"
+    if not config.NO_COMPOSE_CACHE and cached.exists():
+        click.secho("Input files unchanged - using cached docker-compose config.")
+        content = json.loads(cached.read_text())
+    else:
+        # make one big compose file
+        contents = __get_sorted_contents(paths)
+        contents = list(_apply_variables(config, contents, env))
+        _explode_referenced_machines(contents)
+        _fix_contents(contents)
+
+        # call docker compose config to get the complete config
+        content = __run_docker_compose_config(config, contents, env)
+        content = post_process_complete_yaml_config(config, content)
+
+        # keep only the latest result
+        if cache_dir.exists():
+            shutil.rmtree(cache_dir)
+        cache_dir.mkdir(parents=True)
+        with atomic_write(cached) as file:
+            file.write_text(json.dumps(content))
 
-    # call docker compose config to get the complete config
-    content = __run_docker_compose_config(config, contents, env)
-    content = post_process_complete_yaml_config(config, content)
     content = _execute_after_compose(config, content)
+    content = yaml.dump(content, default_flow_style=False)
     with atomic_write(dest_file) as file:
-        file.write_text(yaml.dump(content, default_flow_style=False))
+        file.write_text(content)
+
+
+def _get_compose_fingerprint(config, paths, env):
+    """
+    Hash of everything the merged docker-compose config depends on: the
+    compose files, the settings, the environment variables referenced in
+    the compose files, env files, the commit for registry image tags and
+    docker-compose. The after compose scripts are not part of it; they are
+    run on every call.
+    """
+    import re
+    import yaml
+    import hashlib
+    from .compose_merge import interpolate
+    from .odoo_config import MANIFEST_FILE
+
+    digest = hashlib.sha256()
+
+    def add(*values):
+        for value in values:
+            if not isinstance(value, bytes):
+                value = str(value).encode("utf-8")
+            digest.update(value + b"\0")
+
+    add(
+        _get_version(),
+        config.YAML_VERSION,
+        config.restart_containers,
+        config.TARGETARCH,
+        config.project_name,
+        platform.system(),
+    )
+    for key in sorted(env):
+        add(key, env[key])
+
+    variables = set()
+    env_files = set()
+    for path in paths:
+        content = path.read_bytes()
+        add(path, hashlib.sha256(content).digest())
+        variables.update(re.findall(rb"\$\{?(\w+)", content))
+        env_files.update(_get_env_files(yaml.safe_load(content)))
+    compose_env = _get_compose_env(env)
+    for name in sorted(variables):
+        name = name.decode("utf-8")
+        add(name, compose_env.get(name))
+
+    files = [config.files["config/default_network"], MANIFEST_FILE()]
+    for env_file in sorted(env_files):
+        try:
+            env_file = Path(interpolate(env_file, compose_env))
+        except ValueError:
+            continue
+        if env_file != Path(config.files["settings"]):
+            files.append(env_file)
+    for path in files:
+        if path and path.is_file():
+            add(path, path.read_bytes())
+
+    # image tags of the registry are the current commit by default
+    if config.REGISTRY and not config.DOCKER_IMAGE_TAG:
+        if (Path(os.getcwd()) / ".git").exists():
+            add(
+                subprocess.check_output(
+                    ["git", "log", "-n1", "--pretty=%H"], encoding="utf-8"
+                ).strip()
+            )
+
+    docker_compose_bin = config.files["docker_compose_bin"]
+    if docker_compose_bin and Path(docker_compose_bin).exists():
+        stat = Path(docker_compose_bin).resolve().stat()
+        add(docker_compose_bin, stat.st_size, stat.st_mtime)
+    return digest.hexdigest()
+
+
+def _get_env_files(content):
+    result = set()
+    for service in ((content or {}).get("services") or {}).values():
+        env_files = (service or {}).get("env_file") or []
+        if isinstance(env_files, str):
+            env_files = [env_files]
+        result.update(map(str, env_files))
+    return result
 
 
 def _fix_contents(contents):
@@ -1,7 +1,9 @@
+import os
 import arrow
 import sys
 import click
 import inquirer
+from contextlib import contextmanager
 from .tools import remove_webassets
 from .tools import _askcontinue
 from .tools import get_volume_names
@@ -10,6 +12,7 @@ from .lib_clickhelpers import AliasedGroup
 from .tools import __hash_odoo_password
 from .tools import _remove_postgres_connections, _execute_sql
 from .tools import get_filesystem_of_folder
+from .tools import abort
 
 
 def _decide_snapshots_possible(config):
@@ -18,6 +21,158 @@ def _decide_snapshots_possible(config):
     ttype = get_filesystem_of_folder("/var/lib/docker")
     if ttype in ["zfs", "btrfs"]:
         return ttype
+    if config.run_postgres and config.SNAPSHOT_REFLINK is not False:
+        from .lib_db_snapshots_docker_reflink import supports_reflink
+        from .lib_db_snapshots_docker_reflink import DOCKER_VOLUMES
+
+        if config.SNAPSHOT_REFLINK:
+            return "reflink"
+        cachefile = config.dirs["run"] / "reflink-support"
+        if supports_reflink(DOCKER_VOLUMES, cachefile):
+            return "reflink"
+
+
+RETENTION_BUCKETS = [
+    ("hourly", "%Y-%m-%d %H"),
+    ("daily", "%Y-%m-%d"),
+    ("weekly", "%G-%V"),
+    ("monthly", "%Y-%m"),
+]
+
+
+def _get_retention(config, **keep):
+    """
+    Settings SNAPSHOT_KEEP_LAST, SNAPSHOT_KEEP_HOURLY, SNAPSHOT_KEEP_DAILY,
+    SNAPSHOT_KEEP_WEEKLY and SNAPSHOT_KEEP_MONTHLY; given values win.
+    """
+    retention = {}
+    for key in ["last"] + [x[0] for x in RETENTION_BUCKETS]:
+        value = keep.get(key)
+        if value is None:
+            value = getattr(config, f"SNAPSHOT_KEEP_{key.upper()}_as_int")
+        retention[key] = value or 0
+    return retention
+
+
+def _get_snapshots_to_prune(snapshots, retention):
+    """
+    Keeps the newest retention["last"] snapshots and the newest snapshot of
+    each of the last n hours, days, weeks and months like daddy-cleanup
+    keeps the youngest file of a bin. Snapshots without date are kept.
+    """
+    if not any(retention.values()):
+        return []
+    snapshots = sorted(
+        (x for x in snapshots if x["date"]),
+        key=lambda x: arrow.get(x["date"]),
+        reverse=True,
+    )
+    keep = set(range(retention["last"]))
+    for bucket, fmt in RETENTION_BUCKETS:
+        seen = set()
+        for i, snapshot in enumerate(snapshots):
+            if len(seen) >= retention[bucket]:
+                break
+            key = arrow.get(snapshot["date"]).to("local").strftime(fmt)
+            if key not in seen:
+                seen.add(key)
+                keep.add(i)
+    # zfs: removing a snapshot would destroy the volumes cloned from it
+    return [
+        x for i, x in enumerate(snapshots) if i not in keep and not x.get("clones")
+    ]
+
+
+@contextmanager
+def _snapshot_lock(config, exclusive=False):
+    """
+    Shared by save and restore, exclusive for removing snapshots: prune
+    must not remove a snapshot, which is restored meanwhile. Taken by the
+    commands only; the backends do not lock.
+    """
+    import fcntl
+
+    mode = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+    path = config.dirs["run"] / "snapshot.lock"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as file:
+        try:
+            fcntl.flock(file, mode | fcntl.LOCK_NB)
+        except BlockingIOError:
+            click.secho("Waiting for other snapshot operations...", fg="yellow")
+            fcntl.flock(file, mode)
+        try:
+            yield
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+
+
+def _prune(config, retention, dry_run=False):
+    import shutil
+    import humanize
+
+    with _snapshot_lock(config, exclusive=True):
+        manager = config.snapshot_manager
+        victims = _get_snapshots_to_prune(manager.__get_snapshots(config), retention)
+
+        # backends without sizes: compare the free space of the snapshot dir
+        snapshot_dir = getattr(manager, "SNAPSHOT_DIR", None)
+        if snapshot_dir and snapshot_dir.exists() and not dry_run:
+            free = shutil.disk_usage(snapshot_dir).free
+        else:
+            free = None
+
+        size = 0
+        for snapshot in victims:
+            click.secho(
+                f"{'Would remove' if dry_run else 'Removing'} snapshot "
+                f"{snapshot['name']} from {snapshot['date']}",
+                fg="yellow",
+            )
+            size += snapshot.get("used") or snapshot.get("size") or 0
+            if not dry_run:
+                manager.remove(config, snapshot)
+        if not size and free is not None:
+            size = max(shutil.disk_usage(snapshot_dir).free - free, 0)
+
+    click.secho(
+        f"{'Would remove' if dry_run else 'Removed'} {len(victims)} snapshots, "
+        f"{humanize.naturalsize(size)} {'reclaimable' if dry_run else 'reclaimed'}",
+        fg="green",
+    )
+
+
+def _prune_in_background(config, retention):
+    """
+    Prunes in a forked process, which logs into the run directory.
+    """
+    import traceback
+    from .tools import DBConnection
+
+    log = config.dirs["run"] / "snapshot-prune.log"
+    log.parent.mkdir(parents=True, exist_ok=True)
+    # the child must not share the sockets of pooled connections
+    DBConnection.close_pool()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    if os.fork():
+        click.secho(f"Pruning snapshots in background; log: {log}")
+        return
+    try:
+        os.setsid()
+        with open(log, "a") as file:
+            os.dup2(file.fileno(), sys.stdout.fileno())
+            os.dup2(file.fileno(), sys.stderr.fileno())
+        with open(os.devnull) as file:
+            os.dup2(file.fileno(), sys.stdin.fileno())
+        click.secho(f"{arrow.get().to('local')}: pruning snapshots")
+        _prune(config, retention)
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(0)
 
 
 def _setup_manager(config):
@@ -26,6 +181,8 @@ def _setup_manager(config):
         from . import lib_db_snapshots_docker_zfs as snapshot_manager
     elif ttype == "btrfs":
         from . import lib_db_snapshots_docker_btrfs as snapshot_manager
+    elif ttype == "reflink":
+        from . import lib_db_snapshots_docker_reflink as snapshot_manager
     else:
         from . import lib_db_snapshots_plain_postgres as snapshot_manager
     config.__choose_snapshot = __choose_snapshot
@@ -62,7 +219,17 @@ def do_list(config):
     from tabulate import tabulate
 
     rows = [(x["name"], x["date"], x["path"]) for x in snapshots]
-    click.echo(tabulate(rows, ["Name", "Date", "Path"]))
+    headers = ["Name", "Date", "Path"]
+    if snapshots and "used" in snapshots[0]:
+        import humanize
+
+        rows = [
+            row
+            + (humanize.naturalsize(x["used"]), humanize.naturalsize(x["referenced"]))
+            for row, x in zip(rows, snapshots)
+        ]
+        headers += ["Used", "Referenced"]
+    click.echo(tabulate(rows, headers))
 
 
 @snapshot.command(name="save")
@@ -77,9 +244,14 @@ def snapshot_make(ctx, config, name):
         click.secho(f"Using {name} as snapshot name")
 
     # remove existing snaps
-    snapshot = config.snapshot_manager.make_snapshot(ctx, config, name)
+    with _snapshot_lock(config):
+        snapshot = config.snapshot_manager.make_snapshot(ctx, config, name)
     click.secho("Made snapshot: {}".format(snapshot), fg="green")
 
+    retention = _get_retention(config)
+    if any(retention.values()):
+        _prune_in_background(config, retention)
+
 
 @snapshot.command(name="restore")
 @click.argument("name", required=False)
@@ -90,7 +262,11 @@ def snapshot_restore(ctx, config, name):
     name = __choose_snapshot(config, take=name)
     if not name:
         return
-    config.snapshot_manager.restore(config, name)
+    from .module_tools import DBModules
+
+    with _snapshot_lock(config):
+        config.snapshot_manager.restore(config, name)
+    DBModules.invalidate()
 
 
 @snapshot.command(name="remove")
@@ -103,7 +279,8 @@ def snapshot_remove(ctx, config, name):
     snapshot = __choose_snapshot(config, take=name)
     if not snapshot:
         return
-    config.snapshot_manager.remove(config, snapshot)
+    with _snapshot_lock(config, exclusive=True):
+        config.snapshot_manager.remove(config, snapshot)
 
 
 @snapshot.command(name="clear", help="Removes all snapshots")
@@ -112,16 +289,61 @@ def snapshot_remove(ctx, config, name):
 def snapshot_clear_all(ctx, config):
     config.snapshot_manager.assert_environment(config)
 
-    if hasattr(config.snapshot_manager, 'clear_all'):
-        config.snapshot_manager.clear_all(config)
-    else:
-        snapshots = config.snapshot_manager.__get_snapshots(config)
-        if snapshots:
-            for snap in snapshots:
-                config.snapshot_manager.remove(config, snap)
+    with _snapshot_lock(config, exclusive=True):
+        if hasattr(config.snapshot_manager, 'clear_all'):
+            config.snapshot_manager.clear_all(config)
+        else:
+            snapshots = config.snapshot_manager.__get_snapshots(config)
+            if snapshots:
+                for snap in snapshots:
+                    config.snapshot_manager.remove(config, snap)
     ctx.invoke(do_list)
 
 
+@snapshot.command(
+    name="prune",
+    help=(
+        "Removes snapshots except the last ones and the newest per hour, "
+        "day, week and month. Defaults are taken from the settings "
+        "SNAPSHOT_KEEP_LAST, SNAPSHOT_KEEP_HOURLY, ...; if set, pruning "
+        "runs in background after every save."
+    ),
+)
+@click.option("-l", "--keep-last", type=int)
+@click.option("-H", "--keep-hourly", type=int)
+@click.option("-d", "--keep-daily", type=int)
+@click.option("-w", "--keep-weekly", type=int)
+@click.option("-m", "--keep-monthly", type=int)
+@click.option("-n", "--dry-run", is_flag=True)
+@click.option("--background", is_flag=True)
+@pass_config
+def snapshot_prune(
+    config,
+    keep_last,
+    keep_hourly,
+    keep_daily,
+    keep_weekly,
+    keep_monthly,
+    dry_run,
+    background,
+):
+    config.snapshot_manager.assert_environment(config)
+    retention = _get_retention(
+        config,
+        last=keep_last,
+        hourly=keep_hourly,
+        daily=keep_daily,
+        weekly=keep_weekly,
+        monthly=keep_monthly,
+    )
+    if not any(retention.values()):
+        abort("No retention configured - would remove all snapshots.")
+    if background and not dry_run:
+        _prune_in_background(config, retention)
+    else:
+        _prune(config, retention, dry_run=dry_run)
+
+
 @snapshot.command(
     name="purge-inactive-subvolumes",
     help=(
@@ -133,7 +355,8 @@ def snapshot_clear_all(ctx, config):
 @click.pass_context
 def snapshot_purge_inactive_subvolumes(ctx, config):
     config.snapshot_manager.assert_environment(config)
-    config.snapshot_manager.purge_inactive(config)
+    with _snapshot_lock(config, exclusive=True):
+        config.snapshot_manager.purge_inactive(config)
 
 
 @snapshot.command()
@@ -114,42 +114,73 @@ def __get_snapshots(config):
         abort(f"Path {path} is not a zfs.")
 
 
-def _get_snapshots(config):
-    def _get_snaps():
-        for path in _get_possible_snapshot_paths(config):
-            for line in (
-                subprocess.check_output(
-                    ["sudo", zfs, "list", "-t", "snapshot", str(path)],
-                    encoding="utf8",
-                    stderr=subprocess.DEVNULL,  # ignore output of 'no datasets available'
-                )
-                .strip()
-                .splitlines()[1:]
-            ):
-                snapshotname = unify(line.split(" "))[0]
-                creation = unify(
-                    subprocess.check_output(
-                        ["sudo", zfs, "get", "-p", "creation", snapshotname],
-                        encoding="utf8",
-                    )
-                    .strip()
-                    .splitlines()[1]
-                )
-                _, _, timestamp, _ = creation.split(" ")
-                timestamp = arrow.get(int(timestamp)).datetime
-                info = {}
-                info["date"] = timestamp
-                info["fullpath"] = snapshotname
-                info["name"] = snapshotname.split("@")[1]
-                info["path"] = snapshotname.split("/")[-1]
-                yield info
+def _is_snapshot_path(config, path):
+    zfs_path = _get_zfs_path(config)
+    return path == zfs_path or path.startswith(zfs_path + ".")
+
+
+def _list_snapshots(root):
+    """
+    Lists all snapshots below root with one zfs call; cached for the
+    duration of the command.
+    """
+    key = ("snapshots", root)
+    if key not in _cache:
+        output = subprocess.check_output(
+            [
+                "sudo",
+                zfs,
+                "list",
+                "-H",
+                "-p",
+                "-o",
+                "name,creation,used,refer,clones",
+                "-t",
+                "snapshot",
+                "-r",
+                root,
+            ],
+            encoding="utf8",
+            stderr=subprocess.DEVNULL,  # ignore output of 'no datasets available'
+        )
+        snapshots = []
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            snapshotname, creation, used, referenced, clones = line.split("\t")
+            snapshots.append(
+                {
+                    "date": arrow.get(int(creation)).datetime,
+                    "fullpath": snapshotname,
+                    "name": snapshotname.split("@")[1],
+                    "path": snapshotname.split("/")[-1],
+                    "used": int(used),
+                    "referenced": int(referenced),
+                    "clones": [] if clones == "-" else clones.split(","),
+                }
+            )
+        _cache[key] = snapshots
+    return _cache[key]
 
-    yield from sorted(_get_snaps(), key=lambda x: x["date"], reverse=True)
+
+def _get_snapshots(config):
+    # the snapshot paths are siblings: <volume>, <volume>.0, <volume>.1, ...
+    root = _get_zfs_path(config).rsplit("/", 1)[0]
+    snapshots = [
+        x
+        for x in _list_snapshots(root)
+        if _is_snapshot_path(config, x["fullpath"].split("@")[0])
+    ]
+    yield from sorted(snapshots, key=lambda x: x["date"], reverse=True)
 
 
 _cache = {}
 
 
+def _clear_cache():
+    _cache.clear()
+
+
 def _get_all_zfs():
     if "folders" not in _cache:
         output = subprocess.check_output(
@@ -195,6 +226,7 @@ def _turn_into_subvolume(config):
     shutil.move(fullpath, filename)
     try:
         subprocess.check_output(["sudo", zfs, "create", fullpath_zfs])
+        _clear_cache()
         click.secho(
             f"Writing back the files to original position: from {filename}/ to {fullpath}/"
         )
@@ -233,6 +265,7 @@ def make_snapshot(ctx, config, name):
     assert " " not in name
     fullpath = _get_zfs_path(config) + "@" + name
     subprocess.check_call(["sudo", zfs, "snapshot", fullpath])
+    _clear_cache()
     __dc(config, ["up", "-d"] + ["postgres"])
     return name
 
@@ -289,6 +322,7 @@ def restore(config, name):
                 zfs_full_path,
             ]
         )
+    _clear_cache()
     __dc(config, ["rm", "-f"] + ["postgres"])
     __dc(config, ["up", "-d"] + ["postgres"])
 
@@ -305,6 +339,7 @@ def remove(config, snapshot):
     if snapshot["fullpath"] in map(itemgetter("fullpath"), snapshots):
         _try_umount(config)
         subprocess.check_call(["sudo", zfs, "destroy", "-R", snapshot["fullpath"]])
+        _clear_cache()
 
 
 def remove_volume(config):
@@ -318,6 +353,7 @@ def remove_volume(config):
             pass
         subprocess.check_call(["sudo", zfs, "destroy", "-R", path])
         click.secho(f"Removed: {path}", fg="yellow")
+    _clear_cache()
     clear_all(config)
 
 def _get_pool_mountpoint(poolname):
@@ -337,4 +373,5 @@ def clear_all(config):
     _try_umount(config)
     diskpath = translate_poolPath_to_fullPath(zfs_full_path)
     if __is_zfs_fs(diskpath):
-        subprocess.check_call(["sudo", zfs, "destroy", "-r", zfs_full_path])
\ No newline at end of file
+        subprocess.check_call(["sudo", zfs, "destroy", "-r", zfs_full_path])
+        _clear_cache()
\ No newline at end of file
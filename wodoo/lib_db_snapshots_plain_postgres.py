@@ -1,4 +1,3 @@
-import subprocess
 import yaml
 import arrow
 import json
@@ -14,55 +13,165 @@ import click
 import inquirer
 from datetime import datetime
 from .tools import measure_time
-from .tools import exec_file_in_path
 from .tools import remove_webassets
 from .tools import _askcontinue
 from .tools import get_volume_names
-from .cli import cli, pass_config, Commands
+from .cli import cli, pass_config
 from .lib_clickhelpers import AliasedGroup
 from .tools import __hash_odoo_password
 from .tools import _remove_postgres_connections, _execute_sql
+from .tools import try_ignore_exceptions
+from .tools import abort
+import psycopg2
+
+def _get_prefix(config):
+    return f"{config.dbname}_snapshot_"
+
+
+def _escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _get_server_version(conn):
+    return int(_execute_sql(conn, "show server_version_num", fetchone=True)[0])
+
 
 def __get_snapshots(config):
+    """
+    Snapshots are databases named <dbname>_snapshot_<name>; the comment
+    of the database holds the creation date. Databases of the former
+    naming <dbname>_<name>_snapshot_<date> are listed with their full name.
+    """
     conn = config.get_odoo_conn().clone(dbname='postgres')
-    snapshots = [x[0] for x in _execute_sql(
+    prefix = _get_prefix(config)
+    rows = _execute_sql(
         conn,
-        "select datname from pg_database where datname like '{}_%_snapshot_%'".format(
-            config.dbname,
+        (
+            "select datname, shobj_description(oid, 'pg_database'), "
+            "pg_database_size(datname) "
+            "from pg_database "
+            "where left(datname, %s) = %s or datname like %s"
+        ),
+        params=(
+            len(prefix),
+            prefix,
+            f"{_escape_like(config.dbname + '_')}%{_escape_like('_snapshot_')}%",
         ),
         notransaction=True,
         fetchall=True,
-    )]
-    return snapshots
+    )
+    snapshots = []
+    for datname, comment, size in rows:
+        try:
+            date = arrow.get(comment).datetime
+        except Exception:
+            date = None
+        snapshots.append({
+            "name": datname[len(prefix):] if datname.startswith(prefix) else datname,
+            "date": date,
+            "path": datname,
+            "size": size,
+        })
+    return sorted(snapshots, key=lambda x: str(x["date"] or ""), reverse=True)
+
+
+def _get_snapshot_dbname(config, name):
+    for snapshot in __get_snapshots(config):
+        if name in (snapshot["name"], snapshot["path"]):
+            return snapshot["path"]
+    return None
+
 
 def assert_environment(config):
-    exec_file_in_path('createdb')
-    exec_file_in_path('psql')
-    exec_file_in_path('dropdb')
+    pass
+
+
+def _clone_db(config, source, dest):
+    """
+    Creates dest as copy of source. From postgres 15 on the files are
+    copied (STRATEGY FILE_COPY) instead of going block by block through
+    the WAL; from postgres 18 on they are cloned, which is a reflink on
+    filesystems supporting it (xfs, btrfs, zfs) and takes about constant
+    time.
+    """
+    conn = config.get_odoo_conn().clone(dbname='postgres')
+    version = _get_server_version(conn)
+    sql = f'create database "{dest}" template "{source}"'
+    if version >= 150000:
+        sql += " strategy file_copy"
+    file_copy_methods = ["copy"]
+    if version >= 180000:
+        file_copy_methods.insert(0, "clone")
+
+    def create(file_copy_method):
+        # the template must not have any connections
+        _remove_postgres_connections(conn.clone(dbname=source))
+        with conn.batch(notransaction=True) as cr:
+            if version >= 180000:
+                _execute_sql(cr, f"set file_copy_method = {file_copy_method}")
+            try:
+                _execute_sql(cr, sql)
+            finally:
+                if version >= 180000:
+                    _execute_sql(cr, "reset file_copy_method")
+
+    for file_copy_method in file_copy_methods:
+        try:
+            try_ignore_exceptions(
+                lambda: create(file_copy_method),
+                psycopg2.errors.ObjectInUse,
+                timeout=30,
+            )
+        except psycopg2.Error as ex:
+            if file_copy_method == file_copy_methods[-1]:
+                raise
+            click.secho(
+                f"Cloning not possible ({str(ex).strip()}) - copying files.",
+                fg="yellow",
+            )
+        else:
+            break
+
+
+def _drop_db(config, dbname):
+    conn = config.get_odoo_conn().clone(dbname=dbname)
+    _remove_postgres_connections(conn)
+    _execute_sql(
+        conn.clone(dbname='postgres'),
+        f'drop database if exists "{dbname}"',
+        notransaction=True,
+    )
+
 
 def restore(config, snap):
-    _remove_postgres_connections(config.get_odoo_conn())
-    subprocess.call([
-        exec_file_in_path('dropdb'),
-        config.dbname,
-    ])
-    subprocess.call([
-        exec_file_in_path('createdb'),
-        '-T',
-        snap,
-        config.dbname,
-    ])
+    dbname = _get_snapshot_dbname(config, snap)
+    if not dbname:
+        abort(f"Snapshot {snap} does not exist.")
+    _drop_db(config, config.dbname)
+    _clone_db(config, dbname, config.dbname)
+
 
 @measure_time
-@click.pass_context
 def make_snapshot(ctx, config, name):
-    now = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
-    snapshot_name = f"{config.dbname}_{name}_snapshot_{now}"
-    Commands.invoke(ctx, "backup", snapshot_name)
-    return snapshot_name
+    snapshot_name = _get_prefix(config) + name
+    if _get_snapshot_dbname(config, name):
+        if not config.force:
+            abort(f"Snapshot {name} already exists.")
+        remove(config, name)
+    _clone_db(config, config.dbname, snapshot_name)
+    date = datetime.now().astimezone().isoformat()
+    _execute_sql(
+        config.get_odoo_conn().clone(dbname='postgres'),
+        f"comment on database \"{snapshot_name}\" is '{date}'",
+        notransaction=True,
+    )
+    return name
+
 
 def remove(config, snapshot):
-    subprocess.call([
-        exec_file_in_path('dropdb'),
-        snapshot,
-    ])
+    if isinstance(snapshot, dict):
+        snapshot = snapshot["name"]
+    dbname = _get_snapshot_dbname(config, snapshot)
+    if not dbname:
+        abort(f"Snapshot {snapshot} does not exist.")
+    _drop_db(config, dbname)
@@ -61,12 +61,15 @@ def odoo_module(config):
 @odoo_module.command(name="abort-upgrade")
 @pass_config
 def abort_upgrade(config):
+    from .module_tools import DBModules
+
     click.echo("Aborting upgrade...")
     SQL = """
         UPDATE ir_module_module SET state = 'installed' WHERE state = 'to upgrade';
         UPDATE ir_module_module SET state = 'uninstalled' WHERE state = 'to install';
     """
     _execute_sql(config.get_odoo_conn(), SQL)
+    DBModules.invalidate()
 
 
 def _get_default_modules_to_update():
@@ -277,18 +280,12 @@ def _get_outdated_versioned_modules_of_deptree(modules):
 
 
 def _get_available_modules(ctx, param, incomplete):
-    from .odoo_config import MANIFEST
+    from .completion import candidates
 
     try:
-        manifest = MANIFEST()
-        if not manifest:
-            raise Exception("no manifest")
+        return candidates("modules", incomplete)
     except:
         return []
-    modules = manifest["install"]
-    if incomplete:
-        modules = [x for x in modules if incomplete in x]
-    return sorted(modules)
 
 
 @odoo_module.command(name="UPDATE")
@@ -775,6 +772,7 @@ def _do_dangling_check(ctx, config, dangling_modules, non_interactive):
                     "'uninstalled' where state = 'uninstallable';"
                 ),
             )
+            DBModules.invalidate()
     if DBModules.get_dangling_modules() and not dangling_modules:
         if show_dangling() and not non_interactive:
             input("Abort old upgrade and continue? (Ctrl+c to break)")
@@ -834,6 +832,7 @@ def _uninstall_marked_modules(config, modules):
             ),
         )
         del module
+    DBModules.invalidate()
 
     modules = [x for x in modules if DBModules.is_module_installed(x)]
     if modules:
@@ -916,6 +915,30 @@ def show_addons_paths():
         click.echo(path)
 
 
+@odoo_module.command(name="module-index")
+@click.option(
+    "--rebuild-index",
+    is_flag=True,
+    help="Drops the persistent module index and reads all manifests again.",
+)
+@pass_config
+def module_index(config, rebuild_index):
+    from .module_tools import Modules
+    from .module_index import get_module_index
+
+    index = get_module_index()
+    if rebuild_index:
+        click.secho(f"Rebuilding module index {index.path}", fg="yellow")
+        index.rebuild()
+    started = datetime.now()
+    Modules._get_modules(no_deptree=True)
+    index.save()
+    elapsed = (datetime.now() - started).total_seconds()
+    for k, v in index.stats.items():
+        click.secho(f"{k}: {v}")
+    click.secho(f"Loaded modules in {elapsed:.3f} seconds", fg="green")
+
+
 @odoo_module.command(name="show-conflicting-modules")
 def show_conflicting_modules():
     from .odoo_config import get_odoo_addons_paths
@@ -924,9 +947,11 @@ def show_conflicting_modules():
 
 
 def _exec_update(config, params, non_interactive=False):
+    from .module_tools import DBModules
+
     params = ["odoo_update", "/update_modules.py"] + params
     if not non_interactive:
-        yield __cmd_interactive(
+        returncode = __cmd_interactive(
             config,
             *(
                 [
@@ -936,28 +961,24 @@ def _exec_update(config, params, non_interactive=False):
                 + params
             ),
         )
+        DBModules.invalidate()
+        yield returncode
     else:
         try:
             returncode, output = __dcrun(config, list(params), returnproc=True)
-            yield returncode
-            yield output
         except subprocess.CalledProcessError as ex:
+            DBModules.invalidate()
             yield ex.returncode
+        else:
+            DBModules.invalidate()
+            yield returncode
+            yield output
 
 
 def _get_available_robottests(ctx, param, incomplete):
-    from .robo_helpers import _get_all_robottest_files
-    from .odoo_config import customs_dir
+    from .completion import candidates
 
-    path = customs_dir() or Path(os.getcwd())
-    path = path / (Path(os.getcwd()).relative_to(path))
-    testfiles = list(map(str, _get_all_robottest_files(path))) or []
-    if incomplete:
-        if "/" in incomplete:
-            testfiles = list(filter(lambda x: str(x).startswith(incomplete), testfiles))
-        else:
-            testfiles = list(filter(lambda x: incomplete in x, testfiles))
-    return sorted(testfiles)
+    return candidates("robottests", incomplete)
 
 
 @odoo_module.command()
@@ -1381,9 +1402,9 @@ def _get_global_hash_paths(relative_to_customs_dir=False):
 hash_cache = {}
 
 
-def _get_directory_hash(path):
+def _get_directory_hash(path, use_cache=True):
     if path not in hash_cache:
-        hash_cache[path] = get_directory_hash(path)
+        hash_cache[path] = get_directory_hash(path, use_cache=use_cache)
     return hash_cache[path]
 
 
@@ -1446,7 +1467,7 @@ def list_deps(ctx, config, module, no_cache):
         python_version = config.ODOO_PYTHON_VERSION
         to_hash = str(python_version) + ";"
         for path in list(sorted(set(paths))):
-            _hash = _get_directory_hash(path)
+            _hash = _get_directory_hash(path, use_cache=not no_cache)
             if _hash is None:
                 raise Exception(
                     f"No hash found for {path} try it again with --no-cache"
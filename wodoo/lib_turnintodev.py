@@ -87,58 +87,61 @@ def __turn_into_devdb(ctx, config, conn):
     sql = __replace_all_envs_in_str(sql, env)
 
     critical = False
-    for line in sql.split("\n"):
-        if not line:
-            continue
-        if line.startswith("--set critical"):
-            critical = True
-            continue
-        elif line.startswith("--set not-critical"):
-            critical = False
-            continue
-
-        comment = re.findall(r"\/\*[^\*^\/]*\*\/", line)
-        if comment:
-
-            def ignore_line(comment):
-                comment = comment[2:-2]
-                if "if-table-exists" in comment:
-                    table = comment.split("if-table-exists")[1].strip()
-                    res = _execute_sql(
-                        conn,
-                        "select count(*) from information_schema.tables where table_schema='public' and table_name='{}'".format(
-                            table
-                        ),
-                        fetchone=True,
-                    )
-                    return not res[0]
-                if "if-column-exists" in comment:
-                    table, column = (
-                        comment.split("if-column-exists")[1].strip().split(".")
-                    )
-                    res = _execute_sql(
-                        conn,
-                        (
-                            f"select count(*) "
-                            f"from information_schema.columns "
-                            f"where table_schema='public' and "
-                            f"table_name='{table}' and column_name='{column}'"
-                        ),
-                        fetchone=True,
-                    )
-                    return not res[0]
-                return False
-
-            if any(list(ignore_line(comment) for comment in comment[0].split(";"))):
+    # one connection for all statements; autocommit keeps failing
+    # un-critical statements from aborting the others
+    with conn.batch(notransaction=True) as cr:
+        for line in sql.split("\n"):
+            if not line:
                 continue
-        try:
-            print(line)
-            _execute_sql(conn, line)
-        except Exception:
-            if critical:
-                raise
-            msg = traceback.format_exc()
-            print("failed un-critical sql:", msg)
+            if line.startswith("--set critical"):
+                critical = True
+                continue
+            elif line.startswith("--set not-critical"):
+                critical = False
+                continue
+
+            comment = re.findall(r"\/\*[^\*^\/]*\*\/", line)
+            if comment:
+
+                def ignore_line(comment):
+                    comment = comment[2:-2]
+                    if "if-table-exists" in comment:
+                        table = comment.split("if-table-exists")[1].strip()
+                        res = _execute_sql(
+                            cr,
+                            "select count(*) from information_schema.tables where table_schema='public' and table_name='{}'".format(
+                                table
+                            ),
+                            fetchone=True,
+                        )
+                        return not res[0]
+                    if "if-column-exists" in comment:
+                        table, column = (
+                            comment.split("if-column-exists")[1].strip().split(".")
+                        )
+                        res = _execute_sql(
+                            cr,
+                            (
+                                f"select count(*) "
+                                f"from information_schema.columns "
+                                f"where table_schema='public' and "
+                                f"table_name='{table}' and column_name='{column}'"
+                            ),
+                            fetchone=True,
+                        )
+                        return not res[0]
+                    return False
+
+                if any(list(ignore_line(comment) for comment in comment[0].split(";"))):
+                    continue
+            try:
+                print(line)
+                _execute_sql(cr, line)
+            except Exception:
+                if critical:
+                    raise
+                msg = traceback.format_exc()
+                print("failed un-critical sql:", msg)
 
     remove_webassets(conn)
     _update_setting(
@@ -0,0 +1,225 @@
+"""
+Persistent index of the modules found in the addons paths.
+
+Listing the addons paths and evaluating every manifest is expensive on big
+customs trees. The index remembers per addons path the sub directories
+(with their mtimes) and per manifest file the parsed content (keyed by
+mtime and size). On the next run only directories and manifests whose
+stat signature changed are read again.
+
+The index lives in the run directory of the project:
+
+    ~/.odoo/run/<project>/module_index
+
+"""
+import os
+import ast
+import atexit
+import pickle
+from pathlib import Path
+from .tools import atomic_write
+from .consts import FILE_MODULE_INDEX
+
+INDEX_VERSION = 1
+
+_index_cache = {}
+
+
+def parse_manifest(path):
+    """
+    Parses a manifest file as python literal.
+    """
+    return ast.literal_eval(Path(path).read_text())
+
+
+def _stat_signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class ModuleIndex(object):
+    def __init__(self, path, manifest_filename):
+        self.path = Path(path) if path else None
+        self.manifest_filename = manifest_filename
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        self.data = self._load()
+
+    def _empty(self):
+        return {
+            "version": INDEX_VERSION,
+            "manifest_filename": self.manifest_filename,
+            "addons_paths": {},
+            "manifests": {},
+        }
+
+    def _load(self):
+        if not self.path or not self.path.exists():
+            return self._empty()
+        try:
+            data = pickle.loads(self.path.read_bytes())
+        except Exception:
+            return self._empty()
+        if not isinstance(data, dict):
+            return self._empty()
+        if data.get("version") != INDEX_VERSION:
+            return self._empty()
+        if data.get("manifest_filename") != self.manifest_filename:
+            return self._empty()
+        return data
+
+    def save(self):
+        if not self.dirty or not self.path:
+            return
+        try:
+            self.path.parent.mkdir(exist_ok=True, parents=True)
+            with atomic_write(self.path) as tempfile:
+                tempfile.write_bytes(pickle.dumps(self.data))
+        except OSError:
+            return
+        self.dirty = False
+
+    def rebuild(self):
+        self.data = self._empty()
+        self.dirty = True
+        if self.path and self.path.exists():
+            self.path.unlink()
+
+    @property
+    def stats(self):
+        return {
+            "file": self.path,
+            "addons_paths": len(self.data["addons_paths"]),
+            "manifests": len(self.data["manifests"]),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _scan_subdir(self, path):
+        """
+        Returns the manifest path of a module directory or None.
+        Symlinked module directories are not followed (like find does).
+        """
+        manifest = os.path.join(path, self.manifest_filename)
+        if os.path.exists(manifest):
+            return manifest
+        return None
+
+    def get_manifest_files(self, addons_path):
+        """
+        Returns the sorted absolute paths of all manifests directly below
+        the given addons path - equivalent to find -maxdepth 2 -name <manifest>
+        """
+        addons_path = Path(addons_path).absolute()
+        key = str(addons_path)
+        signature = _stat_signature(addons_path)
+        if not signature:
+            return []
+        cached = self.data["addons_paths"].get(key)
+        if cached and cached["signature"] == signature:
+            subdirs = cached["subdirs"]
+            changed = False
+            for name, info in subdirs.items():
+                subdir = os.path.join(key, name)
+                mtime = _stat_signature(subdir)
+                if mtime == info["signature"]:
+                    continue
+                changed = True
+                subdirs[name] = {
+                    "signature": mtime,
+                    "manifest": self._scan_subdir(subdir),
+                }
+            if changed:
+                self.dirty = True
+                self.misses += 1
+            else:
+                self.hits += 1
+        else:
+            self.misses += 1
+            subdirs = {}
+            with os.scandir(key) as entries:
+                for entry in entries:
+                    if not entry.is_dir(follow_symlinks=False):
+                        continue
+                    subdirs[entry.name] = {
+                        "signature": _stat_signature(entry.path),
+                        "manifest": self._scan_subdir(entry.path),
+                    }
+            self.data["addons_paths"][key] = {
+                "signature": signature,
+                "subdirs": subdirs,
+                "root_manifest": self._scan_subdir(key),
+            }
+            self.dirty = True
+
+        result = [x["manifest"] for x in subdirs.values() if x["manifest"]]
+        root_manifest = self.data["addons_paths"][key]["root_manifest"]
+        if root_manifest:
+            result.append(root_manifest)
+        return list(map(Path, sorted(result)))
+
+    def get_manifest(self, manifest_path):
+        """
+        Returns a fresh copy of the parsed manifest; the copy may be
+        modified by the caller.
+        """
+        key = str(Path(manifest_path).absolute())
+        signature = _stat_signature(key)
+        entry = self.data["manifests"].get(key)
+        if signature and entry and entry["signature"] == signature:
+            self.hits += 1
+            return pickle.loads(entry["manifest"])
+
+        self.misses += 1
+        manifest = parse_manifest(key)
+        self.data["manifests"][key] = {
+            "signature": signature,
+            "name": Path(key).parent.name,
+            "path": str(Path(key).parent),
+            "depends": list(manifest.get("depends", [])),
+            "manifest": pickle.dumps(manifest),
+        }
+        self.dirty = True
+        return manifest
+
+    def get_depends(self, manifest_path):
+        """
+        The depends of the manifest; used by the dependency graph.
+        """
+        key = str(Path(manifest_path).absolute())
+        entry = self.data["manifests"].get(key)
+        if entry and entry["signature"] == _stat_signature(key):
+            self.hits += 1
+            return list(entry["depends"])
+        return list(self.get_manifest(key).get("depends", []))
+
+
+def get_index_file():
+    run_dir = os.getenv("HOST_RUN_DIR")
+    if not run_dir:
+        return None
+    return Path(run_dir) / FILE_MODULE_INDEX
+
+
+def get_module_index():
+    from .odoo_config import manifest_file_names
+
+    manifest_filename = manifest_file_names()
+    index = _index_cache.get("index")
+    if not index or index.manifest_filename != manifest_filename:
+        if index:
+            index.save()
+        index = ModuleIndex(get_index_file(), manifest_filename)
+        _index_cache["index"] = index
+    return index
+
+
+@atexit.register
+def _save_index():
+    index = _index_cache.get("index")
+    if index:
+        index.save()
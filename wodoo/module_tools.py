@@ -7,6 +7,7 @@ from pathlib import Path
 from copy import deepcopy
 import pickle
 import os
+import time
 import shutil
 import uuid
 from gimera.repo import Repo
@@ -38,6 +39,8 @@ from .odoo_config import manifest_file_names
 from .odoo_config import MANIFEST
 from .myconfigparser import MyConfigParser
 from .odoo_parser import get_view
+from .module_index import get_module_index
+from .dependency_graph import DependencyGraph
 import fnmatch
 import re
 import pprint
@@ -62,6 +65,9 @@ name_cache = {}
 remark_about_missing_module_info = set()
 dep_tree_cache = {}
 Modules_Cache = {}
+db_modules_cache = {}
+# seconds a snapshot of ir_module_module is trusted
+DB_MODULES_TTL = int(os.getenv("WODOO_DB_MODULES_TTL", "10"))
 
 
 def module_or_string(module):
@@ -123,7 +129,7 @@ def delete_qweb(config, modules):
             except IntegrityError:
                 cr.execute(f"rollback to savepoint {sp}")
 
-        for module in cr.fetchall():
+        for (module,) in cr.fetchall():
             if not DBModules.is_module_installed(module):
                 continue
             cr.execute(
@@ -169,6 +175,46 @@ class DBModules(object):
     def __init__(self):
         pass
 
+    @classmethod
+    def invalidate(clazz):
+        db_modules_cache.clear()
+
+    @classmethod
+    def get_snapshot(clazz):
+        """
+        All modules of ir_module_module by name (id, state, version and
+        depends) loaded with one query; kept for DB_MODULES_TTL seconds.
+        Returns None if the database is not initialized.
+        """
+        loaded = db_modules_cache.get("loaded")
+        if loaded is not None and time.monotonic() - loaded < DB_MODULES_TTL:
+            return db_modules_cache["modules"]
+
+        with get_conn_autoclose() as cr:
+            if not _exists_table(cr, "ir_module_module"):
+                modules = None
+            else:
+                cr.execute(
+                    "select m.id, m.name, m.state, m.latest_version, "
+                    "array_remove(array_agg(d.name), NULL) "
+                    "from ir_module_module m "
+                    "left join ir_module_module_dependency d on d.module_id = m.id "
+                    "group by m.id, m.name, m.state, m.latest_version"
+                )
+                modules = {
+                    name: {
+                        "name": name,
+                        "state": state,
+                        "id": id,
+                        "version": version,
+                        "depends": sorted(depends or []),
+                    }
+                    for id, name, state, version, depends in cr.fetchall()
+                }
+        db_modules_cache["modules"] = modules
+        db_modules_cache["loaded"] = time.monotonic()
+        return modules
+
     @classmethod
     def check_if_all_modules_from_install_are_installed(clazz):
         for module in get_modules_from_install_file():
@@ -183,6 +229,7 @@ class DBModules(object):
         """
         with get_conn_autoclose() as cr:
             _execute_sql(cr, SQL)
+        clazz.invalidate()
 
     @classmethod
     def show_install_state(clazz, raise_error):
@@ -204,19 +251,18 @@ class DBModules(object):
                 cr,
                 "update ir_module_module set state = 'uninstalled' where state = 'uninstallable';",
             )
+        clazz.invalidate()
 
     @classmethod
     def get_dangling_modules(clazz):
-        with get_conn_autoclose() as cr:
-            if not _exists_table(cr, "ir_module_module"):
-                return []
-
-            rows = _execute_sql(
-                cr,
-                sql="SELECT name, state from ir_module_module where state not in ('installed', 'uninstalled', 'uninstallable');",
-                fetchall=True,
-            )
-        return rows
+        modules = clazz.get_snapshot()
+        if modules is None:
+            return []
+        return [
+            (x["name"], x["state"])
+            for x in modules.values()
+            if x["state"] not in ("installed", "uninstalled", "uninstallable")
+        ]
 
     @classmethod
     def get_outdated_installed_modules(clazz, mods):
@@ -235,29 +281,17 @@ class DBModules(object):
 
     @classmethod
     def get_uninstalled_modules_where_others_depend_on(clazz):
-        sql = """
-            select
-                d.name
-            from
-                ir_module_module_dependency d
-            inner join
-                ir_module_module m
-            on
-                m.id = d.module_id
-            inner join
-                ir_module_module mprior
-            on
-                mprior.name = d.name
-            where
-                m.state in ('installed', 'to install', 'to upgrade')
-            and
-                mprior.state = 'uninstalled';
-        """
-        with get_conn_autoclose() as cr:
-            if not _exists_table(cr, "ir_module_module"):
-                return []
-            cr.execute(sql)
-            return [x[0] for x in cr.fetchall()]
+        modules = clazz.get_snapshot()
+        if modules is None:
+            return []
+        result = set()
+        for module in modules.values():
+            if module["state"] not in ("installed", "to install", "to upgrade"):
+                continue
+            for dep in module["depends"]:
+                if dep in modules and modules[dep]["state"] == "uninstalled":
+                    result.add(dep)
+        return sorted(result)
 
     @classmethod
     def dangling_modules(clazz):
@@ -269,75 +303,59 @@ class DBModules(object):
 
     @classmethod
     def get_all_installed_modules(clazz):
-        with get_conn_autoclose() as cr:
-            if not _exists_table(cr, "ir_module_module"):
-                return []
-            cr.execute(
-                "select name from ir_module_module where state not in ('uninstalled', 'uninstallable', 'to remove');"
-            )
-            return [x[0] for x in cr.fetchall()]
+        modules = clazz.get_snapshot()
+        if modules is None:
+            return []
+        return [
+            x["name"]
+            for x in modules.values()
+            if x["state"] not in ("uninstalled", "uninstallable", "to remove")
+        ]
 
     @classmethod
     def get_meta_data(clazz, module):
-        with get_conn_autoclose() as cr:
-            if not _exists_table(cr, "ir_module_module"):
-                return {}
-            cr.execute(
-                "select id, state, name, latest_version from ir_module_module where name = %s",
-                (module,),
-            )
-            record = cr.fetchone()
-            if not record:
-                return {
-                    "name": module,
-                    "state": "uninstalled",
-                    "version": False,
-                    "id": False,
-                }
+        modules = clazz.get_snapshot()
+        if modules is None:
+            return {}
+        record = modules.get(module)
+        if not record:
             return {
-                "name": record[2],
-                "state": record[1],
-                "id": record[0],
-                "version": record[3],
+                "name": module,
+                "state": "uninstalled",
+                "version": False,
+                "id": False,
             }
+        return {
+            "name": record["name"],
+            "state": record["state"],
+            "id": record["id"],
+            "version": record["version"],
+        }
 
     @classmethod
     def get_module_state(clazz, module):
-        with get_conn_autoclose() as cr:
-            cr.execute(
-                "select name, state from ir_module_module where name = %s", (module,)
-            )
-            state = cr.fetchone()
-            if not state:
-                return False
-            return state[1]
+        record = (clazz.get_snapshot() or {}).get(module)
+        if not record:
+            return False
+        return record["state"]
 
     @classmethod
     def is_module_listed(clazz, module):
-        with get_conn_autoclose() as cr:
-            if not _exists_table(cr, "ir_module_module"):
-                return False
-            cr.execute(
-                "select count(*) from ir_module_module where name = %s", (module,)
-            )
-            return bool(cr.fetchone()[0])
+        return module in (clazz.get_snapshot() or {})
 
     @classmethod
     def is_module_installed(clazz, module, raise_exception_not_initialized=False):
         if not module:
             raise Exception("no module given")
-        with get_conn_autoclose() as cr:
-            if not _exists_table(cr, "ir_module_module"):
-                if raise_exception_not_initialized:
-                    raise UserWarning("Database not initialized")
-                return False
-            cr.execute(
-                "select name, state from ir_module_module where name = %s", (module,)
-            )
-            state = cr.fetchone()
-            if not state:
-                return False
-            return state[1] in ["installed", "to upgrade"]
+        modules = clazz.get_snapshot()
+        if modules is None:
+            if raise_exception_not_initialized:
+                raise UserWarning("Database not initialized")
+            return False
+        record = modules.get(module)
+        if not record:
+            return False
+        return record["state"] in ["installed", "to upgrade"]
 
 
 def make_customs(ctx, path):
@@ -669,14 +687,10 @@ class Modules(object):
             """
             Returns a list of full paths of all manifests
             """
+            index = get_module_index()
             for path in reversed(get_odoo_addons_paths()):
-                mans = subprocess.check_output(
-                    ["find", ".", "-maxdepth", "2", "-name", manifest_file_names()],
-                    cwd=path,
-                    encoding="utf8",
-                ).splitlines()
-                for file in sorted(mans):
-                    file = path / file
+                mans = index.get_manifest_files(path)
+                for file in mans:
                     modname = file.parent.name
                     if modname in modnames:
                         continue
@@ -694,7 +708,10 @@ class Modules(object):
             for module in sorted(set(modules.values())):
                 self.get_module_flat_dependency_tree(module=module)
 
-        # if directory is clear, we may cache
+        index = get_module_index()
+        index.save()
+        if os.getenv("WODOO_VERBOSE", "") == "1":
+            click.secho(f"Module index: {index.stats}", fg="yellow")
         return modules
 
     def get_changed_modules(self, sha_start):
@@ -743,90 +760,86 @@ class Modules(object):
         return modules
 
     @classmethod
-    def _get_module_dependency_tree(cls, module):
+    def _resolve_dependency_node(cls, name):
         """
-        Dict of dicts
-
-        'stock_prod_lot_unique': {
-            'stock': {
-                'base':
-            },
-            'product': {},
-        }
+        Resolver for the dependency graph: returns the module object and
+        the names of its direct dependencies.
         """
+        try:
+            mod = Module.get_by_name(name, no_deptree=True)
+        except (NotInAddonsPath, Module.IsNot, KeyError):
+            # if it is a module, which is probably just auto install
+            # but not in the manifest, then it is not critical
+            if name not in remark_about_missing_module_info:
+                remark_about_missing_module_info.add(name)
+                click.secho(
+                    (
+                        f"Module not found at resolving dependencies: {name}"
+                        ". Not necessarily a problem at auto install modules."
+                    ),
+                    fg="blue",
+                    bold=False,
+                )
+            mod = Module(None, force_name=name)
+        if not mod.exists:
+            return mod, []
+        if mod._manifest_dict or not mod.manifest_path:
+            return mod, mod.manifest_dict.get("depends", [])
+        # only the depends, without unpickling the whole manifest
+        path = customs_dir() / mod.manifest_path
+        return mod, get_module_index().get_depends(path)
 
-        def append_deps(mod, depth):
-            result = set()
-            if depth > 1000:
-                raise Exception("Recursive loop perhaps - to depth")
-            if not mod.exists:
-                return set()
-            for dep in list(mod.manifest_dict.get("depends", [])):
-                if dep == "base":
-                    if module.name != "base":
-                        result.add(Module.get_by_name("base", no_deptree=True))
-                    continue
-                try:
-                    dep_mod = Module.get_by_name(dep, no_deptree=True)
-                except (NotInAddonsPath, Module.IsNot, KeyError):
-                    # if it is a module, which is probably just auto install
-                    # but not in the manifest, then it is not critical
-                    if dep not in remark_about_missing_module_info:
-                        remark_about_missing_module_info.add(dep)
-                        click.secho(
-                            (
-                                f"Module not found at resolving dependencies: {dep}"
-                                ". Not necessarily a problem at auto install modules."
-                            ),
-                            fg="blue",
-                            bold=False,
-                        )
-                    dep_mod = Module(None, force_name=dep)
-
-                result.add(dep_mod)
-                if dep_mod in dep_tree_cache:
-                    result |= set(dep_tree_cache[dep_mod])
-                    continue
-
-                result |= append_deps(dep_mod, depth + 1)
-
-            dep_tree_cache[mod] = result
-            return result
+    @classmethod
+    def get_dependency_graph(cls):
+        if "graph" not in dep_tree_cache:
+            dep_tree_cache["graph"] = DependencyGraph(cls._resolve_dependency_node)
+        return dep_tree_cache["graph"]
 
+    @classmethod
+    def _get_module_dependency_tree(cls, module):
+        """
+        Sorted list of all direct and indirect dependencies of module.
+        """
         if module._dep_tree is None:
-            deps = list(sorted(append_deps(module, depth=0)))
-            module._dep_tree = deps
+            graph = cls.get_dependency_graph()
+            if not module.exists:
+                bits = 0
+            else:
+                bits = graph.closure_of_depends(
+                    module.manifest_dict.get("depends", [])
+                )
+            module._dep_bits = bits
+            module._dep_tree = sorted(graph.get_payloads(bits))
         return module._dep_tree
 
+    @classmethod
+    def get_module_dependency_bits(cls, module):
+        """
+        Transitive dependencies of module as bitset of the dependency graph.
+        """
+        cls._get_module_dependency_tree(module)
+        return module._dep_bits
+
     def get_all_modules_installed_by_manifest(self, additional_modules=None):
-        all_modules = set()
+        graph = self.get_dependency_graph()
+        all_modules = 0
         for module in MANIFEST().get("install", []) + (additional_modules or []):
-            all_modules.add(module)
             module = Module.get_by_name(module)
-            for module2 in self.get_module_flat_dependency_tree(module):
-                all_modules.add(module2.name)
-
-        all_auto_installed_modules = self.get_all_auto_install_modules()
-        while True:
-            len_modules = len(all_modules)
-            for auto_install_module in all_auto_installed_modules:
-                for module2 in self.get_module_flat_dependency_tree(
-                    auto_install_module
-                ):
-                    # not sufficient: if depending on auto_install module
-                    # for module2 in auto_install_module.manifest_dict['depends']:
-                    if module2.name not in all_modules:
-                        break
-                else:
-                    all_modules.add(auto_install_module.name)
-            if len_modules == len(all_modules):
-                break
-        return list(all_modules)
+            all_modules |= graph.bits([module.name])
+            all_modules |= self.get_module_dependency_bits(module)
+
+        # not sufficient: if depending on auto_install module
+        # checking only manifest_dict['depends']; whole tree required
+        all_auto_installed_modules = [
+            (graph.id(x.name), self.get_module_dependency_bits(x))
+            for x in self.get_all_auto_install_modules()
+        ]
+        all_modules = graph.resolve_triggers(all_modules, all_auto_installed_modules)
+        return graph.get_names(all_modules)
 
     @classmethod
     def get_module_flat_dependency_tree(self, module):
-        deps = self._get_module_dependency_tree(module)
-        return sorted(list(deps))
+        return list(self._get_module_dependency_tree(module))
 
     def get_all_auto_install_modules(self):
         auto_install_modules = []
@@ -839,6 +852,17 @@ class Modules(object):
                 auto_install_modules.append(module)
         return list(sorted(set(auto_install_modules)))
 
+    def _filter_bits(self, bits, predicate):
+        """
+        Returns the subset of bits whose modules match the predicate.
+        """
+        graph = self.get_dependency_graph()
+        result = 0
+        for id in graph.iter_ids(bits):
+            if predicate(graph.payloads[id]):
+                result |= 1 << id
+        return result
+
     # @profile
     def get_filtered_auto_install_modules_based_on_module_list(self, module_list):
         def _transform_modulelist(module_list):
@@ -851,36 +875,27 @@ class Modules(object):
 
         module_list = list(_transform_modulelist(module_list))
 
-        complete_modules = set()
+        complete_modules = 0
         for mod in module_list:
-            complete_modules |= set(list(self.get_module_flat_dependency_tree(mod)))
+            complete_modules |= self.get_module_dependency_bits(mod)
 
         def _get(all_modules):
+            # the condition does not depend on the other auto install
+            # modules, so one pass is enough
             for auto_install_module in all_modules:
-                dependencies = set(
-                    list(self.get_module_flat_dependency_tree(auto_install_module))
-                )
-                installed_dependencies = set(
-                    [
-                        x
-                        for x in sorted(dependencies)
-                        if x.exists
-                        if x.manifest_dict.get("auto_install") or x in complete_modules
-                    ]
+                dependencies = self.get_module_dependency_bits(auto_install_module)
+                existing = self._filter_bits(dependencies, lambda x: x.exists)
+                if existing != dependencies:
+                    continue
+                # dependencies outside the list must be auto install themselves
+                outside = dependencies & ~complete_modules
+                auto_install = self._filter_bits(
+                    outside, lambda x: x.manifest_dict.get("auto_install")
                 )
-                if dependencies == installed_dependencies:
+                if outside == auto_install:
                     yield auto_install_module
 
-                    if all(x in module_list for x in dependencies):
-                        yield auto_install_module
-
-        modules = list(sorted(self.get_all_auto_install_modules()))
-        while True:
-            before = list(sorted(set(map(lambda x: x.name, modules))))
-            modules = list(_get(modules))
-            after = list(sorted(set(map(lambda x: x.name, modules))))
-            if after == before:
-                break
+        modules = list(_get(self.get_all_auto_install_modules()))
         return list(sorted(set(modules)))
 
     # @profile
@@ -1067,6 +1082,7 @@ class Module(object):
         self._manifest_dict = None
         self._manifest_path = None
         self._dep_tree = None
+        self._dep_bits = None
         if path:
             self.__init_path(path, manifest_file_names())
             self.path = self._manifest_path.parent
@@ -1125,13 +1141,7 @@ class Module(object):
                 if not self.manifest_path:
                     abort(f"Could not find manifest path for {self.name}")
                 path = customs_dir() / self.manifest_path
-                content = path.read_text()
-                content = "\n".join(
-                    filter(
-                        lambda x: not x.strip().startswith("#"), content.splitlines()
-                    )
-                )
-                self._manifest_dict = eval(content)  # TODO safe
+                self._manifest_dict = get_module_index().get_manifest(path)
 
             except (SyntaxError, Exception) as e:
                 abort(f"error at file: {self.manifest_path}:\n{str(e)}")
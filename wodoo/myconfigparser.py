@@ -4,6 +4,15 @@ import sys
 from pathlib import Path
 from .tools import atomic_write
 
+# incremented per file on every write; lets cached snapshots notice writes
+# that happen within the same mtime tick
+write_generations = {}
+
+
+def _touch_generation(path):
+    key = str(path)
+    write_generations[key] = write_generations.get(key, 0) + 1
+
 
 def _get_ignore_case_item(d, k):
     try:
@@ -41,6 +50,7 @@ class MyConfigParser:
         if self.fileName:
             self.fileName.parent.mkdir(exist_ok=True, parents=True)
             self.fileName.write_text("")
+            _touch_generation(self.fileName)
 
     def keys(self):
         return self.configOptions.keys()
@@ -104,6 +114,7 @@ class MyConfigParser:
 
         with atomic_write(self.fileName) as file:
             file.write_text("\n".join(_update_lines()) + "\n")
+        _touch_generation(self.fileName)
 
     def __getitem__(self, key):
         try:
@@ -130,3 +141,93 @@ class MyConfigParser:
             return self[key]
         except Exception:
             return default_value
+
+
+class CachedSettings(object):
+    """
+    Snapshot of a settings file; the file is checked once per command
+    invocation (first access), after every write through MyConfigParser and
+    on reload(). Changes made by other processes meanwhile are not seen.
+    Looked up values are remembered, so repeated access is a dict lookup.
+    """
+
+    def __init__(self, fileName):
+        self.fileName = Path(fileName)
+        self.signature = None
+        self.generation = None
+        self.options = {}
+        self.values = {}
+
+    def _get_signature(self):
+        try:
+            st = self.fileName.stat()
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _refresh(self):
+        generation = write_generations.get(str(self.fileName), 0)
+        if generation == self.generation:
+            return
+        signature = self._get_signature()
+        # a write within the same mtime tick does not change the signature
+        written = self.generation is not None
+        if written or signature != self.signature:
+            self.options = dict(MyConfigParser(self.fileName).configOptions)
+            self.values = {}
+            self.signature = signature
+        self.generation = generation
+
+    def reload(self):
+        """
+        Checks the file again at next access, e.g. after another process
+        changed it.
+        """
+        self.generation = None
+
+    def keys(self):
+        self._refresh()
+        return self.options.keys()
+
+    def get(self, key, default_value=""):
+        self._refresh()
+        try:
+            return _get_ignore_case_item(self.options, key)
+        except KeyError:
+            return default_value
+
+    def get_value(self, name):
+        """
+        Value like accessed by config.<name>: "1"/"0" become booleans;
+        suffixes _as_int and _as_bool convert the value.
+        """
+        self._refresh()
+        try:
+            return self.values[name]
+        except KeyError:
+            pass
+
+        key = name
+        convert = None
+        if key.endswith("_as_int"):
+            convert = "asint"
+            key = key[: -len("_as_int")]
+        elif key.endswith("_as_bool"):
+            convert = "asbool"
+            key = key[: -len("_as_bool")]
+
+        value = ""
+        for tries in [key, key.lower(), key.upper()]:
+            if tries in self.options:
+                value = self.options[tries]
+                break
+
+        if convert == "asint":
+            value = int(value or "0")
+
+        if value == "1":
+            value = True
+        elif value == "0":
+            value = False
+        self.values[name] = value
+        return value
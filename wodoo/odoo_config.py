@@ -1,4 +1,5 @@
 from contextlib import contextmanager
+import copy
 import shutil
 import tempfile
 from datetime import datetime
@@ -27,11 +28,39 @@ except Exception:
     pass
 
 
+addons_paths_cache = {}
+customs_dir_cache = {}
+manifest_file_cache = {}
+manifest_cache = {}
+manifest_instances = {}
+
+
 def get_odoo_addons_paths(
     relative=False, no_extra_addons_paths=False, additional_addons_paths=False
 ):
+    """
+    Computed once per MANIFEST content and arguments; returns a new list.
+    """
     m = MANIFEST()
     c = customs_dir()
+    key = (
+        m.path,
+        m._read()[0],
+        c,
+        relative,
+        no_extra_addons_paths,
+        tuple(additional_addons_paths or []),
+    )
+    if key not in addons_paths_cache:
+        addons_paths_cache[key] = _get_odoo_addons_paths(
+            m, c, relative, no_extra_addons_paths, additional_addons_paths
+        )
+    return list(addons_paths_cache[key])
+
+
+def _get_odoo_addons_paths(
+    m, c, relative, no_extra_addons_paths, additional_addons_paths
+):
     res = []
     addons_paths = m["addons_paths"]
     if additional_addons_paths:
@@ -59,24 +88,23 @@ def get_odoo_addons_paths(
 
 
 def customs_dir():
+    """
+    CUSTOMS_DIR or the next directory upwards containing a MANIFEST; the
+    search is done once per working directory.
+    """
     env_customs_dir = os.getenv("CUSTOMS_DIR")
-    if not env_customs_dir:
-        manifest_file = Path(os.getcwd()) / "MANIFEST"
-        if manifest_file.exists():
-            return manifest_file.parent
-        else:
-            here = Path(os.getcwd())
-            while not (here / "MANIFEST").exists():
-                here = here.parent
-                if here.parent == here:
-                    break
-            if (here / "MANIFEST").exists():
-                return here
-
-            click.secho("no MANIFEST file found in current directory.")
-    if not env_customs_dir:
-        return None
-    return Path(env_customs_dir)
+    if env_customs_dir:
+        return Path(env_customs_dir)
+    cwd = os.getcwd()
+    if cwd not in customs_dir_cache:
+        here = Path(cwd)
+        while not (here / "MANIFEST").exists():
+            if here.parent == here:
+                click.secho("no MANIFEST file found in current directory.")
+                return None
+            here = here.parent
+        customs_dir_cache[cwd] = here
+    return customs_dir_cache[cwd]
 
 
 def plaintextfile():
@@ -84,6 +112,11 @@ def plaintextfile():
     return path
 
 
+def astindexfile():
+    path = customs_dir() / ".odoo.ast.db"
+    return path
+
+
 def _read_file(path, default=None):
     try:
         with open(path, "r") as f:
@@ -96,7 +129,11 @@ def MANIFEST_FILE():
     _customs_dir = customs_dir()
     if not _customs_dir:
         return None
-    return _customs_dir.resolve().absolute() / "MANIFEST"
+    if _customs_dir not in manifest_file_cache:
+        manifest_file_cache[_customs_dir] = (
+            _customs_dir.resolve().absolute() / "MANIFEST"
+        )
+    return manifest_file_cache[_customs_dir]
 
 
 class MANIFEST_CLASS(object):
@@ -115,15 +152,30 @@ class MANIFEST_CLASS(object):
         if "version" not in d:
             self["version"] = float(d["version"])
 
+    def _read(self):
+        """
+        Returns (signature, data) of the file; it is parsed again only
+        after mtime, size or inode changed. The data must not be modified.
+        """
+        stat = self.path.stat()
+        signature = stat.st_mtime_ns, stat.st_size, stat.st_ino
+        cached = manifest_cache.get(self.path)
+        if not cached or cached[0] != signature:
+            cached = signature, OrderedDict(eval(self.path.read_text() or "{}"))
+            manifest_cache[self.path] = cached
+        return cached
+
     def _get_data(self):
-        return OrderedDict(eval(self.path.read_text() or "{}"))
+        return copy.deepcopy(self._read()[1])
 
     def __getitem__(self, key):
-        data = self._get_data()
-        return data[key]
+        return copy.deepcopy(self._read()[1][key])
 
     def get(self, key, default):
-        return self._get_data().get(key, default)
+        data = self._read()[1]
+        if key not in data:
+            return default
+        return copy.deepcopy(data[key])
 
     def __setitem__(self, key, value):
         data = self._get_data()
@@ -145,7 +197,14 @@ class MANIFEST_CLASS(object):
 
 
 def MANIFEST():
-    return MANIFEST_CLASS()
+    """
+    One instance per MANIFEST file; see MANIFEST_CLASS._read for changes of
+    the file.
+    """
+    path = MANIFEST_FILE()
+    if path not in manifest_instances:
+        manifest_instances[path] = MANIFEST_CLASS()
+    return manifest_instances[path]
 
 
 cache_version = {}
@@ -219,18 +278,17 @@ def get_conn(db=None, host=None):
 
 
 @contextmanager
-def get_conn_autoclose(*args, **kwargs):
-    conn, cr = get_conn(*args, **kwargs)
-    try:
+def get_conn_autoclose(db=None, host=None):
+    """
+    Cursor on a pooled connection; commits at the end.
+    """
+    from .tools import DBConnection
+
+    config = get_settings()
+    host, port, user, password = get_postgres_connection_params()
+    connection = DBConnection(db or config["DBNAME"], host, port, user, password)
+    with connection.batch() as cr:
         yield cr
-    except Exception:
-        conn.rollback()
-        raise
-    else:
-        conn.commit()
-    finally:
-        cr.close()
-        conn.close()
 
 
 def translate_path_into_machine_path(path):
@@ -1,18 +1,21 @@
 from pathlib import Path
 import os
 import re
+import json
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
 from lxml import etree
-import tempfile
+from .tools import atomic_write
 from .odoo_config import customs_dir
 from .odoo_config import plaintextfile
-from .odoo_config import translate_path_relative_to_customs_root
-
-modified_filename = ""
-cache_models = {}
-cache_xml_ids = {}
+from .odoo_config import astindexfile
 
 SEP_FILE = ":::"
 SEP_LINENO = ":"
+AST_INDEX_VERSION = 1
+SQLITE_TIMEOUT = 30
+# below that number of changed files a process pool costs more than it saves
+PARALLEL_THRESHOLD = 200
 
 
 def try_to_get_filepath(filepath):
@@ -40,606 +43,587 @@ def get_file_lineno(line):
     return path, int(lineno)
 
 
-def get_view(inherit_id):
-    with plaintextfile().open("r") as f:
-        lines = f.readlines()
-        lines = filter(lambda line: inherit_id in line, lines)
-        lines = filter(lambda line: re.search(rf"\D\ {inherit_id}\ \D", line), lines)
-        lines = list(lines)
-        if lines:
-            return get_file_lineno(lines[0])
-    return None, None
-
-
-def get_qweb_template(name):
-    with plaintextfile().open("r") as f:
-        lines = f.readlines()
-        lines = list(filter(lambda line: "~qweb" in line and name in line, lines))
-        if lines:
-            return get_file_lineno(lines[0])
-    return None, None
+def _lookup(method, kind, key):
+    path = astindexfile()
+    if not path.exists():
+        return None, None
+    index = AstIndex(path)
+    try:
+        found = getattr(index, method)(kind, key)
+    finally:
+        index.close()
+    if not found:
+        return None, None
+    return try_to_get_filepath(found[0]), found[1]
 
 
-def walk_files(on_match, pattern):
-    from .module_tools import Module, Modules
+def get_view(inherit_id):
+    return _lookup("find", "xml_ids", inherit_id)
 
-    if modified_filename:
-        try:
-            mod = Module(modified_filename)
-        except Module.IsNot:
-            modules = Modules().modules.values()
-        else:
-            modules = [mod]
-    else:
-        modules = Modules().modules.values()
-
-    for mod in modules:
-        for file in mod.path.glob("**/" + pattern):
-
-            rel_file = file.relative_to(mod.path)
-            if rel_file.parts[0] in [
-                "migrations",
-                "migration",
-            ]:  # ignore migrations folder that contain OpenUpgrade
-                continue
-            if ".git" in file.parts:
-                continue
-            if file.name.startswith("."):
-                continue
 
-            lines = file.read_text(encoding="utf-8", errors="ignore").split("\n")
-            on_match(file, mod, lines)
-
-
-def _get_methods():
-
-    result = []
-
-    def on_match(filename, module, lines):
-        for linenumber, line in enumerate(lines):
-            linenumber += 1
-            methodname = re.search(r"def\ ([^\(]*)", line)
-            if methodname:
-                methodname = methodname.group(1)
-                model = None
-                if filename in cache_models:
-                    if "lines" in cache_models[filename]:
-                        linenums = list(
-                            reversed(
-                                list(
-                                    filter(
-                                        lambda x: x < linenumber,
-                                        cache_models[filename]["lines"].keys(),
-                                    )
-                                )
-                            )
-                        )
-                        model = None
-                        if len(linenums) > 0:
-                            model = cache_models[filename]["lines"][linenums[0]]
-
-                    result.append(
-                        {
-                            "model": model,
-                            "module": module.name,
-                            "type": "N/A",
-                            "filename": os.path.basename(filename),
-                            "filepath": filename,
-                            "line": linenumber,
-                            "method": methodname,
-                        }
-                    )
-
-    walk_files(on_match, "*.py")
+def get_qweb_template(name):
+    filepath, lineno = _lookup("find", "qweb", name)
+    if not filepath:
+        # t-extend may omit the module prefix
+        filepath, lineno = _lookup("find_by_suffix", "qweb", "." + name)
+    return filepath, lineno
 
-    return result
 
+def _get_model_of_line(class_lines, linenumber):
+    """
+    Returns the model of the nearest class definition above linenumber.
+    """
+    linenums = [x for x in class_lines if x < linenumber]
+    if linenums:
+        return class_lines[max(linenums)]
+    return None
 
-def _get_fields():
 
-    result = []
+def _extract_models(lines, result):
+    osvregex = [
+        r"class.*\(.*osv.*\)",
+        r"class.*\(.*TransientModel.*\)",
+        r"class.*\(.*Model.*\)",
+    ]
 
-    def on_match(filename, module, lines):
-        for linenumber, line in enumerate(lines):
-            linenumber += 1
-            if "#" in line:
-                line = line.split("#")[0]
+    def append_model(name, name_linenum, inherit, inherit_linenum):
+        if name == "" and inherit == "":
+            return
 
-            match = re.search(r".*=.*fields\..*\(", line)
-            if match:
-                fieldname = match.group(0).split("=")[0].strip()
-            else:
-                # V8
-                match = re.search(r"[\'\"]([^\'^\"]*)[\'\"].*fields\.", line)
-                if not match:
-                    continue
-                fieldname = match.group(1)
-            if filename in cache_models and "lines" in cache_models[filename]:
-                linenums = list(
-                    reversed(
-                        list(
-                            filter(
-                                lambda x: x < linenumber,
-                                cache_models[filename]["lines"].keys(),
-                            )
-                        )
-                    )
-                )
-                model = None
-                if len(linenums) > 0:
-                    model = cache_models[filename]["lines"][linenums[0]]
-
-                result.append(
-                    {
-                        "model": model,
-                        "module": module.name,
-                        "type": "N/A",
-                        "filename": os.path.basename(filename),
-                        "filepath": filename,
-                        "line": linenumber,
-                        "field": fieldname,
-                    }
-                )
+        if name == "" and len(inherit) != "":
+            model = inherit
+            linenum = inherit_linenum
+            inherited = True
+        else:
+            model = name
+            linenum = name_linenum
+            inherited = False
+
+        result["class_lines"][linenum] = model
+        result["models"].append(
+            {
+                "model": model,
+                "line": linenum,
+                "inherited": inherited,
+            }
+        )
 
-    walk_files(on_match, "*.py")
+    for linenum, line in enumerate(lines):
+        linenum += 1
 
-    return result
+        if any(re.match(x, line) for x in osvregex):
+            _name = ""
+            _inherit = ""
 
+            for linenum1 in range(linenum, len(lines)):
+                line1 = lines[linenum1]
 
-def _get_views():
+                if re.search(r"[\\\t\ ]_name.?=", line1):
+                    _name = re.search("[\\'\\\"]([^\\'^\\\"]*)[\\'\\\"]", line1)
+                    if _name:
+                        _name = _name.group(1)
+                elif re.search(r"[\\\t\ ]_inherit.?=", line1):
+                    match = re.search("[\\'\\\"]([^\\'^\\\"]*)[\\'\\\"]", line1)
+                    if match:
+                        _inherit = match.group(1)
+                elif any(re.match(x, line1) for x in osvregex):
+                    # reached new class so append it
+                    break
 
-    result = []
-    for id in cache_xml_ids["ids"]:
-        e = cache_xml_ids["ids"][id]
-        if e["model"] == "ir.ui.view":
-            if not e["type"] and e["inherit_id"]:
-                parent = e
-                BARRIER = 0
-                while parent and parent["inherit_id"] and BARRIER < 10:
-                    parent = cache_xml_ids["ids"].get(e["inherit_id"], None)
-                    BARRIER += 1
-                if parent:
-                    e["type"] = parent["type"]
-            result.append(e)
+            # use line of class; there are cases e.g. stock.move, where
+            # _columns is above _name
+            append_model(_name, linenum, _inherit, linenum)
 
-    return result
 
+def _extract_methods(lines, result):
+    if not result["class_lines"]:
+        return
+    for linenumber, line in enumerate(lines):
+        linenumber += 1
+        methodname = re.search(r"def\ ([^\(]*)", line)
+        if methodname:
+            result["methods"].append(
+                {
+                    "model": _get_model_of_line(result["class_lines"], linenumber),
+                    "line": linenumber,
+                    "method": methodname.group(1),
+                }
+            )
 
-def _get_qweb_templates():
-    result = []
 
-    def on_match(filename, module, lines):
-        if filename.relative_to(module.path).parts[0] != "static":
-            return
+def _extract_fields(lines, result):
+    if not result["class_lines"]:
+        return
+    for linenumber, line in enumerate(lines):
+        linenumber += 1
+        if "#" in line:
+            line = line.split("#")[0]
+
+        match = re.search(r".*=.*fields\..*\(", line)
+        if match:
+            fieldname = match.group(0).split("=")[0].strip()
+        else:
+            # V8
+            match = re.search(r"[\'\"]([^\'^\"]*)[\'\"].*fields\.", line)
+            if not match:
+                continue
+            fieldname = match.group(1)
+        result["fields"].append(
+            {
+                "model": _get_model_of_line(result["class_lines"], linenumber),
+                "line": linenumber,
+                "field": fieldname,
+            }
+        )
 
-        try:
-            tree = etree.parse(filename)
-        except Exception:
-            return
 
-        # get all records
-        for r in tree.xpath("/templates/*"):
-            if "t-name" in r.attrib:
-                id = r.attrib["t-name"]
-                extends = r.get("t-extend", "")
+def _extract_qweb_templates(module_name, tree, result):
+    for r in tree.xpath("/templates/*"):
+        if "t-name" in r.attrib:
+            id = r.attrib["t-name"]
+            extends = r.get("t-extend", "")
 
-                if "." not in id:
-                    id = "%s.%s" % (module.name, id)
+            if "." not in id:
+                id = "%s.%s" % (module_name, id)
 
-                r = {
+            result["qweb"].append(
+                {
                     "type": "qweb",
-                    "module": module.name,
                     "id": id,
-                    "filename": os.path.basename(filename),
-                    "filepath": filename,
                     "line": r.sourceline,
                     "name": id,
                     "inherit_id": extends,
                 }
+            )
 
-                result.append(r)
-
-    walk_files(on_match, "*.xml")
-    sorted(result, key=lambda x: x["name"])
-
-    return result
-
-
-def _get_xml_ids():
-    result = []
-
-    cache_xml_ids.setdefault("files", {})
-    cache_xml_ids.setdefault("ids", {})
-
-    def on_match(filename, module, lines):
-        try:
-            tree = etree.parse(str(filename))
-        except TypeError:
-            return
-        except etree.XMLSyntaxError:
-            return
-
-        if filename not in cache_xml_ids["files"]:
-            cache_xml_ids["files"][filename] = []
-
-        def append_result(
-            model, xmlid, line, res_model, name="", ttype="", inherit_id=""
-        ):
 
-            if "." not in xmlid:
-                xmlid = "%s.%s" % (module.name, xmlid)
+def _extract_xml_ids(module_name, tree, result):
+    def append_result(model, xmlid, line, res_model, name="", ttype="", inherit_id=""):
+        if "." not in xmlid:
+            xmlid = "%s.%s" % (module_name, xmlid)
 
-            # find res_models of view:
-            if model and xmlid and "." in xmlid:
-                r = {
-                    "module": module.name,
+        if model and xmlid and "." in xmlid:
+            result["xml_ids"].append(
+                {
                     "model": model,
                     "id": xmlid,
-                    "filename": os.path.basename(filename),
-                    "filepath": filename,
                     "line": line,
                     "res_model": res_model,
                     "name": name,
                     "type": ttype,
                     "inherit_id": inherit_id,
                 }
+            )
 
-                cache_xml_ids["ids"][xmlid] = r
-                cache_xml_ids["files"][filename].append(r)
-                result.append(r)
-
-        # get all records
-        for r in tree.xpath("//record"):
-            if "id" in r.attrib and "model" in r.attrib:
-                id = r.attrib["id"]
-                model = r.attrib["model"]
+    # get all records
+    for r in tree.xpath("//record"):
+        if "id" in r.attrib and "model" in r.attrib:
+            id = r.attrib["id"]
+            model = r.attrib["model"]
 
-                res_model = r.xpath("field[@name='model' or @name='res_model']")
-                if len(res_model) > 0:
-                    res_model = res_model[0].text
-                else:
-                    res_model = ""
+            res_model = r.xpath("field[@name='model' or @name='res_model']")
+            if len(res_model) > 0:
+                res_model = res_model[0].text
+            else:
+                res_model = ""
 
-                if model == "ir.ui.menuitem":
+            if model == "ir.ui.menuitem":
+                name = r.xpath("field[@name='name']")
+                name = name[0].text if name else ""
+                append_result(model, id, r.sourceline, "", name)
+            elif model == "ir.ui.view":
+                name = ""
+                inherit_id = ""
+                if r.xpath("field[@name='name']"):
                     name = r.xpath("field[@name='name']")[0].text
-                    append_result(model, id, r.sourceline, "", name)
-                elif model == "ir.ui.view":
-                    name = ""
-                    inherit_id = ""
-                    if r.xpath("field[@name='name']"):
-                        name = r.xpath("field[@name='name']")[0].text
-                    if r.xpath("field[@name='inherit_id']"):
-                        if r.xpath("field[@name='inherit_id']/@ref"):
-                            inherit_id = r.xpath("field[@name='inherit_id']/@ref")[0]
-                            if "." not in inherit_id:
-                                inherit_id = f"{module}.{inherit_id}"
-                    ttype = ""
-                    if not inherit_id:
-                        if r.xpath("field[@name='arch']"):
-                            arch = etree.tostring(
-                                r.xpath("field[@name='arch']")[0]
-                            ).decode("utf-8")
-                            lines = [x.strip() for x in arch.split("\n")]
-                            lines = [l for l in lines if l]
-                            lines = lines[:5]
-
-                            for line in lines:
-                                for _t in [
-                                    "form",
-                                    "tree",
-                                    "calendar",
-                                    "search",
-                                    "kanban",
-                                ]:
-                                    token = f"<{_t} "
-                                    if token in line:
-                                        ttype = _t
-                    append_result(
-                        model,
-                        id,
-                        r.sourceline,
-                        "",
-                        name,
-                        ttype=ttype,
-                        inherit_id=inherit_id,
-                    )
-                else:
-                    append_result(model, id, r.sourceline, res_model)
-
-        for r in tree.xpath("//menuitem"):
-            if "id" in r.attrib:
-                id = r.attrib["id"]
-                model = "ir.ui.menuitem"
-                name = id
-                try:
-                    name = r.attrib["name"]
-                except Exception:
-                    # if there is no name, then name comes from
-                    # associated action
-                    try:
-                        action = r.attrib["action"]
-                    except Exception:
-                        action = ""
-
-                    if action in cache_xml_ids:
-                        name = cache_xml_ids[action].get("name")
+                if r.xpath("field[@name='inherit_id']"):
+                    if r.xpath("field[@name='inherit_id']/@ref"):
+                        inherit_id = r.xpath("field[@name='inherit_id']/@ref")[0]
+                        if "." not in inherit_id:
+                            inherit_id = f"{module_name}.{inherit_id}"
+                ttype = ""
+                if not inherit_id:
+                    if r.xpath("field[@name='arch']"):
+                        arch = etree.tostring(r.xpath("field[@name='arch']")[0]).decode(
+                            "utf-8"
+                        )
+                        lines = [x.strip() for x in arch.split("\n")]
+                        lines = [l for l in lines if l]
+                        lines = lines[:5]
+
+                        for line in lines:
+                            for _t in [
+                                "form",
+                                "tree",
+                                "calendar",
+                                "search",
+                                "kanban",
+                            ]:
+                                token = f"<{_t} "
+                                if token in line:
+                                    ttype = _t
+                append_result(
+                    model,
+                    id,
+                    r.sourceline,
+                    "",
+                    name,
+                    ttype=ttype,
+                    inherit_id=inherit_id,
+                )
+            else:
+                append_result(model, id, r.sourceline, res_model)
 
-                append_result(model, id, r.sourceline, "", name)
+    for r in tree.xpath("//menuitem"):
+        if "id" in r.attrib:
+            id = r.attrib["id"]
+            # if there is no name, then name would come from the action
+            name = r.attrib.get("name", id)
+            append_result("ir.ui.menuitem", id, r.sourceline, "", name)
 
-        for r in tree.xpath("//report"):
-            if "id" in r.attrib:
-                id = r.attrib["id"]
-                model = "report"
-                append_result(model, id, r.sourceline, "")
+    for r in tree.xpath("//report"):
+        if "id" in r.attrib:
+            append_result("report", r.attrib["id"], r.sourceline, "")
 
-        for r in tree.xpath("//template"):
-            if "id" in r.attrib:
-                id = r.attrib["id"]
-                model = "ir.ui.view"
-                inherit_id = ""
-                if r.get("inherit_id"):
-                    inherit_id = r.get("inherit_id")
-                append_result(model, id, r.sourceline, "qweb", inherit_id=inherit_id)
+    for r in tree.xpath("//template"):
+        if "id" in r.attrib:
+            id = r.attrib["id"]
+            inherit_id = r.get("inherit_id") or ""
+            append_result("ir.ui.view", id, r.sourceline, "qweb", inherit_id=inherit_id)
 
-    walk_files(on_match, "*.xml")
-    result.sort(key=lambda x: x["id"])
 
+def parse_file(module_name, module_path, filepath):
+    """
+    Reads the file once and runs all extractors for its type.
+    """
+    result = {
+        "module": module_name,
+        "class_lines": {},
+        "models": [],
+        "methods": [],
+        "fields": [],
+        "xml_ids": [],
+        "qweb": [],
+    }
+    filepath = Path(filepath)
+    content = filepath.read_bytes()
+    if filepath.suffix == ".py":
+        lines = content.decode("utf-8", errors="ignore").split("\n")
+        _extract_models(lines, result)
+        _extract_methods(lines, result)
+        _extract_fields(lines, result)
+    elif filepath.suffix == ".xml":
+        try:
+            tree = etree.fromstring(content)
+        except (ValueError, etree.XMLSyntaxError):
+            return result
+        _extract_xml_ids(module_name, tree, result)
+        if filepath.relative_to(module_path).parts[0] == "static":
+            _extract_qweb_templates(module_name, tree, result)
     return result
 
 
-def _get_models():
-    result = []
-
-    def on_match(filename, module, lines):
-        with open(filename, "r") as f:
-            lines = f.readlines()
-
-            def append_model(name, name_linenum, inherit, inherit_linenum):
-                if name == "" and inherit == "":
-                    return
-
-                if name == "" and len(inherit) != "":
-                    model = inherit
-                    linenum = inherit_linenum
-                    inherited = True
-                else:
-                    model = name
-                    linenum = name_linenum
-                    inherited = False
-
-                global cache_models
-                if filename not in cache_models:
-                    cache_models[filename] = {"lines": {}, "models": {}}
-                if model not in cache_models[filename]["models"]:
-                    cache_models[filename]["models"][model] = []
-                if "models" not in cache_models:
-                    cache_models["models"] = {}
-                if model not in cache_models["models"]:
-                    cache_models["models"][model] = []
-                cache_models[filename]["models"][model].append(linenum)
-                cache_models[filename]["lines"][linenum] = model
-                cache_models["models"][model].append(
-                    {
-                        "file": filename,
-                        "line": linenum,
-                        "inherited": inherited,
-                        "module": module,
-                    }
-                )
-
-            for linenum, line in enumerate(lines):
-                linenum += 1
-
-                osvregex = [
-                    r"class.*\(.*osv.*\)",
-                    r"class.*\(.*TransientModel.*\)",
-                    r"class.*\(.*Model.*\)",
-                ]
-                if any(re.match(x, line) for x in osvregex):
-
-                    _name = ""
-                    _inherit = ""
-
-                    for linenum1 in range(linenum, len(lines)):
-                        line1 = lines[linenum1]
-                        linenum1 += 1
-
-                        if re.search(r"[\\\t\ ]_name.?=", line1):
-                            _name = re.search("[\\'\\\"]([^\\'^\\\"]*)[\\'\\\"]", line1)
-                            if not _name:
-                                # print "classname not found in: %s"%lines[i]
-                                pass
-                            else:
-                                _name = _name.group(1)
-                        elif re.search(r"[\\\t\ ]_inherit.?=", line1):
-                            match = re.search("[\\'\\\"]([^\\'^\\\"]*)[\\'\\\"]", line1)
-                            if match:
-                                _inherit = match.group(1)
-                        elif any(re.match(x, line1) for x in osvregex):
-                            # reached new class so append it
-                            break
-
-                    linenum_class = linenum  # Zeilennummer der Klasse verwenden; es gibt Faelle z.B. stock.move, in denen _columns oberhalb von _name steht
-                    append_model(_name, linenum_class, _inherit, linenum_class)
-                    linenum = linenum1 - 1
-
-    walk_files(on_match, "*.py")
-
-    cache_models.setdefault("models", {})
-    for m in cache_models["models"]:
-        for l in cache_models["models"][m]:
-            result.append(
-                {
-                    "model": m,
-                    "line": l["line"],
-                    "filepath": l["file"],
-                    "filename": l["file"].name,
-                    "module": l["module"].name,
-                    "inherited": l["inherited"],
-                }
-            )
+def _parse_module_files(module_name, module_path, filepaths):
+    result = {}
+    for filepath in filepaths:
+        try:
+            result[filepath] = parse_file(module_name, module_path, filepath)
+        except OSError:
+            continue
     return result
 
 
-def _remove_entries(plain_text_file, rel_path):
+def _iter_module_files(module_path):
     """
-    Removes entries pointing to the relative path
+    Yields absolute path and stat signature of all python and xml files of
+    the module.
     """
-    match = f"{SEP_FILE}{rel_path}{SEP_LINENO}"
-    try:
-        temp = Path(tempfile.mktemp(suffix=".tmp"))
-
-        os.system(
-            (
-                f"cat '{plain_text_file}' | "
-                f"grep -v '{match}' > '{temp}'; "
-                f"cp '{temp}' '{plain_text_file}'"
-            )
-        )
-    finally:
-        if temp.exists():
-            temp.unlink()
+    module_path = str(module_path)
+    for root, dirs, files in os.walk(module_path):
+        if root == module_path:
+            # ignore migrations folder that contain OpenUpgrade
+            dirs[:] = [x for x in dirs if x not in ["migrations", "migration"]]
+        dirs[:] = [x for x in dirs if x != ".git" and not x.startswith(".")]
+        for filename in files:
+            if filename.startswith("."):
+                continue
+            if not filename.endswith((".py", ".xml")):
+                continue
+            filepath = os.path.join(root, filename)
+            try:
+                st = os.stat(filepath)
+            except OSError:
+                continue
+            yield filepath, (st.st_mtime_ns, st.st_size)
 
 
-def update_cache(arg_modified_filename=None):
+class AstIndex(object):
     """
-    param: modified_filename - if given, then only this filename is parsed;
+    SQLite store of the parsed entries.
+
+    Files are only parsed again if their mtime or size changed; the
+    entries of a file are replaced in one transaction, so several editor
+    buffers may update the store at the same time.
     """
-    from . import module_tools
-    from .module_tools import Module, Modules
 
-    if arg_modified_filename:
-        arg_modified_filename = Path(arg_modified_filename).resolve().absolute()
-    plainfile = plaintextfile()
-    if not plainfile.is_file():
-        arg_modified_filename = None
+    KEYS = {
+        "models": lambda x: x["model"],
+        "xml_ids": lambda x: x["id"],
+        "methods": lambda x: "{model}.{method}".format(**x),
+        "fields": lambda x: "{model}.{field}".format(**x),
+        "qweb": lambda x: x["id"],
+    }
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.dirty = False
+        self.conn = sqlite3.connect(str(self.path), timeout=SQLITE_TIMEOUT)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self._setup()
+
+    def _setup(self):
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version == AST_INDEX_VERSION:
+            return
+        with self.conn:
+            self.conn.execute("DROP TABLE IF EXISTS entries")
+            self.conn.execute("DROP TABLE IF EXISTS files")
+            self.conn.execute(
+                "CREATE TABLE files ("
+                "path TEXT PRIMARY KEY, module TEXT, mtime_ns INTEGER, size INTEGER"
+                ")"
+            )
+            self.conn.execute(
+                "CREATE TABLE entries ("
+                "kind TEXT, module TEXT, key TEXT, inherit_id TEXT, "
+                "filepath TEXT, position INTEGER, line INTEGER, data TEXT"
+                ")"
+            )
+            for column in ["kind, key", "inherit_id", "filepath"]:
+                name = "entries_" + column.replace(", ", "_")
+                self.conn.execute(f"CREATE INDEX {name} ON entries ({column})")
+            self.conn.execute(f"PRAGMA user_version={AST_INDEX_VERSION}")
+
+    def close(self):
+        self.conn.close()
+
+    @property
+    def is_empty(self):
+        return not self.conn.execute("SELECT 1 FROM files LIMIT 1").fetchone()
+
+    def _get_signatures(self):
+        return {
+            path: (mtime_ns, size)
+            for path, mtime_ns, size in self.conn.execute(
+                "SELECT path, mtime_ns, size FROM files"
+            )
+        }
+
+    def _delete(self, rel_paths):
+        for rel_path in rel_paths:
+            self.conn.execute("DELETE FROM entries WHERE filepath = ?", (rel_path,))
+            self.conn.execute("DELETE FROM files WHERE path = ?", (rel_path,))
+            self.dirty = True
+
+    def _store(self, parsed, signatures, root):
+        with self.conn:
+            for filepath, result in parsed.items():
+                rel_path = str(Path(filepath).relative_to(root))
+                self._delete([rel_path])
+                mtime_ns, size = signatures[filepath]
+                self.conn.execute(
+                    "INSERT INTO files (path, module, mtime_ns, size) "
+                    "VALUES (?, ?, ?, ?)",
+                    (rel_path, result["module"], mtime_ns, size),
+                )
+                rows = []
+                for kind, get_key in self.KEYS.items():
+                    for position, entry in enumerate(result[kind]):
+                        rows.append(
+                            (
+                                kind,
+                                result["module"],
+                                get_key(entry),
+                                entry.get("inherit_id") or "",
+                                rel_path,
+                                position,
+                                entry["line"],
+                                json.dumps(entry),
+                            )
+                        )
+                self.conn.executemany(
+                    "INSERT INTO entries (kind, module, key, inherit_id, "
+                    "filepath, position, line, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
 
-    if arg_modified_filename:
+    def update_file(self, filepath, root):
+        from .module_tools import Module
+
+        filepath = Path(filepath)
+        if not filepath.is_file():
+            with self.conn:
+                self._delete([str(filepath.relative_to(root))])
+            return
         try:
-            Module(arg_modified_filename)
+            module = Module(filepath)
         except Module.IsNot:
             return
+        st = filepath.stat()
+        module_path = root / module.path
+        parsed = _parse_module_files(module.name, module_path, [str(filepath)])
+        self._store(parsed, {str(filepath): (st.st_mtime_ns, st.st_size)}, root)
+
+    def update_all(self, root, modules, workers=None):
+        known = self._get_signatures()
+        seen = set()
+        todo = {}
+        signatures = {}
+        for module in modules:
+            module_path = root / module.path
+            for filepath, signature in _iter_module_files(module_path):
+                rel_path = str(Path(filepath).relative_to(root))
+                seen.add(rel_path)
+                if known.get(rel_path) == signature:
+                    continue
+                signatures[filepath] = signature
+                todo.setdefault((module.name, str(module_path)), []).append(filepath)
 
-    global cache_models
-    global modified_filename
-    modified_filename = arg_modified_filename
+        with self.conn:
+            self._delete(set(known) - seen)
 
-    try:
-        rel_path = (
-            translate_path_relative_to_customs_root(modified_filename)
-            if modified_filename
-            else None
+        if sum(len(x) for x in todo.values()) < PARALLEL_THRESHOLD:
+            for (module_name, module_path), filepaths in todo.items():
+                parsed = _parse_module_files(module_name, module_path, filepaths)
+                self._store(parsed, signatures, root)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            jobs = [
+                executor.submit(_parse_module_files, module_name, module_path, files)
+                for (module_name, module_path), files in todo.items()
+            ]
+            for job in jobs:
+                self._store(job.result(), signatures, root)
+
+    def iter_entries(self, kind, order_by_key=False):
+        order = "filepath, position"
+        if order_by_key:
+            order = "key, " + order
+        for filepath, module, data in self.conn.execute(
+            f"SELECT filepath, module, data FROM entries WHERE kind = ? ORDER BY {order}",
+            (kind,),
+        ):
+            yield filepath, module, json.loads(data)
+
+    def find(self, kind, key):
+        """
+        Returns filepath and line of the first entry with the given key.
+        """
+        return self.conn.execute(
+            "SELECT filepath, line FROM entries WHERE kind = ? AND key = ? "
+            "ORDER BY filepath, position LIMIT 1",
+            (kind, key),
+        ).fetchone()
+
+    def find_by_suffix(self, kind, suffix):
+        pattern = "%" + re.sub(r"([\\%_])", r"\\\1", suffix)
+        return self.conn.execute(
+            "SELECT filepath, line FROM entries WHERE kind = ? AND key LIKE ? "
+            "ESCAPE '\\' ORDER BY filepath, position LIMIT 1",
+            (kind, pattern),
+        ).fetchone()
+
+
+def _get_views(index):
+    """
+    Views with the type of view inherited from the parent view
+    """
+    types = {}
+    for rel_path, module, entry in index.iter_entries("xml_ids"):
+        types[entry["id"]] = entry["type"]
+
+    for rel_path, module, entry in index.iter_entries("xml_ids"):
+        if entry["model"] != "ir.ui.view":
+            continue
+        if not entry["type"] and entry["inherit_id"]:
+            entry["type"] = types.get(entry["inherit_id"], "")
+        yield rel_path, module, entry
+
+
+def _iter_plaintext_lines(index):
+    TEMPLATE = (
+        "{type}\t[{module}]\t{name}\t" + SEP_FILE + "{filepath}" + SEP_LINENO + "{line}"
+    )
+
+    def format(type, module, name, filepath, line):
+        return TEMPLATE.format(
+            type=type, module=module, name=name, filepath=filepath, line=line
         )
-    except Exception:
-        # suck errors - called from vim for all files
+
+    for filepath, module, model in index.iter_entries("models"):
+        yield format("model", module, model["model"], filepath, model["line"])
+
+    for filepath, module, xmlid in index.iter_entries("xml_ids", order_by_key=True):
+        name = xmlid["id"] + " model:" + xmlid["model"]
+        yield format("xmlid", module, name, filepath, xmlid["line"])
+
+    for filepath, module, method in index.iter_entries("methods"):
+        name = "{model}.{method}".format(**method)
+        yield format("def", module, name, filepath, method["line"])
+
+    for filepath, module, field in index.iter_entries("fields"):
+        name = "{model}.{field}".format(**field)
+        yield format("field", module, name, filepath, field["line"])
+
+    for filepath, module, view in _get_views(index):
+        name = "{res_model} ~{type} {id} [inherit_id={inherit_id}]".format(**view)
+        yield format("view", module, name, filepath, view["line"])
+
+    for filepath, module, template in index.iter_entries("qweb", order_by_key=True):
+        name = "~{type} {id} [inherit_id={inherit_id}]".format(**template)
+        yield format("qweb", module, name, filepath, template["line"])
+
+
+def export_plaintext(index, path):
+    """
+    Writes the entries in the line format of .odoo.ast (used by fzf).
+    """
+    with atomic_write(path) as tempfile:
+        tempfile.write_text("".join(x + "\n" for x in _iter_plaintext_lines(index)))
+
+
+def update_cache(arg_modified_filename=None):
+    """
+    param: modified_filename - if given, then only this filename is parsed;
+    """
+    from .module_tools import Modules
+
+    root = customs_dir().resolve().absolute()
+    plainfile = plaintextfile()
+    if not plainfile.parent.is_dir():
         return
 
-    if arg_modified_filename and plainfile.is_file():
-        _remove_entries(plainfile, rel_path)
-
-    cache_models = {}
-    qwebtemplates = _get_qweb_templates()
-    xml_ids = _get_xml_ids()
-    models = _get_models()
-    methods = _get_methods()
-    fields = _get_fields()
-    views = _get_views()
-
-    if os.path.isfile(plainfile) and arg_modified_filename:
-        f = open(plainfile, "a")
-    else:
-        if os.path.isdir(os.path.dirname(plainfile)):
-            f = open(plainfile, "w")
+    index = AstIndex(astindexfile())
+    try:
+        if arg_modified_filename and not index.is_empty:
+            filepath = Path(arg_modified_filename).resolve().absolute()
+            try:
+                filepath.relative_to(root)
+            except ValueError:
+                # suck errors - called from vim for all files
+                return
+            if filepath.suffix not in [".py", ".xml"]:
+                return
+            index.update_file(filepath, root)
         else:
-            return
+            index.update_all(root, Modules().modules.values())
 
-    try:
-        TEMPLATE = (
-            "{type}\t[{module}]\t{name}\t"
-            + SEP_FILE
-            + "{filepath}"
-            + SEP_LINENO
-            + "{line}"
-        )
-        for model in models:
-            f.write(
-                TEMPLATE.format(
-                    type="model",
-                    module=model["module"],
-                    name=model["model"],
-                    filepath=translate_path_relative_to_customs_root(model["filepath"]),
-                    line=model["line"],
-                )
-            )
-            f.write("\n")
-        for xmlid in xml_ids:
-            if "." in xmlid["id"]:
-                name = xmlid["id"]
-            else:
-                name = f"{xmlid['module']}.{xmlid['id']}"
-            name += " model:" + xmlid["model"]
-            f.write(
-                TEMPLATE.format(
-                    type="xmlid",
-                    module=xmlid["module"],
-                    name=name,
-                    filepath=translate_path_relative_to_customs_root(xmlid["filepath"]),
-                    line=xmlid["line"],
-                )
-            )
-            f.write("\n")
-        for method in methods:
-            name = "{model}.{method}".format(**method)
-            f.write(
-                TEMPLATE.format(
-                    type="def",
-                    module=method["module"],
-                    name=name,
-                    filepath=translate_path_relative_to_customs_root(
-                        method["filepath"]
-                    ),
-                    line=method["line"],
-                )
-            )
-            f.write("\n")
-        for field in fields:
-            name = "{model}.{field}".format(**field)
-            line = TEMPLATE.format(
-                type="field",
-                module=field["module"],
-                name=name,
-                filepath=translate_path_relative_to_customs_root(field["filepath"]),
-                line=field["line"],
-            )
-            f.write(line + "\n")
-        for view in views:
-            name = "{res_model} ~{type} {id} [inherit_id={inherit_id}]".format(**view)
-            f.write(
-                TEMPLATE.format(
-                    type="view",
-                    module=view["module"],
-                    name=name,
-                    filepath=translate_path_relative_to_customs_root(view["filepath"]),
-                    line=view["line"],
-                )
-            )
-            f.write("\n")
-        for qwebtemplate in qwebtemplates:
-            name = "~{type} {id} [inherit_id={inherit_id}]".format(**qwebtemplate)
-            f.write(
-                TEMPLATE.format(
-                    type="qweb",
-                    module=qwebtemplate["module"],
-                    name=name,
-                    filepath=translate_path_relative_to_customs_root(
-                        qwebtemplate["filepath"]
-                    ),
-                    line=qwebtemplate["line"],
-                )
-            )
-            f.write("\n")
+        if index.dirty or not plainfile.is_file():
+            export_plaintext(index, plainfile)
     finally:
-        f.close()
+        index.close()
 
     return plainfile
 
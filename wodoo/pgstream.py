@@ -0,0 +1,614 @@
+#!/usr/bin/env python3
+"""
+Parallel pg_dump / pg_restore into a single archive.
+
+The database is dumped in directory format with N workers; every worker
+compresses its table stream itself (gzip, or zstd/lz4 on pg_dump >= 16), so
+compression runs in parallel and nothing uncompressed touches the disk.
+The dump directory is packed into an uncompressed tar file (the members are
+already compressed); every file is removed right after it was added, so the
+disk usage does not double. Tar members are located by their headers, so
+the archive stays seekable (toc.dat is the first member).
+
+Restore extracts a table's member (still compressed) just before its data
+is loaded and removes it afterwards, so only the tables in flight need
+additional disk space. pg_restore is scheduled from the TOC of the dump
+(also usable for custom format files and dump directories):
+
+  * pre-data (schema) is restored first in one run
+  * table data is loaded by N workers, largest tables first; data of
+    tables matching the exclude patterns is skipped, the schema is kept
+  * indexes, constraints and triggers are created afterwards by
+    pg_restore -j N, which resolves their dependencies
+
+Only the standard library is used: the script is run inside the
+cronjobshell container like postgres.py:
+
+    pgstream.py backup <dbname> <host> <port> <user> <password> <filepath>
+    pgstream.py restore <dbname> <host> <port> <user> <password> <filepath>
+
+"""
+
+import os
+import re
+import sys
+import time
+import fnmatch
+import tarfile
+import argparse
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+TOC = "toc.dat"
+MARKER = "wodoo-pgstream"
+CUSTOM_MAGIC = b"PGDMP"
+# <dump id>.dat[.gz|.zst|.lz4]
+TABLE_DATA_RE = re.compile(r"^\d+\.dat")
+
+DATA = {"TABLE DATA", "SEQUENCE SET", "BLOBS", "LARGE OBJECTS"}
+POST_DATA = {
+    "INDEX",
+    "INDEX ATTACH",
+    "CONSTRAINT",
+    "FK CONSTRAINT",
+    "CHECK CONSTRAINT",
+    "TRIGGER",
+    "EVENT TRIGGER",
+    "RULE",
+    "POLICY",
+    "STATISTICS",
+    "MATERIALIZED VIEW DATA",
+    "PUBLICATION TABLE",
+    "PUBLICATION TABLES IN SCHEMA",
+}
+# descriptions with blanks; the longest match wins
+DESCS = sorted(
+    [x for x in DATA | POST_DATA if " " in x]
+    + [
+        "DEFAULT ACL",
+        "MATERIALIZED VIEW",
+        "FOREIGN TABLE",
+        "FOREIGN DATA WRAPPER",
+        "FOREIGN SERVER",
+        "USER MAPPING",
+        "PROCEDURAL LANGUAGE",
+        "OPERATOR CLASS",
+        "OPERATOR FAMILY",
+        "ACCESS METHOD",
+        "TABLE ATTACH",
+        "ROW SECURITY",
+        "LARGE OBJECT",
+        "DATABASE PROPERTIES",
+        "TEXT SEARCH CONFIGURATION",
+        "TEXT SEARCH DICTIONARY",
+        "TEXT SEARCH PARSER",
+        "TEXT SEARCH TEMPLATE",
+    ],
+    key=len,
+    reverse=True,
+)
+
+
+def _env(password):
+    env = dict(os.environ)
+    env["PGPASSWORD"] = password
+    return env
+
+
+def _connection_args(host, port, user):
+    return ["-h", host, "-p", str(port), "-U", user]
+
+
+def _format_size(size):
+    for unit in ["B", "KB", "MB", "GB", "TB"]:
+        if abs(size) < 1024 or unit == "TB":
+            return f"{size:.1f} {unit}"
+        size /= 1024.0
+
+
+def is_restorable(filepath):
+    """
+    True for custom format dumps and dump directories, which can be
+    restored by scheduled_restore.
+    """
+    filepath = Path(filepath)
+    if filepath.is_dir():
+        return (filepath / TOC).exists()
+    if not filepath.is_file():
+        return False
+    with open(filepath, "rb") as file:
+        return file.read(len(CUSTOM_MAGIC)) == CUSTOM_MAGIC
+
+
+def is_archive(filepath):
+    """
+    True if the file is an archive written by backup().
+    """
+    filepath = Path(filepath)
+    if not filepath.is_file() or not tarfile.is_tarfile(str(filepath)):
+        return False
+    with tarfile.open(str(filepath), "r:") as tar:
+        member = tar.next()
+        return bool(member and member.name == f"{MARKER}/{TOC}")
+
+
+class Progress(object):
+    """
+    Reports per table size and throughput from the verbose output of
+    pg_dump. Only parallel pg_dump reports finished tables; otherwise a
+    table is finished when the next one starts or pg_dump exits, and its
+    size is the size of the new data files.
+    """
+
+    started_re = re.compile(r'dumping contents of table "(?P<table>[^"]+)"')
+    finished_re = re.compile(r"finished item (?P<id>\d+) TABLE DATA (?P<table>\S+)")
+
+    def __init__(self, directory, parallel=True, out=sys.stdout):
+        self.directory = Path(directory)
+        self.parallel = parallel
+        self.out = out
+        self.started = {}
+        self.current = None
+        self.seen = set()
+        self.count = 0
+        self.total = 0
+
+    def _get_size(self, dump_id):
+        for file in self.directory.glob(f"{dump_id}.dat*"):
+            return file.stat().st_size
+        return 0
+
+    def _finish_current(self):
+        if not self.current:
+            return
+        table, started = self.current
+        self.current = None
+        files = set(
+            x for x in self.directory.glob("*.dat*") if TABLE_DATA_RE.match(x.name)
+        )
+        files -= self.seen
+        self.seen |= files
+        self._report(table, sum(x.stat().st_size for x in files), started)
+
+    def feed(self, line):
+        match = self.started_re.search(line)
+        if match:
+            table = match.group("table").split(".")[-1]
+            if self.parallel:
+                self.started[table] = time.time()
+            else:
+                self._finish_current()
+                self.current = table, time.time()
+            return
+        match = self.finished_re.search(line)
+        if not match:
+            return
+        table = match.group("table")
+        started = self.started.pop(table, None)
+        self._report(table, self._get_size(match.group("id")), started)
+
+    def close(self):
+        self._finish_current()
+
+    def _report(self, table, size, started):
+        self.count += 1
+        self.total += size
+        elapsed = time.time() - started if started else 0
+        speed = f"{_format_size(size / elapsed)}/s" if elapsed else "-"
+        self.out.write(
+            f"[{self.count:>5}] {table:<50} {_format_size(size):>10} "
+            f"{elapsed:8.1f}s {speed:>12}\n"
+        )
+        self.out.flush()
+
+
+def _dump(
+    dbname,
+    host,
+    port,
+    user,
+    password,
+    directory,
+    workers,
+    compression,
+    compress_method,
+    excludes,
+):
+    cmd = ["pg_dump", "-Fd", "-v", "-j", str(workers), "-f", str(directory)]
+    cmd += _connection_args(host, port, user)
+    if compress_method == "gzip":
+        cmd += ["-Z", str(compression)]
+    else:
+        cmd += [f"--compress={compress_method}:{compression}"]
+    for exclude in excludes:
+        cmd += ["-T", exclude]
+    cmd += [dbname]
+
+    progress = Progress(directory, parallel=workers > 1)
+    proc = subprocess.Popen(
+        cmd,
+        env=_env(password),
+        stderr=subprocess.PIPE,
+        encoding="utf8",
+        errors="replace",
+    )
+    errors = []
+    for line in proc.stderr:
+        progress.feed(line)
+        if "error" in line.lower():
+            errors.append(line)
+    progress.close()
+    if proc.wait():
+        sys.stderr.write("".join(errors))
+        raise Exception(f"pg_dump failed with exit code {proc.returncode}")
+    return progress
+
+
+def _pack(directory, filepath):
+    """
+    Moves the files of the dump directory into the tar file.
+    """
+    directory = Path(directory)
+    files = [directory / TOC] + sorted(x for x in directory.iterdir() if x.name != TOC)
+    with tarfile.open(str(filepath), "w:", format=tarfile.PAX_FORMAT) as tar:
+        for file in files:
+            tar.add(str(file), arcname=f"{MARKER}/{file.name}")
+            file.unlink()
+
+
+def backup(
+    dbname,
+    host,
+    port,
+    user,
+    password,
+    filepath,
+    workers=4,
+    compression=5,
+    compress_method="gzip",
+    excludes=(),
+):
+    filepath = Path(filepath)
+    started = time.time()
+    tmpfile = filepath.parent / f".{filepath.name}.tmp"
+    with tempfile.TemporaryDirectory(dir=str(filepath.parent)) as tmpdir:
+        directory = Path(tmpdir) / "dump"
+        progress = _dump(
+            dbname,
+            host,
+            port,
+            user,
+            password,
+            directory,
+            workers,
+            compression,
+            compress_method,
+            excludes,
+        )
+        _pack(directory, tmpfile)
+    tmpfile.rename(filepath)
+    elapsed = time.time() - started
+    size = filepath.stat().st_size
+    print(
+        f"Dumped {progress.count} tables into {filepath}: {_format_size(size)} "
+        f"in {elapsed:.1f}s ({_format_size(size / (elapsed or 1))}/s)"
+    )
+
+
+class Archive(object):
+    """
+    Extracts the members of an archive written by backup() into directory:
+    the TOC and everything except table data at once, the data files of a
+    table on demand.
+    """
+
+    def __init__(self, filepath, directory):
+        self.filepath = Path(filepath)
+        self.directory = Path(directory)
+        # name: (offset, size); the archive is not compressed
+        self.members = {}
+        with tarfile.open(str(filepath), "r:") as tar:
+            for member in tar:
+                if member.isfile() and member.name.startswith(f"{MARKER}/"):
+                    name = Path(member.name).name
+                    self.members[name] = member.offset_data, member.size
+        for name in self.members:
+            if not TABLE_DATA_RE.match(name):
+                self._extract(name)
+
+    def _extract(self, name):
+        offset, size = self.members[name]
+        with open(self.filepath, "rb") as source:
+            source.seek(offset)
+            with open(self.directory / name, "wb") as dest:
+                while size:
+                    chunk = source.read(min(size, 1024 * 1024))
+                    if not chunk:
+                        raise Exception(f"{self.filepath} is truncated at {name}")
+                    dest.write(chunk)
+                    size -= len(chunk)
+
+    def data_files(self, entry):
+        name = f"{entry.dump_id}.dat"
+        return [x for x in self.members if x == name or x.startswith(f"{name}.")]
+
+    def size(self, entry):
+        return sum(self.members[x][1] for x in self.data_files(entry))
+
+    @contextmanager
+    def table_data(self, entry):
+        names = self.data_files(entry)
+        try:
+            for name in names:
+                self._extract(name)
+            yield
+        finally:
+            for name in names:
+                if (self.directory / name).exists():
+                    (self.directory / name).unlink()
+
+
+class TocEntry(object):
+    line_re = re.compile(r"^(?P<id>\d+); \d+ \d+ (?P<rest>.*)$")
+
+    def __init__(self, line, dump_id, desc, namespace, tag):
+        self.line = line
+        self.dump_id = dump_id
+        self.desc = desc
+        self.namespace = namespace
+        self.tag = tag
+        self.size = 0
+
+    @classmethod
+    def parse(cls, line):
+        match = cls.line_re.match(line)
+        if not match:
+            return None
+        rest = match.group("rest")
+        for desc in DESCS:
+            if rest.startswith(desc + " "):
+                break
+        else:
+            desc = rest.split(" ")[0]
+        # namespace, tag (may contain blanks), owner
+        fields = rest[len(desc) + 1 :].split(" ")
+        return cls(
+            line, int(match.group("id")), desc, fields[0], " ".join(fields[1:-1])
+        )
+
+    @property
+    def section(self):
+        if self.desc in DATA:
+            return "data"
+        if self.desc in POST_DATA:
+            return "post-data"
+        if self.desc in ("COMMENT", "ACL", "SECURITY LABEL"):
+            # comments on indexes, constraints, ... need their object
+            if self.tag.split(" ")[0] in POST_DATA:
+                return "post-data"
+        return "pre-data"
+
+    def matches(self, patterns):
+        names = [self.tag, f"{self.namespace}.{self.tag}"]
+        return any(fnmatch.fnmatchcase(name, x) for x in patterns for name in names)
+
+
+def read_toc(path):
+    """
+    Returns the entries of the TOC of a custom format file or dump
+    directory; for directories the size of the data files is set.
+    """
+    listing = subprocess.check_output(["pg_restore", "-l", str(path)], encoding="utf8")
+    entries = list(filter(bool, map(TocEntry.parse, listing.splitlines())))
+    path = Path(path)
+    if path.is_dir():
+        for entry in entries:
+            if entry.section == "data":
+                for file in path.glob(f"{entry.dump_id}.dat*"):
+                    entry.size = file.stat().st_size
+    return entries
+
+
+def plan_restore(entries, include_tables=(), exclude_tables=()):
+    """
+    Splits the entries into pre-data, table data (largest first), other
+    data and post-data. Patterns are matched against the table names.
+    """
+    pre, tables, other, post = [], [], [], []
+    for entry in entries:
+        if entry.section == "pre-data":
+            pre.append(entry)
+        elif entry.section == "post-data":
+            post.append(entry)
+        elif entry.desc != "TABLE DATA":
+            other.append(entry)
+        elif include_tables and not entry.matches(include_tables):
+            continue
+        elif entry.matches(exclude_tables):
+            continue
+        else:
+            tables.append(entry)
+    # without sizes (custom format) the order of the dump is kept
+    tables = sorted(tables, key=lambda x: x.size, reverse=True)
+    return pre, tables, other, post
+
+
+class RestoreProgress(object):
+    def __init__(self, tables, out=sys.stdout):
+        self.total = sum(x.size for x in tables)
+        self.count = len(tables)
+        self.done = 0
+        self.done_size = 0
+        self.started = time.time()
+        self.out = out
+        self.lock = threading.Lock()
+
+    def finished(self, entry, elapsed):
+        with self.lock:
+            self.done += 1
+            self.done_size += entry.size
+            total_elapsed = time.time() - self.started
+            if self.total:
+                progress = self.done_size / self.total
+            else:
+                progress = self.done / self.count
+            eta = total_elapsed / progress - total_elapsed if progress else 0
+            self.out.write(
+                f"[{self.done:>5}/{self.count}] {entry.tag:<50} "
+                f"{_format_size(entry.size):>10} {elapsed:8.1f}s "
+                f"ETA {eta / 60:6.1f}min\n"
+            )
+            self.out.flush()
+
+
+def scheduled_restore(
+    path,
+    base_cmd,
+    env,
+    workers=4,
+    include_tables=(),
+    exclude_tables=(),
+    ignore_errors=False,
+    archive=None,
+):
+    """
+    Restores a custom format file or dump directory; base_cmd is pg_restore
+    with connection options. With an Archive extracted into path, the table
+    data is extracted by the workers.
+    """
+    entries = read_toc(path)
+    if archive:
+        for entry in entries:
+            if entry.desc == "TABLE DATA":
+                entry.size = archive.size(entry)
+    pre, tables, other, post = plan_restore(entries, include_tables, exclude_tables)
+    if not ignore_errors:
+        base_cmd = base_cmd + ["--exit-on-error"]
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+
+        def run(name, entries, extra=()):
+            if not entries:
+                return
+            listfile = Path(tmpdir) / f"{name}.list"
+            listfile.write_text("".join(x.line + "\n" for x in entries))
+            cmd = base_cmd + list(extra) + ["-L", str(listfile), str(path)]
+            subprocess.check_call(cmd, env=env)
+
+        started = time.time()
+        run("pre-data", pre)
+        print(f"Restored schema in {time.time() - started:.1f}s")
+
+        progress = RestoreProgress(tables)
+
+        def load(entry):
+            started = time.time()
+            if archive:
+                with archive.table_data(entry):
+                    run(str(entry.dump_id), [entry])
+            else:
+                run(str(entry.dump_id), [entry])
+            progress.finished(entry, time.time() - started)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(load, tables))
+        run("data", other)
+        print(f"Restored data in {time.time() - progress.started:.1f}s")
+
+        started = time.time()
+        run("post-data", post, ["-j", str(workers)])
+        print(f"Created indexes and constraints in {time.time() - started:.1f}s")
+
+
+def restore(
+    dbname,
+    host,
+    port,
+    user,
+    password,
+    filepath,
+    workers=4,
+    include_tables=(),
+    exclude_tables=(),
+    ignore_errors=False,
+    verbose=False,
+):
+    """
+    Restores a pgstream archive, custom format file or dump directory.
+    """
+    filepath = Path(filepath)
+    started = time.time()
+    cmd = ["pg_restore", "--no-owner"]
+    cmd += _connection_args(host, port, user)
+    cmd += ["-d", dbname]
+    if verbose:
+        cmd += ["-v"]
+    params = dict(
+        workers=workers,
+        include_tables=include_tables,
+        exclude_tables=exclude_tables,
+        ignore_errors=ignore_errors,
+    )
+    if is_archive(filepath):
+        with tempfile.TemporaryDirectory(dir=str(filepath.parent)) as tmpdir:
+            archive = Archive(filepath, tmpdir)
+            scheduled_restore(tmpdir, cmd, _env(password), archive=archive, **params)
+    else:
+        scheduled_restore(filepath, cmd, _env(password), **params)
+    print(f"Restored {filepath} in {time.time() - started:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["backup", "restore"])
+    parser.add_argument("dbname")
+    parser.add_argument("host")
+    parser.add_argument("port")
+    parser.add_argument("user")
+    parser.add_argument("password")
+    parser.add_argument("filepath")
+    parser.add_argument("-j", "--workers", type=int, default=4)
+    parser.add_argument("-Z", "--compression", type=int, default=5)
+    parser.add_argument(
+        "--compress-method", choices=["gzip", "zstd", "lz4"], default="gzip"
+    )
+    parser.add_argument("--exclude", action="append", default=[])
+    parser.add_argument("--include-tables", default="")
+    parser.add_argument("--exclude-tables", default="")
+    parser.add_argument("--ignore-errors", action="store_true")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    connection = (
+        args.dbname,
+        args.host,
+        args.port,
+        args.user,
+        args.password,
+        args.filepath,
+    )
+    if args.command == "backup":
+        backup(
+            *connection,
+            workers=args.workers,
+            compression=args.compression,
+            compress_method=args.compress_method,
+            excludes=args.exclude,
+        )
+    else:
+        restore(
+            *connection,
+            workers=args.workers,
+            include_tables=list(filter(bool, args.include_tables.split(","))),
+            exclude_tables=list(filter(bool, args.exclude_tables.split(","))),
+            ignore_errors=args.ignore_errors,
+            verbose=args.verbose,
+        )
+
+
+if __name__ == "__main__":
+    main()
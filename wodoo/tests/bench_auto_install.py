@@ -0,0 +1,82 @@
+"""
+Compares the former fixpoint loop for auto install modules with the
+worklist resolver of the dependency graph on a synthetic module graph.
+
+    python -m wodoo.tests.bench_auto_install [count]
+
+"""
+import gc
+import sys
+import time
+import random
+from ..dependency_graph import DependencyGraph
+
+
+def make_graph(count, seed=42):
+    rnd = random.Random(seed)
+    depends = {"base": []}
+    auto_install = []
+    for i in range(1, count):
+        name = f"module_{i}"
+        candidates = list(depends)
+        deps = rnd.sample(candidates[-200:], min(len(candidates[-200:]), 3))
+        depends[name] = deps or ["base"]
+        if rnd.random() < 0.2:
+            auto_install.append(name)
+    install = [x for i, x in enumerate(depends) if not i % 10]
+    return depends, auto_install, install
+
+
+def legacy_fixpoint(depends, auto_install, install):
+    def tree(name, cache={}):
+        if name not in cache:
+            result = set()
+            for dep in depends[name]:
+                result.add(dep)
+                result |= tree(dep)
+            cache[name] = result
+        return cache[name]
+
+    all_modules = set()
+    for name in install:
+        all_modules.add(name)
+        all_modules |= tree(name)
+
+    while True:
+        len_modules = len(all_modules)
+        for auto in sorted(auto_install):
+            for dep in sorted(tree(auto)):
+                if dep not in all_modules:
+                    break
+            else:
+                all_modules.add(auto)
+        if len_modules == len(all_modules):
+            break
+    return all_modules
+
+
+def worklist(depends, auto_install, install):
+    graph = DependencyGraph(lambda name: (name, depends[name]))
+    all_modules = graph.union(install)
+    candidates = [(graph.id(x), graph.closure(x)) for x in auto_install]
+    all_modules = graph.resolve_triggers(all_modules, candidates)
+    return set(graph.get_names(all_modules))
+
+
+def main(count=5000):
+    depends, auto_install, install = make_graph(count)
+    results = {}
+    for method in [legacy_fixpoint, worklist]:
+        gc.collect()
+        started = time.perf_counter()
+        results[method.__name__] = method(depends, auto_install, install)
+        elapsed = time.perf_counter() - started
+        print(
+            f"{method.__name__:>16}: {elapsed:.3f}s "
+            f"({len(results[method.__name__])} modules)"
+        )
+    assert results["legacy_fixpoint"] == results["worklist"]
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
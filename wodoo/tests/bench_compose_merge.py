@@ -0,0 +1,161 @@
+"""
+Compares the in process compose merge with "docker-compose config" on a
+small corpus of compose files like the wodoo images use (env_file parsing,
+$ escaping, merging); prints the duration of both.
+
+The output of docker-compose for the corpus is recorded in
+compose_merge_expected.yml and always compared; with docker-compose
+installed it is compared with the live output, too. Record it again after
+changing the corpus:
+
+    python -m wodoo.tests.bench_compose_merge [repetitions] [record]
+
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+import yaml
+from pathlib import Path
+from ..compose_merge import merge
+
+EXPECTED = Path(__file__).parent / "compose_merge_expected.yml"
+SETTINGS = (
+    "# comment\n"
+    "DBNAME=odoo\n"
+    "\n"
+    "RUN_POSTGRES=1\n"
+    "ODOO_PORT=8069\n"
+    "PASSWORD='a$b'\n"
+    'QUOTED="x y"\n'
+    "WITH_EQ=a=b\n"
+    "SPACED = v\n"
+    "FROM_SHELL\n"
+    "export EXPORTED=1\n"
+)
+
+
+def make_corpus(root):
+    settings = root / "settings"
+    settings.write_text(SETTINGS)
+    return [
+        {
+            "version": "3.7",
+            "services": {
+                "odoo": {
+                    "image": "odoo:${ODOO_VERSION:-16.0}",
+                    "env_file": [str(settings)],
+                    "environment": ["ODOO_PORT=8069", "EMPTY"],
+                    "labels": ["compose.merge=odoo_base"],
+                    "volumes": ["/tmp/odoo:/opt/odoo", "/tmp/files:/opt/files"],
+                    "depends_on": ["postgres"],
+                    "ports": ["8069"],
+                },
+                "postgres": {
+                    "image": "postgres:15",
+                    "environment": {"POSTGRES_USER": "odoo", "PGPORT": 5432},
+                },
+            },
+            "networks": {"default": {"name": "${NETWORK_NAME}"}},
+        },
+        {
+            "version": "3.7",
+            "services": {
+                "odoo": {
+                    "environment": {"ODOO_PORT": "8070", "LITERAL": "$$HOME"},
+                    "labels": {"odoo_framework.apply_env": "1"},
+                    "volumes": ["/tmp/other:/opt/files:ro"],
+                    "ports": ["8072"],
+                    "command": ["odoo", "--dev=all"],
+                },
+                "cronjobs": {
+                    "image": "cronjobs:${CRON_TAG-latest}",
+                    "env_file": str(settings),
+                    "depends_on": {"postgres": {"condition": "service_started"}},
+                },
+            },
+            "networks": {"default": {"name": "${NETWORK_NAME}"}},
+        },
+    ]
+
+
+def project(config):
+    """
+    The parts of a service, which do not depend on the output format or the
+    version of docker-compose (1.x keeps numbers in environment).
+    """
+    result = {}
+    for name, service in config["services"].items():
+        volumes = [
+            x["target"] if isinstance(x, dict) else x.split(":")[1]
+            for x in service.get("volumes", [])
+        ]
+        depends_on = service.get("depends_on") or []
+        result[name] = {
+            "image": service.get("image"),
+            "command": service.get("command"),
+            "environment": {
+                k: v if v is None else str(v)
+                for k, v in (service.get("environment") or {}).items()
+            },
+            "labels": service.get("labels") or {},
+            "volumes": sorted(volumes),
+            "depends_on": sorted(depends_on),
+        }
+    return result
+
+
+def run_docker_compose(docker_compose, root, contents, env):
+    files = []
+    for i, content in enumerate(contents):
+        path = root / f"docker-compose-{i}.yml"
+        path.write_text(yaml.dump(content, default_flow_style=False))
+        files += ["-f", str(path)]
+    output = subprocess.check_output(
+        [docker_compose] + files + ["config"], cwd=root, env=env
+    )
+    return yaml.safe_load(output)
+
+
+def compare(merged, expected, name):
+    assert project(merged) == project(expected), (
+        project(merged),
+        project(expected),
+    )
+    print(f"Output matches {name}")
+
+
+def main(repetitions=20, record=0):
+    env = dict(
+        os.environ, NETWORK_NAME="bench", EMPTY="from shell", FROM_SHELL="shell"
+    )
+    docker_compose = shutil.which("docker-compose")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        contents = make_corpus(root)
+
+        started = time.perf_counter()
+        for i in range(repetitions):
+            merged = merge(contents, env)
+        elapsed = (time.perf_counter() - started) / repetitions
+        print(f"{'merge':>15}: {elapsed * 1000:.2f} ms")
+        if not record:
+            compare(merged, yaml.safe_load(EXPECTED.read_text()), EXPECTED.name)
+
+        if not docker_compose:
+            print("docker-compose not found - not compared with live output")
+            return
+        started = time.perf_counter()
+        expected = run_docker_compose(docker_compose, root, contents, env)
+        elapsed = time.perf_counter() - started
+        print(f"{'docker-compose':>15}: {elapsed * 1000:.2f} ms")
+        if record:
+            EXPECTED.write_text(yaml.dump(expected, default_flow_style=False))
+            print(f"Recorded {EXPECTED}")
+        compare(merged, expected, "docker-compose")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
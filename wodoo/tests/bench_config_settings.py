@@ -0,0 +1,75 @@
+"""
+Compares reading config.<NAME> by parsing the settings file on every
+access (like it was done before) with the cached settings snapshot.
+
+    python -m wodoo.tests.bench_config_settings [keys] [accesses]
+
+"""
+import gc
+import sys
+import time
+import tempfile
+from pathlib import Path
+from ..myconfigparser import MyConfigParser
+from ..myconfigparser import CachedSettings
+
+
+def legacy_get_value(path, name):
+    myconfig = MyConfigParser(path)
+
+    convert = None
+    if name.endswith("_as_int"):
+        convert = "asint"
+        name = name[: -len("_as_int")]
+
+    for tries in [name, name.lower(), name.upper()]:
+        value = ""
+        if tries not in myconfig.keys():
+            continue
+
+        value = myconfig.get(tries, "")
+        break
+
+    if convert == "asint":
+        value = int(value or "0")
+
+    if value == "1":
+        value = True
+    elif value == "0":
+        value = False
+    return value
+
+
+def make_settings(path, count):
+    lines = [f"SETTING_{i}={i % 3}" for i in range(count)]
+    lines += ["DBNAME=odoo", "RUN_POSTGRES=1", "DEVMODE=0", "ODOO_PORT=8069"]
+    path.write_text("\n".join(lines) + "\n")
+
+
+def main(keys=300, accesses=2000):
+    names = ["DBNAME", "run_postgres", "devmode", "ODOO_PORT_as_int", "MISSING"]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "settings"
+        make_settings(path, keys)
+        settings = CachedSettings(path)
+
+        results = {}
+        for method, get_value in [
+            ("legacy", lambda name: legacy_get_value(path, name)),
+            ("cached", settings.get_value),
+        ]:
+            gc.collect()
+            started = time.perf_counter()
+            for i in range(accesses):
+                results[method] = [get_value(name) for name in names]
+            elapsed = time.perf_counter() - started
+            count = accesses * len(names)
+            print(
+                f"{method:>8}: {elapsed:.3f}s "
+                f"({elapsed / count * 1e6:.2f} us per attribute)"
+            )
+        assert results["legacy"] == results["cached"]
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
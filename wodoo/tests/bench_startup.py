@@ -0,0 +1,76 @@
+"""
+Measures the startup of the odoo command: "python -X importtime" of the
+package, "odoo --help" and importing all command modules like it was done
+before the commands were loaded lazily. Also checks that the command
+registry is up to date.
+
+    python -m wodoo.tests.bench_startup [runs] [top]
+
+"""
+import sys
+import time
+import subprocess
+from .. import command_registry
+
+IMPORT_ALL = (
+    "import wodoo, importlib\n"
+    "for module in {!r}:\n"
+    "    importlib.import_module('wodoo.' + module)\n"
+)
+
+
+def importtime(code="import wodoo"):
+    """
+    Returns (cumulative microseconds, module) of all imports.
+    """
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        stderr=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+        encoding="utf8",
+        check=True,
+    ).stderr
+    result = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative, module = line[len("import time:") :].split("|")
+        result.append((int(cumulative), module.rstrip()))
+    return result
+
+
+def duration(code, runs):
+    durations = []
+    for i in range(runs):
+        started = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", code], stdout=subprocess.DEVNULL, check=True
+        )
+        durations.append(time.perf_counter() - started)
+    return min(durations)
+
+
+def main(runs=5, top=15):
+    imports = importtime()
+    print(f"import wodoo: {max(imports)[0] / 1000:.1f} ms; slowest imports:")
+    for cumulative, module in sorted(imports, reverse=True)[:top]:
+        print(f"  {cumulative / 1000:8.1f} ms {module}")
+
+    for name, code in [
+        ("python", "pass"),
+        ("odoo --help", "from wodoo import cli; cli(['--help'])"),
+        ("all modules", IMPORT_ALL.format(command_registry.MODULES)),
+    ]:
+        print(f"{name:>12}: {duration(code, runs) * 1000:.0f} ms")
+
+    commands, subcommands = command_registry.collect()
+    if (commands, subcommands) != (
+        command_registry.COMMANDS,
+        command_registry.SUBCOMMANDS,
+    ):
+        print("Command registry is outdated: python -m wodoo.command_registry")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,55 @@
+import os
+import yaml
+import pytest
+from ..compose_merge import merge, ComposeError, UnsupportedCompose
+from .bench_compose_merge import make_corpus, project, EXPECTED
+
+
+def _env():
+    return dict(
+        os.environ, NETWORK_NAME="bench", EMPTY="from shell", FROM_SHELL="shell"
+    )
+
+
+def _service(**values):
+    return [{"version": "3.7", "services": {"odoo": dict(image="odoo", **values)}}]
+
+
+class TestComposeMerge:
+    def test_recorded_output(self, tmp_path):
+        merged = merge(make_corpus(tmp_path), _env())
+        expected = yaml.safe_load(EXPECTED.read_text())
+        assert project(merged) == project(expected)
+
+    @pytest.mark.parametrize(
+        "contents",
+        [
+            _service(environment="A=1"),
+            _service(labels=[{"a": 1}]),
+            _service(ports={"8069": "8069"}),
+            _service(volumes=["./data:/data"]),
+            _service(volumes=["~/data:/data"]),
+            _service(volumes=[{"type": "bind", "source": "/tmp"}]),
+            _service(volumes=[{"source": "./data", "target": "/data"}]),
+            _service(volumes=[1]),
+            _service(build=["/tmp"]),
+            _service(build="relative"),
+            _service(env_file="relative.env"),
+            _service(extends={"service": "base"}),
+            _service(unknown_key=1),
+            [{"version": "3.7", "configs": {}}],
+            [{"version": "3.7", "services": {}, "networks": {"default": "x"}}],
+            [{"version": "3.7", "services": {}, "volumes": {"data": "x"}}],
+        ],
+    )
+    def test_unsupported(self, contents):
+        with pytest.raises(UnsupportedCompose):
+            merge(contents, _env())
+
+    def test_errors(self):
+        with pytest.raises(ComposeError):
+            merge([{"services": {"odoo": {}}}], _env())
+        with pytest.raises(ComposeError):
+            merge(_service(depends_on=["postgres"]), _env())
+        with pytest.raises(ComposeError):
+            merge(_service(env_file="/nonexisting/settings"), _env())
@@ -0,0 +1,54 @@
+import pytest
+from ..dependency_graph import DependencyGraph, CyclicDependency
+from .bench_auto_install import make_graph
+
+
+def legacy_tree(depends, name, cache):
+    # the recursive walk, which the dependency graph replaced
+    if name not in cache:
+        result = set()
+        for dep in depends[name]:
+            result.add(dep)
+            result |= legacy_tree(depends, dep, cache)
+        cache[name] = result
+    return cache[name]
+
+
+def legacy_auto_install(depends, auto_install, install):
+    cache = {}
+    all_modules = set(install)
+    for name in install:
+        all_modules |= legacy_tree(depends, name, cache)
+    while True:
+        count = len(all_modules)
+        for auto in sorted(auto_install):
+            if legacy_tree(depends, auto, cache) <= all_modules:
+                all_modules.add(auto)
+        if count == len(all_modules):
+            return all_modules
+
+
+class TestDependencyGraph:
+    def test_closure(self):
+        depends, auto_install, install = make_graph(500)
+        graph = DependencyGraph(lambda name: (name, depends[name]))
+        cache = {}
+        for name in depends:
+            names = set(graph.get_names(graph.closure(name)))
+            assert names == legacy_tree(depends, name, cache)
+
+    def test_auto_install(self):
+        depends, auto_install, install = make_graph(500)
+        graph = DependencyGraph(lambda name: (name, depends[name]))
+        installed = graph.union(install)
+        candidates = [(graph.id(x), graph.closure(x)) for x in auto_install]
+        installed = graph.resolve_triggers(installed, candidates)
+        assert set(graph.get_names(installed)) == legacy_auto_install(
+            depends, auto_install, install
+        )
+
+    def test_cycle(self):
+        depends = {"a": ["b"], "b": ["c"], "c": ["a"]}
+        graph = DependencyGraph(lambda name: (name, depends[name]))
+        with pytest.raises(CyclicDependency):
+            graph.closure("a")
@@ -0,0 +1,80 @@
+import os
+import hashlib
+from ..filestore_backup import FilestoreBackupStore
+
+
+def _add_file(filestore, data):
+    sha1 = hashlib.sha1(data).hexdigest()
+    path = filestore / sha1[:2] / sha1
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+
+def _read_folder(path):
+    return {
+        str(x.relative_to(path)): x.read_bytes()
+        for x in sorted(path.rglob("*"))
+        if x.is_file()
+    }
+
+
+class TestFilestoreBackup:
+    def test_round_trip(self, tmp_path):
+        filestore = tmp_path / "filestore"
+        store = FilestoreBackupStore(tmp_path / "store")
+        first = _add_file(filestore, b"first")
+        (filestore / "checklist").mkdir()
+        (filestore / "checklist" / "other.txt").write_bytes(b"not odoo named")
+
+        manifest1, count, size = store.backup(filestore, "test")
+        assert count == 2
+        state1 = _read_folder(filestore)
+
+        # only the new file is copied; backups of the same second get
+        # their own manifest
+        first.unlink()
+        _add_file(filestore, b"second")
+        manifest2, count, size = store.backup(filestore, "test")
+        assert count == 1 and size == len(b"second")
+        assert manifest2 != manifest1
+        assert store.latest_manifest() == manifest2
+
+        dest = tmp_path / "restored"
+        assert store.restore(manifest1, dest) == (2, 0)
+        assert _read_folder(dest) == state1
+        assert store.restore(manifest2, dest, delete=True) == (1, 1)
+        assert _read_folder(dest) == _read_folder(filestore)
+
+        # same size, other content: kept without, rewritten with verify
+        other = dest / "checklist" / "other.txt"
+        other.write_bytes(b"NOT ODOO NAMED")
+        assert store.restore(manifest2, dest) == (0, 0)
+        assert store.restore(manifest2, dest, verify=True) == (1, 0)
+        assert other.read_bytes() == b"not odoo named"
+
+    def test_prune(self, tmp_path):
+        filestore = tmp_path / "filestore"
+        store = FilestoreBackupStore(tmp_path / "store")
+        first = _add_file(filestore, b"first")
+        manifest1 = store.backup(filestore, "test")[0]
+        first.unlink()
+        _add_file(filestore, b"second")
+        manifest2 = store.backup(filestore, "test")[0]
+        # left over by an interrupted backup
+        tempfile = store.blobs_dir / "ab" / ".abc.tmp"
+        tempfile.parent.mkdir(exist_ok=True)
+        tempfile.write_bytes(b"partial")
+
+        assert store.prune([manifest1], dry_run=True) == (2, 12)
+        assert manifest1.exists() and tempfile.exists()
+        assert store.prune([manifest1]) == (2, 12)
+        assert store.manifests() == [manifest2]
+        assert not tempfile.exists()
+        assert sorted(store._list_blobs()) == [
+            hashlib.sha1(b"second").hexdigest()
+        ]
+
+        dest = tmp_path / "restored"
+        store.restore(manifest2, dest, owner=os.getuid())
+        assert _read_folder(dest) == _read_folder(filestore)
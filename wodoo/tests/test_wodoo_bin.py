@@ -0,0 +1,73 @@
+import io
+import gzip
+import tarfile
+import pytest
+from .. import wodoo_bin
+
+
+def _make_folder(path):
+    path.mkdir()
+    (path / "PG_VERSION").write_text("15\n")
+    (path / "base").mkdir()
+    (path / "base" / "1").write_bytes(bytes(range(256)) * 4000)
+    return path
+
+
+def _read_folder(path):
+    return {
+        str(x.relative_to(path)): x.read_bytes()
+        for x in sorted(path.rglob("*"))
+        if x.is_file()
+    }
+
+
+class TestWodooBin:
+    def test_round_trip(self, tmp_path, monkeypatch):
+        # several chunks
+        monkeypatch.setattr(wodoo_bin, "CHUNK_SIZE", 64 * 1024)
+        folder = _make_folder(tmp_path / "data")
+        filepath = tmp_path / "dump.wodoo_bin"
+        wodoo_bin.write(folder, filepath, "15.2", workers=2)
+
+        assert wodoo_bin.is_wodoo_bin(filepath)
+        index = wodoo_bin.read_header(filepath)
+        assert index["format_version"] == 2
+        assert index["postgres_version"] == "15.2"
+        assert len(index["chunks"]) > 1
+
+        dest = tmp_path / "restored"
+        wodoo_bin.extract(filepath, dest, workers=2, verify=True)
+        assert _read_folder(dest) == _read_folder(folder)
+
+    def test_corrupt_chunk(self, tmp_path):
+        folder = _make_folder(tmp_path / "data")
+        filepath = tmp_path / "dump.wodoo_bin"
+        wodoo_bin.write(folder, filepath, "15.2")
+        offset, length = wodoo_bin.read_header(filepath)["chunks"][0][:2]
+        data = bytearray(filepath.read_bytes())
+        data[offset + length - 5] ^= 0xFF
+        filepath.write_bytes(bytes(data))
+        with pytest.raises(Exception):
+            wodoo_bin.extract(filepath, tmp_path / "restored", verify=True)
+
+    def test_version_1(self, tmp_path):
+        folder = _make_folder(tmp_path / "data")
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w") as tar:
+            tar.add(str(folder), arcname=".")
+        data = buffer.getvalue()
+        filepath = tmp_path / "dump.wodoo_bin"
+        # concatenated gzip members like pigz writes them
+        filepath.write_bytes(
+            wodoo_bin.MAGIC
+            + b"14.5\n"
+            + gzip.compress(data[:1000])
+            + gzip.compress(data[1000:])
+        )
+
+        index = wodoo_bin.read_header(filepath)
+        assert index["format_version"] == 1
+        assert index["postgres_version"] == "14.5"
+        dest = tmp_path / "restored"
+        wodoo_bin.extract(filepath, dest)
+        assert _read_folder(dest) == _read_folder(folder)
@@ -2,12 +2,9 @@ import uuid
 import time
 from subprocess import PIPE, STDOUT
 import hashlib
-import requests
 import stat
 from contextlib import contextmanager
 import re
-import inquirer
-import cProfile
 import functools
 
 try:
@@ -41,7 +38,13 @@ from threading import Thread
 from queue import Queue
 import inspect
 from copy import deepcopy
-from passlib.context import CryptContext
+
+
+# idle psycopg2 connections per (host, port, user, dbname); reused by
+# _execute_sql and DBConnection.batch instead of connecting per statement
+_connection_pools = {}
+_alive_pools = set()
+POOL_SIZE = 4
 
 
 class DBConnection(object):
@@ -86,6 +89,88 @@ class DBConnection(object):
                     raise
         return conn
 
+    @property
+    def pool_key(self):
+        return (str(self.host), self.port, self.user, self.dbname)
+
+    def acquire(self):
+        """
+        Returns an idle connection of the pool or a new one. Pooled
+        connections are checked first; the server may have terminated them
+        meanwhile (e.g. before dropping the database).
+        """
+        import psycopg2
+
+        pool = _connection_pools.setdefault(self.pool_key, [])
+        while pool:
+            conn = pool.pop()
+            if conn.closed:
+                continue
+            try:
+                cr = conn.cursor()
+                try:
+                    cr.execute("select 1")
+                finally:
+                    cr.close()
+                conn.rollback()
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                conn.close()
+                continue
+            return conn
+        return self.get_psyco_connection()
+
+    def release(self, conn):
+        """
+        Puts the connection back into the pool; broken connections or
+        connections with an open transaction are closed.
+        """
+        import psycopg2.extensions
+
+        pool = _connection_pools.setdefault(self.pool_key, [])
+        if (
+            conn.closed
+            or conn.get_transaction_status()
+            != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+            or len(pool) >= POOL_SIZE
+        ):
+            conn.close()
+            return
+        pool.append(conn)
+
+    @staticmethod
+    def close_pool(dbname=None):
+        """
+        Closes idle connections (of the given database) - required before
+        a database is dropped or renamed.
+        """
+        for key, pool in _connection_pools.items():
+            if dbname and key[3] != dbname:
+                continue
+            while pool:
+                pool.pop().close()
+
+    def ensure_alive(self):
+        """
+        Waits until postgres accepts connections; done once per pool.
+        """
+        if self.pool_key in _alive_pools:
+            return
+
+        @retry(wait_random_min=500, wait_random_max=800, stop_max_delay=30000)
+        def try_connect(connection):
+            try:
+                connection = connection.clone(dbname="postgres")
+                _execute_sql(
+                    connection, "SELECT * FROM pg_catalog.pg_tables;", no_try=True
+                )
+            except Exception as e:
+                click.secho(str(e), fg="red")
+                return False
+            return True
+
+        if try_connect(self):
+            _alive_pools.add(self.pool_key)
+
     @contextmanager
     def connect(self, db=None):
         conn = self.get_psyco_connection(db=db)
@@ -99,6 +184,33 @@ class DBConnection(object):
             cr.close()
             conn.close()
 
+    @contextmanager
+    def batch(self, notransaction=False):
+        """
+        Runs several statements on one pooled connection:
+
+            with conn.batch() as cr:
+                _execute_sql(cr, ...)
+                _execute_sql(cr, ...)
+
+        Commits at the end, rolls back and re-raises on errors.
+        """
+        self.ensure_alive()
+        conn = self.acquire()
+        try:
+            conn.autocommit = notransaction
+            cr = conn.cursor()
+            try:
+                yield cr
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cr.close()
+        finally:
+            self.release(conn)
+
 
 def __assert_file_exists(path, isdir=False):
     if not Path(path).exists():
@@ -177,17 +289,8 @@ def _execute_sql(
     params=None,
     return_columns=False,
 ):
-    @retry(wait_random_min=500, wait_random_max=800, stop_max_delay=30000)
-    def try_connect(connection):
-        try:
-            if hasattr(connection, "clone"):
-                connection = connection.clone(dbname="postgres")
-            _execute_sql(connection, "SELECT * FROM pg_catalog.pg_tables;", no_try=True)
-        except Exception as e:
-            click.secho(str(e), fg="red")
-
-    if not no_try:
-        try_connect(connection)
+    if not no_try and hasattr(connection, "ensure_alive"):
+        connection.ensure_alive()
 
     def _call_cr(cr):
         cr.execute(sql, params)
@@ -197,22 +300,25 @@ def _execute_sql(
             return cr.fetchall()
 
     if isinstance(connection, DBConnection):
-        conn = connection.get_psyco_connection()
-        conn.autocommit = notransaction
-        cr = conn.cursor()
+        conn = connection.acquire()
         try:
-            res = _call_cr(cr)
-            conn.commit()
-            if return_columns:
-                return [x.name for x in cr.description], res
-            else:
-                return res
+            conn.autocommit = notransaction
+            cr = conn.cursor()
+            try:
+                res = _call_cr(cr)
+                conn.commit()
+                if return_columns:
+                    return [x.name for x in cr.description], res
+                else:
+                    return res
+            finally:
+                cr.close()
         except Exception:
-            conn.rollback()
+            if not conn.closed:
+                conn.rollback()
             raise
         finally:
-            cr.close()
-            conn.close()
+            connection.release(conn)
     else:
         return _call_cr(connection)
 
@@ -382,7 +488,12 @@ def _makedirs(path):
 
 
 def _remove_postgres_connections(connection, sql_afterwards=""):
+    from .module_tools import DBModules
+
     click.echo(f"Removing all current connections from {connection.dbname}")
+    DBConnection.close_pool(connection.dbname)
+    # done before the database is dropped, renamed or restored
+    DBModules.invalidate()
     if os.getenv("POSTGRES_DONT_DROP_ACTIVITIES", "") != "1":
         if _exists_db(connection):
             SQL = """
@@ -808,6 +919,8 @@ def _dropdb(config, conn):
     if _exists_db(conn):
         # TODO ask for name
         if not config.force:
+            import inquirer
+
             questions = [
                 inquirer.Text(
                     "name",
@@ -942,6 +1055,8 @@ def __hash_odoo_password(pwd):
         15.0,
         16.0,
     ]:
+        from passlib.context import CryptContext
+
         setpw = CryptContext(schemes=["pbkdf2_sha512", "md5_crypt"])
         return setpw.encrypt(pwd)
     else:
@@ -1132,6 +1247,8 @@ def download_file_and_move(url, dest):
 
 def download_file(url):
     print(f"Downloading {url}")
+    import requests
+
     local_filename = url.split("/")[-1]
     with requests.get(url, stream=True) as r:
         with open(local_filename, "wb") as f:
@@ -1146,29 +1263,14 @@ def get_hash(text):
     return hashlib.sha1(text).hexdigest()
 
 
-def remove_pycs(path):
-    path = path.absolute()
-    if not path.is_dir():
-        return
-    for cachedir in bashfind(path, name="__pycache__", type="d"):
-        shutil.rmtree(cachedir)
-    for file in bashfind(path, name="*.pyc", type="f"):
-        file.unlink()
-
+def get_directory_hash(path, use_cache=True):
+    """
+    Content hash of all files below path; see dirhash for the format.
+    """
+    from .dirhash import get_directory_hash as _get_directory_hash
 
-def get_directory_hash(path):
     click.secho(f"Calculating hash for {path}", fg="yellow")
-    # "-N required because absolute path is used"
-    remove_pycs(path)
-    hex = (
-        subprocess.check_output(
-            ["dtreetrawl", "-N", "--hash", "-R", path], encoding="utf8"
-        )
-        .strip()
-        .split(" ")[0]
-        .strip()
-    )
-    return hex
+    return _get_directory_hash(path, use_cache=use_cache)
 
 
 def git_diff_files(path, commit1, commit2):
@@ -1190,15 +1292,6 @@ def git_diff_files(path, commit1, commit2):
     return filepaths
 
 
-def _binary_zip(folder, destpath):
-    assert not destpath.exists()
-    if not Path(folder).exists():
-        raise Exception(f"Could not zip folder: {folder}")
-    os.system((f"cd '{folder}' && tar c . | pv | pigz > '{destpath}'"))
-    if not destpath.exists():
-        raise Exception(f"file {destpath} not generated")
-
-
 def try_ignore_exceptions(execute, exceptions, timeout=10):
     started = arrow.get()
     while True:
@@ -1234,12 +1327,6 @@ def autocleanpaper(filepath=None, strict=False):
                 filepath.unlink()
 
 
-def put_appendix_into_file(appendix, input_filepath, output_filepath):
-    with autocleanpaper() as tempfile:
-        tempfile.write_text(f"{appendix}")
-        os.system(f"cat {tempfile} {input_filepath} > {output_filepath}")
-
-
 def _get_version():
     import inspect
     import os
@@ -1319,6 +1406,8 @@ def download_file(url):
     file = file / local_filename
     del local_filename
 
+    import requests
+
     with requests.get(url, stream=True) as r:
         r.raise_for_status()
         with open(file, "wb") as f:
@@ -0,0 +1,229 @@
+"""
+WODOO-BIN: binary copy of the postgres data directory.
+
+Layout (version 2):
+
+    WODOO_BIN\\n                    magic, shared with version 1
+    \\0WB2 + HEADER                  format version, offset, length and
+                                    sha256 of the index
+    chunk, chunk, ...               gzip members of CHUNK_SIZE bytes of a
+                                    tar stream of the directory
+    index                           json: postgres version, sizes, chunk
+                                    offsets and sha256 of every raw chunk
+
+Chunks are compressed by a thread pool (zlib releases the GIL) and written
+once; the header is patched when the index is written, so the archive is
+not copied again. Restore decompresses the chunks in parallel and feeds
+them in order to tar; with verify every chunk is checked against its
+checksum. As the chunks are gzip members, the data part is also a valid
+gzip stream.
+
+Version 1 files ("WODOO_BIN\\n<postgres version>\\n" followed by a tar.gz)
+are still readable.
+
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import struct
+import hashlib
+import subprocess
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+MAGIC = b"WODOO_BIN\n"
+MARKER = b"\0WB2"
+HEADER = struct.Struct(">HQQ32s")
+FORMAT_VERSION = 2
+CHUNK_SIZE = 16 * 1024 * 1024
+DATA_OFFSET = len(MAGIC) + len(MARKER) + HEADER.size
+
+
+def is_wodoo_bin(filepath):
+    if not Path(filepath).is_file():
+        return False
+    with open(filepath, "rb") as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+def read_header(filepath):
+    """
+    Returns the index of a wodoo-bin file. For version 1 files only
+    format_version, postgres_version and data_offset are set.
+    """
+    with open(filepath, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise Exception(f"Not a WODOO-BIN file: {filepath}")
+        if file.read(len(MARKER)) != MARKER:
+            file.seek(len(MAGIC))
+            version = file.readline()
+            return {
+                "format_version": 1,
+                "postgres_version": version.decode("utf-8", errors="ignore").strip(),
+                "data_offset": file.tell(),
+            }
+        format_version, offset, length, checksum = HEADER.unpack(
+            file.read(HEADER.size)
+        )
+        if format_version != FORMAT_VERSION:
+            raise Exception(f"Unsupported WODOO-BIN version {format_version}")
+        if not offset:
+            raise Exception(f"Incomplete WODOO-BIN file: {filepath}")
+        file.seek(offset)
+        data = file.read(length)
+    if hashlib.sha256(data).digest() != checksum:
+        raise Exception(f"Corrupt index in {filepath}")
+    index = json.loads(data.decode("utf-8"))
+    index["format_version"] = format_version
+    index["data_offset"] = DATA_OFFSET
+    return index
+
+
+def _compress(data, compresslevel):
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, 31)
+    compressed = compressor.compress(data) + compressor.flush()
+    return compressed, hashlib.sha256(data).hexdigest()
+
+
+def _read_chunks(stream):
+    while True:
+        data = stream.read(CHUNK_SIZE)
+        if not data:
+            break
+        yield data
+
+
+def _progress(done, started, out=sys.stdout):
+    elapsed = time.time() - started or 1e-6
+    out.write(
+        f"\r{done / 1024 / 1024:,.0f} MB {done / 1024 / 1024 / elapsed:,.1f} MB/s"
+    )
+    out.flush()
+
+
+def write(folder, filepath, postgres_version, compresslevel=6, workers=None):
+    """
+    Writes the content of folder into filepath.
+    """
+    workers = workers or os.cpu_count() or 1
+    started = time.time()
+    proc = subprocess.Popen(["tar", "c", "."], cwd=str(folder), stdout=subprocess.PIPE)
+    chunks = []
+    size = 0
+    with open(filepath, "wb") as file:
+        file.write(MAGIC + MARKER + HEADER.pack(FORMAT_VERSION, 0, 0, b"\0" * 32))
+
+        def flush(pending, keep):
+            nonlocal size
+            while len(pending) > keep:
+                raw_size, job = pending.pop(0)
+                compressed, checksum = job.result()
+                chunks.append([file.tell(), len(compressed), raw_size, checksum])
+                file.write(compressed)
+                size += raw_size
+                _progress(size, started)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = []
+            for data in _read_chunks(proc.stdout):
+                pending.append(
+                    (len(data), executor.submit(_compress, data, compresslevel))
+                )
+                flush(pending, workers * 2)
+            flush(pending, 0)
+        sys.stdout.write("\n")
+
+        if proc.wait():
+            raise Exception(f"tar failed with exit code {proc.returncode}")
+
+        index = json.dumps(
+            {
+                "postgres_version": postgres_version,
+                "created": time.time(),
+                "size": size,
+                "compressed_size": file.tell() - DATA_OFFSET,
+                "chunk_size": CHUNK_SIZE,
+                "chunks": chunks,
+            }
+        ).encode("utf-8")
+        offset = file.tell()
+        file.write(index)
+        file.seek(len(MAGIC) + len(MARKER))
+        file.write(
+            HEADER.pack(
+                FORMAT_VERSION, offset, len(index), hashlib.sha256(index).digest()
+            )
+        )
+    return size
+
+
+def _iter_legacy(filepath, offset):
+    decompressor = zlib.decompressobj(31)
+    with open(filepath, "rb") as file:
+        file.seek(offset)
+        for data in _read_chunks(file):
+            while data:
+                yield decompressor.decompress(data)
+                if not decompressor.eof:
+                    break
+                # next gzip member (pigz, concatenated files)
+                data = decompressor.unused_data
+                decompressor = zlib.decompressobj(31)
+        yield decompressor.flush()
+
+
+def _iter_chunks(filepath, index, workers, verify):
+    def decompress(chunk):
+        offset, length, raw_size, checksum = chunk
+        with open(filepath, "rb") as file:
+            file.seek(offset)
+            data = zlib.decompress(file.read(length), 31)
+        if len(data) != raw_size:
+            raise Exception(f"Chunk at {offset} has wrong size")
+        if verify and hashlib.sha256(data).hexdigest() != checksum:
+            raise Exception(f"Chunk at {offset} has wrong checksum")
+        return data
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = []
+        for chunk in index["chunks"]:
+            pending.append(executor.submit(decompress, chunk))
+            if len(pending) > workers * 2:
+                yield pending.pop(0).result()
+        for job in pending:
+            yield job.result()
+
+
+def extract(filepath, folder, workers=None, verify=False, sudo=False):
+    """
+    Extracts a wodoo-bin file into folder (which is replaced).
+    """
+    workers = workers or os.cpu_count() or 1
+    index = read_header(filepath)
+    prefix = ["sudo"] if sudo else []
+    folder = Path(folder)
+    subprocess.check_call(prefix + ["rm", "-Rf", str(folder)])
+    subprocess.check_call(prefix + ["mkdir", str(folder)])
+    proc = subprocess.Popen(
+        prefix + ["tar", "x"], cwd=str(folder), stdin=subprocess.PIPE
+    )
+    if index["format_version"] == 1:
+        chunks = _iter_legacy(filepath, index["data_offset"])
+    else:
+        chunks = _iter_chunks(filepath, index, workers, verify)
+
+    started = time.time()
+    size = 0
+    try:
+        for data in chunks:
+            proc.stdin.write(data)
+            size += len(data)
+            _progress(size, started)
+    finally:
+        sys.stdout.write("\n")
+        proc.stdin.close()
+    if proc.wait():
+        raise Exception(f"tar failed with exit code {proc.returncode}")
+    return size